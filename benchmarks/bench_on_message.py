@@ -0,0 +1,325 @@
+"""
+Load generator for the DiscordMonitor.on_message hot path
+Replays synthetic messages against a local attachment server and reports
+throughput, handler latency, event-loop lag and memory
+
+Usage:
+    python benchmarks/bench_on_message.py --rate 500 --duration 10 --channels 5
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+class FakeUser:
+    """Stand-in for discord.User"""
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"user{user_id}"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeChannel:
+    """Stand-in for discord.TextChannel"""
+
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+
+
+class FakeAttachment:
+    """Stand-in for discord.Attachment"""
+
+    def __init__(self, url: str, filename: str, size: int):
+        self.url = url
+        self.filename = filename
+        self.size = size
+
+
+class FakeMessage:
+    """Stand-in for discord.Message with the fields the monitor reads"""
+
+    def __init__(self, message_id: int, author: FakeUser, channel: FakeChannel,
+                 content: str, attachments: List[FakeAttachment]):
+        self.id = message_id
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.attachments = attachments
+        self.created_at = datetime.now(timezone.utc)
+        self.reference = None
+
+
+def read_rss() -> int:
+    """Current resident set size in bytes"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # Peak, not current, where /proc is unavailable (kilobytes on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def start_attachment_server(latency: float, jitter: float, error_rate: float,
+                                  payload_size: int):
+    """
+    Serve synthetic attachments on a local port
+
+    Returns:
+        (runner, base URL)
+    """
+    from aiohttp import web
+
+    payload = os.urandom(payload_size)
+
+    async def handle(request):
+        delay = max(0.0, random.gauss(latency, jitter))
+        if delay:
+            await asyncio.sleep(delay)
+        if random.random() < error_rate:
+            return web.Response(status=random.choice((500, 502, 503)))
+        return web.Response(body=payload, content_type='image/png')
+
+    app = web.Application()
+    app.router.add_get('/attachments/{channel}/{message}/{name}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    await web.SockSite(runner, sock).start()
+    return runner, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+async def measure_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.01):
+    """Record how late the loop wakes a sleeping task"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - started - interval))
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    """Drive the monitor at the requested rate and collect measurements"""
+    from config import config
+    from monitor import create_monitor
+    from utils.console import start_console, stop_console
+
+    # Console output as in production: queued to a background thread
+    start_console(config.console_level)
+
+    runner, base_url = await start_attachment_server(
+        args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.payload_bytes
+    )
+
+    monitor = create_monitor()
+    await monitor.setup_hook()
+
+    channels = [FakeChannel(1000 + i) for i in range(args.channels)]
+    authors = [FakeUser(5000 + i) for i in range(args.authors)]
+    rng = random.Random(args.seed)
+
+    handler_latencies: List[float] = []
+    loop_lag: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(loop_lag, stop))
+
+    rss_start = read_rss()
+    rss_peak = rss_start
+
+    async def handle(message: FakeMessage):
+        started = time.perf_counter()
+        await monitor.on_message(message)
+        handler_latencies.append(time.perf_counter() - started)
+
+    tasks = set()
+    total = int(args.rate * args.duration)
+    interval = 1.0 / args.rate
+    loop = asyncio.get_running_loop()
+    began = loop.time()
+
+    for n in range(total):
+        # Open-loop pacing: messages arrive on schedule whether or not handlers keep up
+        delay = began + n * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        channel = rng.choice(channels)
+        message_id = 10 ** 17 + n
+        attachments = []
+        if rng.random() < args.attachment_ratio:
+            for i in range(rng.randint(1, args.max_attachments)):
+                name = f"image{i}.{rng.choice(('png', 'jpg', 'gif'))}"
+                attachments.append(FakeAttachment(
+                    f"{base_url}/attachments/{channel.id}/{message_id}/{name}",
+                    name,
+                    args.payload_bytes
+                ))
+        content = 'x' * rng.randint(0, args.max_content)
+        message = FakeMessage(message_id, rng.choice(authors), channel, content, attachments)
+
+        task = asyncio.create_task(handle(message))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+        if n % 100 == 0:
+            rss_peak = max(rss_peak, read_rss())
+
+    await asyncio.gather(*tasks)
+    ingest_elapsed = loop.time() - began
+
+    # Shutdown drains queued log writes and downloads
+    pipeline = monitor.pipeline
+    drain_started = loop.time()
+    await monitor.close()
+    drain_elapsed = loop.time() - drain_started
+    total_elapsed = loop.time() - began
+
+    if args.shards:
+        # Writes and downloads happened in the worker processes
+        pipeline_stats = {
+            'messages_forwarded': pipeline.messages_forwarded,
+            'shard_batches': pipeline.batches_sent
+        }
+    else:
+        pipeline_stats = {
+            'records_written': pipeline.writer.records_written,
+            'write_batches': pipeline.writer.batches_written,
+            'downloads_completed': pipeline.scheduler.jobs_completed,
+            'downloads_failed': pipeline.scheduler.jobs_failed,
+            'downloads_retried': pipeline.scheduler.jobs_retried
+        }
+
+    stop.set()
+    await lag_task
+    await runner.cleanup()
+    stop_console()
+    rss_peak = max(rss_peak, read_rss())
+
+    ms = 1000.0
+    return {
+        'messages': total,
+        'target_rate': args.rate,
+        'ingest_seconds': round(ingest_elapsed, 3),
+        'drain_seconds': round(drain_elapsed, 3),
+        'throughput_msgs_per_sec': round(total / ingest_elapsed, 1),
+        'end_to_end_msgs_per_sec': round(total / total_elapsed, 1),
+        'handler_ms': {
+            'p50': round(percentile(handler_latencies, 50) * ms, 3),
+            'p99': round(percentile(handler_latencies, 99) * ms, 3),
+            'max': round(max(handler_latencies, default=0.0) * ms, 3)
+        },
+        'loop_lag_ms': {
+            'p50': round(percentile(loop_lag, 50) * ms, 3),
+            'p99': round(percentile(loop_lag, 99) * ms, 3),
+            'max': round(max(loop_lag, default=0.0) * ms, 3)
+        },
+        'rss_mb': {
+            'start': round(rss_start / 2 ** 20, 1),
+            'peak': round(rss_peak / 2 ** 20, 1)
+        },
+        'shards': args.shards,
+        **pipeline_stats
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    """Human-readable summary"""
+    print(f"Messages:        {result['messages']:,} at {result['target_rate']}/s target")
+    print(f"Throughput:      {result['throughput_msgs_per_sec']:,}/s ingest, "
+          f"{result['end_to_end_msgs_per_sec']:,}/s including {result['drain_seconds']}s drain")
+    h = result['handler_ms']
+    print(f"Handler latency: p50 {h['p50']} ms, p99 {h['p99']} ms, max {h['max']} ms")
+    lag = result['loop_lag_ms']
+    print(f"Event-loop lag:  p50 {lag['p50']} ms, p99 {lag['p99']} ms, max {lag['max']} ms")
+    print(f"RSS:             {result['rss_mb']['start']} MB -> {result['rss_mb']['peak']} MB peak")
+    if result['shards']:
+        print(f"Shards:          {result['messages_forwarded']:,} messages to {result['shards']} worker(s) "
+              f"in {result['shard_batches']:,} batches")
+        return
+    print(f"Log writes:      {result['records_written']:,} records in {result['write_batches']:,} batches")
+    print(f"Downloads:       {result['downloads_completed']:,} ok, {result['downloads_failed']:,} failed, "
+          f"{result['downloads_retried']:,} retries")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark DiscordMonitor.on_message')
+    parser.add_argument('--rate', type=float, default=200, help='Messages per second')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load')
+    parser.add_argument('--channels', type=int, default=5, help='Number of channels')
+    parser.add_argument('--authors', type=int, default=50, help='Number of distinct authors')
+    parser.add_argument('--attachment-ratio', type=float, default=0.2,
+                        help='Fraction of messages with attachments')
+    parser.add_argument('--max-attachments', type=int, default=3, help='Attachments per message (max)')
+    parser.add_argument('--payload-bytes', type=int, default=200_000, help='Size of each attachment')
+    parser.add_argument('--max-content', type=int, default=300, help='Max characters of message text')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Attachment server latency')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='Latency standard deviation')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='Fraction of 5xx responses')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Persist in this many worker processes (SHARD_WORKERS)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the message mix')
+    parser.add_argument('--work-dir', type=Path, default=None,
+                        help='Where to write logs/downloads (default: a temp dir, removed afterwards)')
+    parser.add_argument('--show-output', action='store_true', help="Don't silence the monitor's console output")
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory()))
+
+        # Configure the monitor before config is imported
+        os.environ.setdefault('DISCORD_TOKEN', 'benchmark.' + 'x' * 60)
+        os.environ['CHANNEL_IDS'] = ','.join(str(1000 + i) for i in range(args.channels))
+        os.environ['LOGS_DIR'] = str(work_dir / 'logs')
+        os.environ['DOWNLOADS_DIR'] = str(work_dir / 'downloads')
+        os.environ['SHARD_WORKERS'] = str(args.shards)
+
+        if not args.show_output:
+            # Shard worker processes don't share our redirected stdout
+            os.environ['CONSOLE_LEVEL'] = 'quiet'
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        result = asyncio.run(run_benchmark(args))
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
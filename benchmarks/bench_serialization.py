@@ -0,0 +1,206 @@
+"""
+Compare log record encoders
+Reports encode time and bytes per record for each installed encoder, plus
+the legacy pretty-printed format and the cost of building a record
+
+Usage:
+    python benchmarks/bench_serialization.py --records 20000 --batch 100
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from utils.serialization import ENCODERS, available_encoders  # noqa: E402
+
+WORDS = ('hello', 'world', 'image', 'stream', 'server', 'ok', 'lol', 'thanks', 'xin chào',
+         'こんにちは', 'привет', '🔥', '👍', 'https://example.com/page', '@everyone')
+
+
+def make_records(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Synthetic mix of message and attachment records shaped like the logger's output"""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 6, tzinfo=timezone.utc)
+    records = []
+    for n in range(count):
+        message_id = str(10 ** 18 + n)
+        channel_id = str(10 ** 17 + rng.randint(0, 9))
+        timestamp = (start + timedelta(milliseconds=n * 250)).isoformat()
+        if rng.random() < 0.15:
+            records.append({
+                "record_type": "attachment",
+                "message_id": message_id,
+                "channel_id": channel_id,
+                "timestamp": timestamp,
+                "index": 0,
+                "attachment": {
+                    "filename": f"image{n}.png",
+                    "url": f"https://cdn.discordapp.com/attachments/{channel_id}/{message_id}/image{n}.png",
+                    "size": rng.randint(10_000, 5_000_000),
+                    "downloaded": True,
+                    "local_path": f"downloads/{message_id}_image{n}.png",
+                    "sha256": '%064x' % rng.getrandbits(256),
+                    "status": "downloaded"
+                }
+            })
+            continue
+        attachments = []
+        if rng.random() < 0.2:
+            attachments.append({
+                "filename": f"image{n}.png",
+                "url": f"https://cdn.discordapp.com/attachments/{channel_id}/{message_id}/image{n}.png",
+                "size": rng.randint(10_000, 5_000_000),
+                "downloaded": False,
+                "status": "pending"
+            })
+        records.append({
+            "message_id": message_id,
+            "timestamp": timestamp,
+            "author": f"user{rng.randint(1, 500)}",
+            "author_id": str(10 ** 17 + rng.randint(0, 10 ** 6)),
+            "channel_id": channel_id,
+            "channel_name": rng.choice(('general', 'images', 'announcements', 'off-topic')),
+            "content": ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 40))),
+            "attachments": attachments
+        })
+    return records
+
+
+def time_batches(encode: Callable[[List[Dict[str, Any]]], bytes], records: List[Dict[str, Any]],
+                 batch: int, repeat: int) -> Dict[str, float]:
+    """Best-of-repeat time to encode all records in batches, and the output size"""
+    batches = [records[i:i + batch] for i in range(0, len(records), batch)]
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = sum(len(encode(chunk)) for chunk in batches)
+        best = min(best, time.perf_counter() - started)
+    return {
+        'us_per_record': best / len(records) * 1e6,
+        'bytes_per_record': size / len(records)
+    }
+
+
+def legacy_array(records: List[Dict[str, Any]]) -> bytes:
+    """Encoding used by the legacy pretty-printed JSON array format"""
+    return ',\n'.join(
+        '  ' + json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        for record in records
+    ).encode('utf-8')
+
+
+class SlotsRecord:
+    """Typed message record with __slots__, for the record-building comparison"""
+
+    __slots__ = ('message_id', 'timestamp', 'author', 'author_id', 'channel_id',
+                 'channel_name', 'content', 'attachments')
+
+    def __init__(self, message_id, timestamp, author, author_id, channel_id,
+                 channel_name, content, attachments):
+        self.message_id = message_id
+        self.timestamp = timestamp
+        self.author = author
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.channel_name = channel_name
+        self.content = content
+        self.attachments = attachments
+
+
+def time_record_building(count: int) -> Dict[str, float]:
+    """Per-record cost of building a message record as a dict, a __slots__ object or a msgspec Struct"""
+    from utils.logger import DailyLogger
+
+    format_message = DailyLogger.format_message
+    args = (10 ** 18, '2026-01-06T12:00:00+00:00', 'user1', 10 ** 17, 10 ** 17, 'general', 'hello', [])
+
+    builders = {
+        'dict (format_message)': lambda: format_message(None, *args),
+        '__slots__ class': lambda: SlotsRecord(
+            str(args[0]), args[1], args[2], str(args[3]), str(args[4]), args[5], args[6], args[7]
+        ),
+    }
+    try:
+        import msgspec
+
+        class StructRecord(msgspec.Struct):
+            message_id: str
+            timestamp: str
+            author: str
+            author_id: str
+            channel_id: str
+            channel_name: str
+            content: str
+            attachments: list
+
+        builders['msgspec Struct'] = lambda: StructRecord(
+            str(args[0]), args[1], args[2], str(args[3]), str(args[4]), args[5], args[6], args[7]
+        )
+    except ImportError:
+        pass
+
+    results = {}
+    for name, build in builders.items():
+        started = time.perf_counter()
+        for _ in range(count):
+            build()
+        results[name] = (time.perf_counter() - started) / count * 1e6
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark log record encoders')
+    parser.add_argument('--records', type=int, default=20000, help='Number of synthetic records')
+    parser.add_argument('--batch', type=int, default=100, help='Records per encode call (WRITE_BATCH_SIZE)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per encoder (best is reported)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args(argv)
+
+    records = make_records(args.records, args.seed)
+    available = available_encoders()
+
+    results = {'encoders': {}, 'record_building_us': time_record_building(args.records)}
+    for name in ENCODERS:
+        if name not in available:
+            continue
+        encoder = ENCODERS[name]()
+        # Every encoder must round-trip to the same records
+        decoded = [json.loads(line) for line in encoder.encode_lines(records).splitlines()]
+        if decoded != records:
+            print(f"{name}: output does not round-trip")
+            return 1
+        results['encoders'][name] = time_batches(encoder.encode_lines, records, args.batch, args.repeat)
+    results['encoders']['legacy json array'] = time_batches(legacy_array, records, args.batch, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    baseline = results['encoders']['stdlib']['us_per_record']
+    print(f"{args.records:,} records, batches of {args.batch}")
+    print(f"{'encoder':<20} {'us/record':>10} {'bytes/record':>13} {'vs stdlib':>10}")
+    for name, row in results['encoders'].items():
+        print(f"{name:<20} {row['us_per_record']:>10.2f} {row['bytes_per_record']:>13.1f} "
+              f"{baseline / row['us_per_record']:>9.1f}x")
+    missing = [name for name in ENCODERS if name not in available]
+    if missing:
+        print(f"(not installed: {', '.join(missing)})")
+
+    print(f"\n{'record building':<24} {'us/record':>10}")
+    for name, us in results['record_building_us'].items():
+        print(f"{name:<24} {us:>10.3f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
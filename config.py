@@ -1,37 +1,165 @@
 """
 Configuration loader for Discord Stream Monitor
-Loads and validates environment variables from .env file
+Loads and validates environment variables from .env file when first needed, not at import
 """
 
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
+from typing import List, Optional, Set
+from dotenv import find_dotenv, dotenv_values
 from colorama import Fore, Style, init
 
+from utils.console import LEVELS, console
+
 # Initialize colorama for Windows
 init(autoreset=True)
 
-# Load environment variables
-load_dotenv()
+# Environment file (.env), searched for from this folder up
+ENV_FILE = find_dotenv()
+
+# Variables set before .env was read; the file never overrides them, even on reload
+_process_env = set(os.environ)
+_env_file_keys: Set[str] = set()
+
+
+def load_env():
+    """Read the .env file into os.environ, dropping variables removed from it since the last read"""
+    global _env_file_keys
+    
+    values = dotenv_values(ENV_FILE) if ENV_FILE else {}
+    keys = {key for key, value in values.items() if value is not None and key not in _process_env}
+    for key in _env_file_keys - keys:
+        os.environ.pop(key, None)
+    for key in keys:
+        os.environ[key] = values[key]
+    _env_file_keys = keys
+
+
+def env_file_keys() -> Set[str]:
+    """Variables the last load_env() took from the .env file"""
+    return set(_env_file_keys)
+
+
+def release_env_keys(keys: Set[str]):
+    """
+    Let .env set variables again that a parent process read from it
+
+    A spawned process inherits its parent's os.environ, .env values included;
+    without this they would count as process variables and never reload.
+
+    Args:
+        keys: The parent's env_file_keys()
+    """
+    for key in keys:
+        os.environ.pop(key, None)
+    _process_env.difference_update(keys)
+
+# Settings DiscordMonitor applies while running (see utils.config_watcher);
+# changing anything else in .env takes effect after a restart
+DOWNLOAD_RELOADABLE = ('download_extensions', 'download_max_bytes')
+LOG_RELOADABLE = ('log_fsync', 'log_fsync_interval', 'log_encoder', 'log_max_bytes')
+RELOADABLE = ('channel_ids',) + DOWNLOAD_RELOADABLE + LOG_RELOADABLE + ('console_level', 'rules_file')
+
+# The ones shard workers apply themselves, so the gateway has them reload
+SHARD_RELOADABLE = DOWNLOAD_RELOADABLE + LOG_RELOADABLE + ('console_level',)
+
+# Attachment types downloaded by default
+DEFAULT_DOWNLOAD_EXTENSIONS = 'png,jpg,jpeg,gif,webp,bmp,svg'
 
 class Config:
     """Application configuration"""
     
-    def __init__(self):
+    def __init__(self, exit_on_error: bool = True):
+        """
+        Args:
+            exit_on_error: Print errors and exit if the configuration is invalid;
+                otherwise they are left in self.errors (used when reloading)
+        """
+        self.exit_on_error = exit_on_error
+        self.errors: List[str] = []
+        
         self.discord_token = os.getenv('DISCORD_TOKEN')
         self.channel_ids = self._parse_channel_ids()
         self.alert_webhook = os.getenv('ALERT_WEBHOOK')
         self.timezone_offset = os.getenv('TIMEZONE_OFFSET', '+07:00')
         
+        # Log storage
+        self.log_format = os.getenv('LOG_FORMAT', 'ndjson').strip().lower()
+        self.log_fsync = os.getenv('LOG_FSYNC', 'never').strip().lower()
+        self.log_fsync_interval = self._parse_float('LOG_FSYNC_INTERVAL', 1.0)
+        self.log_encoder = os.getenv('LOG_ENCODER', 'auto').strip().lower()
+        self.log_max_bytes = self._parse_int('LOG_MAX_BYTES', 0)
+        self.log_compression = os.getenv('LOG_COMPRESSION', 'none').strip().lower()
+        self.log_retention_days = self._parse_int('LOG_RETENTION_DAYS', 0)
+        self.log_retention_bytes = self._parse_int('LOG_RETENTION_BYTES', 0)
+        self.archive_enabled = os.getenv('ARCHIVE_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+        
+        # Per-day aggregates (logs/analytics/), optionally with a columnar export of each finished day
+        self.analytics_enabled = os.getenv('ANALYTICS_ENABLED', 'false').strip().lower() in ('1', 'true', 'yes')
+        self.analytics_flush_interval = self._parse_float('ANALYTICS_FLUSH_INTERVAL', 60.0)
+        self.analytics_columnar = os.getenv('ANALYTICS_COLUMNAR', 'none').strip().lower()
+        
+        # Batched write pipeline
+        self.write_queue_size = self._parse_int('WRITE_QUEUE_SIZE', 10000)
+        self.write_batch_size = self._parse_int('WRITE_BATCH_SIZE', 500)
+        self.write_flush_interval = self._parse_float('WRITE_FLUSH_INTERVAL', 0.25)
+        self.write_backpressure = os.getenv('WRITE_BACKPRESSURE', 'block').strip().lower()
+        
+        # Attachment download workers
+        self.download_workers = self._parse_int('DOWNLOAD_WORKERS', 4)
+        self.download_per_host = self._parse_int('DOWNLOAD_PER_HOST', 4)
+        self.download_queue_size = self._parse_int('DOWNLOAD_QUEUE_SIZE', 1000)
+        self.download_drain_timeout = self._parse_float('DOWNLOAD_DRAIN_TIMEOUT', 10.0)
+        self.download_max_bytes = self._parse_int('DOWNLOAD_MAX_BYTES', 100 * 1024 * 1024)
+        self.download_chunk_size = self._parse_int('DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+        self.download_layout = os.getenv('DOWNLOAD_LAYOUT', 'flat').strip().lower()
+        self.download_extensions = self._parse_extensions('DOWNLOAD_EXTENSIONS', DEFAULT_DOWNLOAD_EXTENSIONS)
+        self.download_max_attempts = self._parse_int('DOWNLOAD_MAX_ATTEMPTS', 5)
+        self.download_retry_delay = self._parse_float('DOWNLOAD_RETRY_DELAY', 5.0)
+        self.download_retry_max_delay = self._parse_float('DOWNLOAD_RETRY_MAX_DELAY', 3600.0)
+        
+        # Thumbnails and perceptual hashes of downloaded images (needs Pillow)
+        self.image_thumbnails = os.getenv('IMAGE_THUMBNAILS', 'false').strip().lower() in ('1', 'true', 'yes')
+        self.thumbnail_size = self._parse_int('THUMBNAIL_SIZE', 256)
+        self.image_workers = self._parse_int('IMAGE_WORKERS', 0)
+        
+        # HTTP connection pool for downloads
+        self.http_pool_limit = self._parse_int('HTTP_POOL_LIMIT', 100)
+        self.http_pool_per_host = self._parse_int('HTTP_POOL_PER_HOST', 10)
+        self.http_connect_timeout = self._parse_float('HTTP_CONNECT_TIMEOUT', 10.0)
+        self.http_read_timeout = self._parse_float('HTTP_READ_TIMEOUT', 30.0)
+        self.http_total_timeout = self._parse_float('HTTP_TOTAL_TIMEOUT', 300.0)
+        self.http_dns_ttl = self._parse_int('HTTP_DNS_TTL', 300)
+        self.http_keepalive = self._parse_float('HTTP_KEEPALIVE', 30.0)
+        
+        # Multi-process persistence (0 = everything in the gateway process)
+        self.shard_workers = self._parse_int('SHARD_WORKERS', 0)
+        self.shard_queue_size = self._parse_int('SHARD_QUEUE_SIZE', 1000)
+        
+        # Console output
+        self.console_level = os.getenv('CONSOLE_LEVEL', 'info').strip().lower()
+        self.console_summary_interval = self._parse_float('CONSOLE_SUMMARY_INTERVAL', 0)
+        
+        # Recent messages kept in memory for the /recent API (0 bytes = disabled)
+        self.recent_cache_bytes = self._parse_int('RECENT_CACHE_BYTES', 16 * 1024 * 1024)
+        self.recent_cache_per_channel = self._parse_int('RECENT_CACHE_PER_CHANNEL', 1000)
+        
+        # Metrics
+        self.metrics_host = os.getenv('METRICS_HOST', '127.0.0.1').strip()
+        self.metrics_port = self._parse_int('METRICS_PORT', 0)
+        self.metrics_snapshot_interval = self._parse_float('METRICS_SNAPSHOT_INTERVAL', 0)
+        
+        # Seconds between checks of .env for changes (0 = only reload on SIGHUP)
+        self.config_reload_interval = self._parse_float('CONFIG_RELOAD_INTERVAL', 2.0)
+        
         # Directory paths
         self.base_dir = Path(__file__).parent
-        self.logs_dir = self.base_dir / 'logs'
-        self.downloads_dir = self.base_dir / 'downloads'
-        
-        # Create directories if they don't exist
-        self.logs_dir.mkdir(exist_ok=True)
-        self.downloads_dir.mkdir(exist_ok=True)
+        self.logs_dir = self._parse_dir('LOGS_DIR', 'logs')
+        self.downloads_dir = self._parse_dir('DOWNLOADS_DIR', 'downloads')
+        self.archive_db = self.logs_dir / 'archive.db'
+        self.rules_file = self._parse_file('RULES_FILE')
+        self.download_queue_db = self.logs_dir / 'download_queue.db'
         
         # Validate configuration
         self._validate()
@@ -47,12 +175,51 @@ class Config:
         try:
             return [int(cid.strip()) for cid in channel_ids_str.split(',') if cid.strip()]
         except ValueError:
-            print(f"{Fore.RED}❌ Error: CHANNEL_IDS must be comma-separated numbers")
-            sys.exit(1)
+            self.errors.append("CHANNEL_IDS must be comma-separated numbers")
+            return []
+    
+    def _parse_extensions(self, name: str, default: str) -> frozenset:
+        """Parse a comma-separated list of file extensions ('png' or '.png')"""
+        value = os.getenv(name, '').strip() or default
+        return frozenset(
+            '.' + ext.strip().lower().lstrip('.') for ext in value.split(',') if ext.strip()
+        )
+    
+    def _parse_dir(self, name: str, default: str) -> Path:
+        """Parse a directory path (relative paths are relative to the project)"""
+        value = os.getenv(name, '').strip()
+        return self.base_dir / (value or default)
+    
+    def _parse_file(self, name: str) -> Optional[Path]:
+        """Parse an optional file path (relative paths are relative to the project)"""
+        value = os.getenv(name, '').strip()
+        return self.base_dir / value if value else None
+    
+    def _parse_int(self, name: str, default: int) -> int:
+        """Parse an integer environment variable"""
+        value = os.getenv(name, '').strip()
+        if not value:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            self.errors.append(f"{name} must be a whole number")
+            return default
+    
+    def _parse_float(self, name: str, default: float) -> float:
+        """Parse a numeric environment variable"""
+        value = os.getenv(name, '').strip()
+        if not value:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            self.errors.append(f"{name} must be a number")
+            return default
     
     def _validate(self):
         """Validate required configuration values"""
-        errors = []
+        errors = self.errors
         
         # Check Discord token
         if not self.discord_token:
@@ -62,12 +229,65 @@ class Config:
         elif self.discord_token.startswith('Bot '):
             errors.append("DISCORD_TOKEN should be a user token, not a bot token (remove 'Bot ' prefix)")
         
-        # Check channel IDs
-        if not self.channel_ids:
+        # Check channel IDs (unless they failed to parse)
+        if not self.channel_ids and not any(error.startswith('CHANNEL_IDS') for error in errors):
             errors.append("CHANNEL_IDS is required (at least one channel ID)")
         
+        # Check log storage settings
+        if self.console_level not in LEVELS:
+            errors.append(f"CONSOLE_LEVEL must be one of: {', '.join(LEVELS)}")
+        
+        if self.log_format not in ('ndjson', 'json'):
+            errors.append("LOG_FORMAT must be 'ndjson' or 'json'")
+        if self.log_encoder not in ('auto', 'stdlib', 'orjson', 'msgspec'):
+            errors.append("LOG_ENCODER must be 'auto', 'stdlib', 'orjson' or 'msgspec'")
+        from utils.logger import parse_timezone
+        try:
+            parse_timezone(self.timezone_offset)
+        except ValueError:
+            errors.append("TIMEZONE_OFFSET must be an offset like +07:00, or a zone name like Asia/Jakarta")
+        if self.log_max_bytes < 0:
+            errors.append("LOG_MAX_BYTES must be 0 or more")
+        if self.log_fsync not in ('never', 'always', 'interval'):
+            errors.append("LOG_FSYNC must be 'never', 'always' or 'interval'")
+        if self.log_compression not in ('none', 'gzip', 'zstd'):
+            errors.append("LOG_COMPRESSION must be 'none', 'gzip' or 'zstd'")
+        if self.analytics_columnar not in ('none', 'auto', 'parquet', 'npz'):
+            errors.append("ANALYTICS_COLUMNAR must be 'none', 'auto', 'parquet' or 'npz'")
+        if self.analytics_flush_interval <= 0:
+            errors.append("ANALYTICS_FLUSH_INTERVAL must be more than 0")
+        if self.write_backpressure not in ('block', 'drop'):
+            errors.append("WRITE_BACKPRESSURE must be 'block' or 'drop'")
+        if self.write_queue_size < 1 or self.write_batch_size < 1:
+            errors.append("WRITE_QUEUE_SIZE and WRITE_BATCH_SIZE must be at least 1")
+        if self.download_workers < 1 or self.download_per_host < 1 or self.download_queue_size < 1:
+            errors.append("DOWNLOAD_WORKERS, DOWNLOAD_PER_HOST and DOWNLOAD_QUEUE_SIZE must be at least 1")
+        if self.shard_workers < 0 or self.shard_queue_size < 1:
+            errors.append("SHARD_WORKERS must be 0 or more and SHARD_QUEUE_SIZE at least 1")
+        if self.download_max_attempts < 1:
+            errors.append("DOWNLOAD_MAX_ATTEMPTS must be at least 1")
+        if self.download_layout not in ('flat', 'cas'):
+            errors.append("DOWNLOAD_LAYOUT must be 'flat' or 'cas'")
+        if not self.download_extensions:
+            errors.append("DOWNLOAD_EXTENSIONS must list at least one extension")
+        if self.thumbnail_size < 16 or self.image_workers < 0:
+            errors.append("THUMBNAIL_SIZE must be at least 16 and IMAGE_WORKERS 0 or more")
+        if self.recent_cache_bytes < 0 or self.recent_cache_per_channel < 1:
+            errors.append("RECENT_CACHE_BYTES must be 0 or more and RECENT_CACHE_PER_CHANNEL at least 1")
+        if self.config_reload_interval < 0:
+            errors.append("CONFIG_RELOAD_INTERVAL must be 0 or more")
+        if self.rules_file is not None:
+            if not self.rules_file.exists():
+                errors.append(f"RULES_FILE not found: {self.rules_file}")
+            else:
+                from utils.rules import RuleSet
+                try:
+                    RuleSet.load(self.rules_file)
+                except ValueError as e:
+                    errors.append(f"RULES_FILE: {e}")
+        
         # Display errors if any
-        if errors:
+        if errors and self.exit_on_error:
             print(f"\n{Fore.RED}{'='*60}")
             print(f"{Fore.RED}❌ Configuration Error")
             print(f"{Fore.RED}{'='*60}")
@@ -78,19 +298,72 @@ class Config:
             print(f"{Fore.RED}{'='*60}\n")
             sys.exit(1)
     
+    def create_dirs(self):
+        """Create the logs and downloads directories if they don't exist"""
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+        self.downloads_dir.mkdir(parents=True, exist_ok=True)
+    
     def display_config(self):
         """Display loaded configuration (for debugging)"""
-        print(f"\n{Fore.CYAN}{'='*60}")
-        print(f"{Fore.CYAN}📋 Discord Stream Monitor Configuration")
-        print(f"{Fore.CYAN}{'='*60}")
-        print(f"{Fore.GREEN}✓ Token: {self.discord_token[:20]}...{self.discord_token[-10:]}")
-        print(f"{Fore.GREEN}✓ Monitoring {len(self.channel_ids)} channel(s):")
+        console.info(f"\n{Fore.CYAN}{'='*60}")
+        console.info(f"{Fore.CYAN}📋 Discord Stream Monitor Configuration")
+        console.info(f"{Fore.CYAN}{'='*60}")
+        console.info(f"{Fore.GREEN}✓ Token: {self.discord_token[:20]}...{self.discord_token[-10:]}")
+        console.info(f"{Fore.GREEN}✓ Monitoring {len(self.channel_ids)} channel(s):")
         for cid in self.channel_ids:
-            print(f"{Fore.WHITE}  • {cid}")
-        print(f"{Fore.GREEN}✓ Logs directory: {self.logs_dir}")
-        print(f"{Fore.GREEN}✓ Downloads directory: {self.downloads_dir}")
-        print(f"{Fore.GREEN}✓ Timezone: {self.timezone_offset}")
-        print(f"{Fore.CYAN}{'='*60}\n")
-
-# Global config instance
-config = Config()
+            console.info(f"{Fore.WHITE}  • {cid}")
+        console.info(f"{Fore.GREEN}✓ Logs directory: {self.logs_dir}")
+        console.info(f"{Fore.GREEN}✓ Log format: {self.log_format} (encoder: {self.log_encoder}, fsync: {self.log_fsync})")
+        if self.archive_enabled:
+            console.info(f"{Fore.GREEN}✓ Search archive: {self.archive_db}")
+        console.info(f"{Fore.GREEN}✓ Downloads directory: {self.downloads_dir}")
+        console.info(f"{Fore.GREEN}✓ Timezone: {self.timezone_offset}")
+        console.info(f"{Fore.CYAN}{'='*60}\n")
+    
+    def changes(self, other: 'Config') -> Set[str]:
+        """Names of the settings whose values differ in another configuration"""
+        return {
+            name for name, value in vars(self).items()
+            if name not in ('exit_on_error', 'errors') and getattr(other, name, None) != value
+        }
+    
+    def update(self, other: 'Config', names) -> None:
+        """Copy the given settings from another configuration"""
+        for name in names:
+            setattr(self, name, getattr(other, name))
+
+# Global config instance (created by load_config, or on first use of `config`)
+_config_instance: Optional[Config] = None
+
+def load_config(exit_on_error: bool = True) -> Config:
+    """
+    Read .env and build the global configuration
+    
+    Args:
+        exit_on_error: Print errors and exit if the configuration is invalid
+    
+    Returns:
+        The configuration (also available as `config`)
+    """
+    global _config_instance
+    load_env()
+    _config_instance = Config(exit_on_error)
+    _config_instance.create_dirs()
+    return _config_instance
+
+def get_config() -> Config:
+    """Get the global configuration, loading it on first use"""
+    if _config_instance is None:
+        load_config()
+    return _config_instance
+
+class _LazyConfig:
+    """Stands in for the global Config, so importing this module has no side effects"""
+    
+    def __getattr__(self, name):
+        return getattr(get_config(), name)
+    
+    def __setattr__(self, name, value):
+        setattr(get_config(), name, value)
+
+config = _LazyConfig()
@@ -4,16 +4,24 @@ Captures real-time messages and images from Discord channels
 """
 
 import sys
-import asyncio
-import signal
-from colorama import Fore, Style
+import argparse
+from typing import List, Optional
 
-from config import config
-from monitor import create_monitor
-from utils.alerts import alerts
+# Heavy modules (discord, aiohttp, the monitor) are imported by the commands that need them,
+# so offline commands start without loading the Discord stack or reading .env
 
-async def main():
+async def main(config):
     """Main application entry point"""
+    import signal
+    import asyncio
+    import discord
+    from colorama import Fore
+    from monitor import create_monitor
+    from utils.alerts import alerts
+    from utils.console import console, start_console, stop_console
+    
+    # Console output goes through a background thread from here on
+    start_console(config.console_level)
     
     # Display configuration
     config.display_config()
@@ -26,7 +34,7 @@ async def main():
     
     def signal_handler(sig, frame):
         """Handle Ctrl+C gracefully"""
-        print(f"\n{Fore.YELLOW}⏸️  Shutting down gracefully...")
+        console.info(f"\n{Fore.YELLOW}⏸️  Shutting down gracefully...")
         shutdown_event.set()
     
     # Register signal handler
@@ -34,7 +42,7 @@ async def main():
     
     try:
         # Start the monitor (this will run until interrupted)
-        print(f"{Fore.CYAN}🔌 Connecting to Discord...")
+        console.info(f"{Fore.CYAN}🔌 Connecting to Discord...")
         
         # Run the bot
         async def run_bot():
@@ -42,11 +50,11 @@ async def main():
                 await monitor.start(config.discord_token)
             except discord.errors.LoginFailure:
                 alerts.alert_token_invalid()
+                stop_console()
                 sys.exit(1)
             except Exception as e:
-                print(f"{Fore.RED}❌ Fatal error: {e}")
-                import traceback
-                traceback.print_exc()
+                console.exception(f"{Fore.RED}❌ Fatal error: {e}")
+                stop_console()
                 sys.exit(1)
         
         # Run bot and wait for shutdown signal
@@ -64,22 +72,124 @@ async def main():
             task.cancel()
         
     except KeyboardInterrupt:
-        print(f"\n{Fore.YELLOW}⏸️  Interrupted by user")
+        console.info(f"\n{Fore.YELLOW}⏸️  Interrupted by user")
     
     finally:
         # Clean shutdown
         await monitor.close()
-        print(f"{Fore.GREEN}✓ Shutdown complete")
-        print(f"{Fore.CYAN}{'='*60}\n")
+        console.info(f"{Fore.GREEN}✓ Shutdown complete")
+        console.info(f"{Fore.CYAN}{'='*60}\n")
+        stop_console()
+
+def cmd_run(args) -> int:
+    """Connect to Discord and monitor the configured channels"""
+    import asyncio
+    from colorama import Fore
+    from utils.console import console
 
-if __name__ == '__main__':
     # Import discord here to catch import errors
     try:
-        import discord
+        import discord  # noqa: F401
     except ImportError:
-        print(f"{Fore.RED}❌ Error: discord.py-self is not installed")
-        print(f"{Fore.CYAN}💡 Run: pip install -r requirements.txt")
-        sys.exit(1)
-    
+        console.error(f"{Fore.RED}❌ Error: discord.py-self is not installed")
+        console.info(f"{Fore.CYAN}💡 Run: pip install -r requirements.txt")
+        return 1
+
+    from config import load_config
+    config = load_config()
+
     # Run the async main function
-    asyncio.run(main())
+    asyncio.run(main(config))
+    return 0
+
+def cmd_check(args) -> int:
+    """Validate .env and show the resulting configuration, without connecting"""
+    from colorama import Fore
+    from config import load_config
+    from utils.console import console
+
+    config = load_config()
+    config.display_config()
+    console.info(f"{Fore.GREEN}✓ Configuration is valid")
+    return 0
+
+def cmd_search(args) -> int:
+    """Search the message archive (same options as python -m utils.archive)"""
+    from utils.archive import main as archive_main
+    return archive_main(args.passthrough)
+
+def cmd_export(args) -> int:
+    """Export day logs to legacy JSON arrays (same options as python -m utils.storage)"""
+    from utils.storage import main as storage_main
+    return storage_main(args.passthrough)
+
+def cmd_backfill(args) -> int:
+    """Convert historical day logs (same options as python -m utils.backfill)"""
+    from utils.backfill import main as backfill_main
+    return backfill_main(args.passthrough)
+
+def cmd_analytics(args) -> int:
+    """Show a day's aggregates (same options as python -m utils.analytics)"""
+    from utils.analytics import main as analytics_main
+    return analytics_main(args.passthrough)
+
+def cmd_profile_imports(args) -> int:
+    """Report how long importing a module takes, and which imports cost the most"""
+    from utils.import_profile import profile_imports, format_report
+
+    try:
+        timings, elapsed = profile_imports(args.module)
+    except RuntimeError as e:
+        print(f"Import of '{args.module}' failed:\n{e}")
+        return 1
+    print('\n'.join(format_report(args.module, timings, elapsed, args.top)))
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    """Command line parser (no command = run)"""
+    parser = argparse.ArgumentParser(
+        prog='python main.py',
+        description='Discord Stream Monitor'
+    )
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    run = commands.add_parser('run', help='Monitor the configured channels (default)')
+    run.set_defaults(handler=cmd_run)
+
+    check = commands.add_parser('check', help='Validate .env and show the configuration')
+    check.set_defaults(handler=cmd_check)
+
+    # Their arguments (including --help) go untouched to the tools' own parsers
+    search = commands.add_parser('search', help='Search the message archive', add_help=False)
+    search.set_defaults(handler=cmd_search, passthrough=True)
+
+    export = commands.add_parser('export', help='Export day logs to JSON arrays', add_help=False)
+    export.set_defaults(handler=cmd_export, passthrough=True)
+
+    backfill = commands.add_parser('backfill', help='Convert historical logs in bulk', add_help=False)
+    backfill.set_defaults(handler=cmd_backfill, passthrough=True)
+
+    analytics = commands.add_parser('analytics', help="Show a day's message counts", add_help=False)
+    analytics.set_defaults(handler=cmd_analytics, passthrough=True)
+
+    profile = commands.add_parser('profile-imports', help='Show where import time goes')
+    profile.add_argument('module', nargs='?', default='monitor',
+                         help="Module to import (default: monitor, what 'run' loads)")
+    profile.add_argument('--top', type=int, default=15, help='Rows per table')
+    profile.set_defaults(handler=cmd_profile_imports)
+
+    return parser
+
+def cli(argv: Optional[List[str]] = None) -> int:
+    """Parse the command line and run the chosen command"""
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if getattr(args, 'passthrough', False):
+        args.passthrough = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    handler = getattr(args, 'handler', cmd_run)
+    return handler(args)
+
+if __name__ == '__main__':
+    sys.exit(cli())
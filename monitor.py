@@ -3,15 +3,25 @@ Core Discord monitoring logic
 Event-driven message capture and image downloading
 """
 
+import time
+import asyncio
 import discord
 from datetime import datetime
-from typing import List
+from typing import List, Set
 from colorama import Fore
 
-from config import config
-from utils.logger import get_logger
-from utils.downloader import get_downloader
+from config import config, ENV_FILE
+from utils.ingest import IngestPipeline, message_fields, edit_fields, delete_fields
+from utils.shards import ShardPool, adopt_job_stores
 from utils.alerts import alerts
+from utils.console import console
+from utils.config_watcher import ConfigWatcher
+from utils.rules import RuleSet
+from utils.recent import get_recent_cache, recent_routes
+from utils.metrics import (
+    messages_received, message_changes, message_handler_seconds,
+    metrics, monitor_loop_lag, report_snapshots, start_metrics_server
+)
 
 class DiscordMonitor(discord.Client):
     """Discord client for monitoring channels"""
@@ -20,25 +30,124 @@ class DiscordMonitor(discord.Client):
         # Initialize Discord client (discord.py-self doesn't use intents)
         super().__init__()
         
-        # Initialize utilities
-        self.logger = get_logger(config.logs_dir, config.timezone_offset)
-        self.downloader = get_downloader(config.downloads_dir)
-        self.monitored_channels = set(config.channel_ids)
+        # Persistence runs in this process, or in worker processes by channel
+        if config.shard_workers > 0:
+            self.pipeline = ShardPool(
+                config.shard_workers,
+                batch_size=config.write_batch_size,
+                flush_interval=config.write_flush_interval,
+                max_queue=config.shard_queue_size,
+                drain_timeout=config.download_drain_timeout + 30
+            )
+        else:
+            self.pipeline = IngestPipeline(
+                config.logs_dir,
+                config.downloads_dir,
+                config.archive_db if config.archive_enabled else None
+            )
+        # Replaced as a whole on reload, never mutated
+        self.monitored_channels = frozenset(config.channel_ids)
+        
+        # Recent messages in memory, for lookups without reading the logs
+        self.recent = None
+        if config.recent_cache_bytes > 0:
+            self.recent = get_recent_cache(config.recent_cache_bytes, config.recent_cache_per_channel)
+            metrics.gauge('dsm_recent_cache_bytes', 'Estimated memory held by the recent-message cache',
+                          callback=lambda: self.recent.bytes)
+            metrics.gauge('dsm_recent_cache_messages', 'Messages in the recent-message cache',
+                          callback=lambda: len(self.recent))
+        
+        # Routing rules, checked before any other work on a message
+        self.rules = RuleSet.load(config.rules_file)
+        
+        # Live configuration changes from .env (and edits to the rules file)
+        self.config_watcher = ConfigWatcher(ENV_FILE, config.config_reload_interval)
+        self.config_watcher.add_listener(self._apply_config)
+        self.config_watcher.watch_file('rules_file', self._load_rules)
+        
+        # Console activity summaries instead of one line per message
+        alerts.summary_interval = config.console_summary_interval
+        
+        # Instrumentation
+        self._background_tasks = []
+        self._metrics_runner = None
+        self._config_task = None
+    
+    async def setup_hook(self):
+        """Called once before connecting; starts background tasks"""
+        if config.shard_workers <= 0:
+            # Jobs left in shard directories by an earlier SHARD_WORKERS setting
+            await asyncio.get_running_loop().run_in_executor(
+                None, adopt_job_stores, config.logs_dir, 0
+            )
+        await self.pipeline.start()
+        
+        loop = asyncio.get_running_loop()
+        self._background_tasks.append(loop.create_task(monitor_loop_lag()))
+        if alerts.summary_interval > 0:
+            self._background_tasks.append(loop.create_task(alerts.report_activity()))
+        if config.metrics_snapshot_interval > 0:
+            self._background_tasks.append(
+                loop.create_task(report_snapshots(config.metrics_snapshot_interval))
+            )
+        if config.metrics_port:
+            self._metrics_runner = await start_metrics_server(
+                config.metrics_host,
+                config.metrics_port,
+                recent_routes(self.recent) if self.recent is not None else None
+            )
+        
+        self.config_watcher.install_signal_handler()
+        self._config_task = loop.create_task(self.config_watcher.run())
+    
+    def _describe_channel(self, channel_id: int) -> str:
+        """'#name (in Guild)' for a channel, or its ID if it isn't visible"""
+        channel = self.get_channel(channel_id)
+        if not channel:
+            return str(channel_id)
+        guild_name = channel.guild.name if hasattr(channel, 'guild') else 'DM'
+        return f"#{channel.name} (in {guild_name})"
+    
+    async def _apply_config(self, changed: Set[str]):
+        """Apply a reloaded configuration without reconnecting"""
+        if 'channel_ids' in changed:
+            channels = frozenset(config.channel_ids)
+            added = channels - self.monitored_channels
+            removed = self.monitored_channels - channels
+            self.monitored_channels = channels
+            for channel_id in added:
+                console.info(f"{Fore.GREEN}  + Monitoring {self._describe_channel(channel_id)}")
+            for channel_id in removed:
+                console.info(f"{Fore.YELLOW}  - Stopped monitoring {self._describe_channel(channel_id)}")
+        
+        await self.pipeline.apply_config(changed)
+    
+    def _load_rules(self):
+        """Recompile the rules file, keeping the current rules if it is invalid"""
+        try:
+            rules = RuleSet.load(config.rules_file)
+        except ValueError as e:
+            console.warning(f"{Fore.YELLOW}⚠️  Rules not reloaded: {e}")
+            return
+        self.rules = rules
+        console.info(f"{Fore.GREEN}🔄 Loaded {len(rules)} routing rule(s)")
     
     async def on_ready(self):
         """Called when the bot successfully connects to Discord"""
-        print(f"{Fore.GREEN}✓ Logged in as {Fore.WHITE}{self.user}")
-        print(f"{Fore.GREEN}✓ User ID: {Fore.WHITE}{self.user.id}")
+        console.info(f"{Fore.GREEN}✓ Logged in as {Fore.WHITE}{self.user}")
+        console.info(f"{Fore.GREEN}✓ User ID: {Fore.WHITE}{self.user.id}")
         
         # Display monitored channels
-        print(f"\n{Fore.CYAN}📡 Monitoring {len(self.monitored_channels)} channel(s):")
+        console.info(f"\n{Fore.CYAN}📡 Monitoring {len(self.monitored_channels)} channel(s):")
         for channel_id in self.monitored_channels:
             channel = self.get_channel(channel_id)
             if channel:
                 guild_name = channel.guild.name if hasattr(channel, 'guild') else 'DM'
-                print(f"{Fore.WHITE}  • #{channel.name} {Fore.CYAN}(in {guild_name})")
+                console.info(f"{Fore.WHITE}  • #{channel.name} {Fore.CYAN}(in {guild_name})")
             else:
-                print(f"{Fore.YELLOW}  ⚠️  Channel {channel_id} not found (might need access)")
+                console.warning(f"{Fore.YELLOW}  ⚠️  Channel {channel_id} not found (might need access)")
+        if self.rules:
+            console.info(f"{Fore.GREEN}✓ {len(self.rules)} routing rule(s) from {config.rules_file.name}")
         
         alerts.info_startup()
     
@@ -55,35 +164,28 @@ class DiscordMonitor(discord.Client):
         if message.channel.id not in self.monitored_channels:
             return
         
-        # Get channel name
-        channel_name = message.channel.name if hasattr(message.channel, 'name') else 'DM'
+        started = time.perf_counter()
+        messages_received.inc(labels=(message.channel.id,))
         
-        # Process attachments (images)
-        attachment_data = []
-        if message.attachments:
-            for attachment in message.attachments:
-                # Download the image
-                download_result = await self.downloader.download_image(
-                    url=attachment.url,
-                    message_id=message.id,
-                    filename=attachment.filename
-                )
-                attachment_data.append(download_result)
-        
-        # Format message data for logging
-        message_data = self.logger.format_message(
-            message_id=message.id,
-            timestamp=message.created_at.isoformat(),
-            author_name=str(message.author),
-            author_id=message.author.id,
-            channel_id=message.channel.id,
-            channel_name=channel_name,
-            content=message.content,
-            attachments=attachment_data
+        # Drop, sample or route the message before doing any work on it
+        route = self.rules.match(
+            message.id, message.channel.id, message.author.id,
+            message.content, bool(message.attachments)
         )
+        if route is None:
+            message_handler_seconds.observe(time.perf_counter() - started)
+            return
         
-        # Log to JSON file
-        await self.logger.log_message(message_data)
+        # Hand off for logging and attachment downloads
+        fields = message_fields(message)
+        route.apply(fields)
+        await self.pipeline.ingest(fields)
+        if self.recent is not None:
+            self.recent.add(fields)
+        
+        if not route.console:
+            message_handler_seconds.observe(time.perf_counter() - started)
+            return
         
         # Console output
         content_preview = message.content if message.content else "[No text]"
@@ -92,23 +194,107 @@ class DiscordMonitor(discord.Client):
         
         alerts.info_message_received(
             author=str(message.author),
-            channel=channel_name,
+            channel=fields['channel_name'],
             content_preview=content_preview
         )
+        
+        message_handler_seconds.observe(time.perf_counter() - started)
+    
+    def _route_change(self, change: dict, message: discord.Message, record: dict = None):
+        """Rules route for an edited or deleted message (None = not recorded)"""
+        if message is not None:
+            if message.author == self.user:
+                return None
+            return self.rules.match(
+                message.id, message.channel.id, message.author.id,
+                message.content, bool(message.attachments), count=False
+            )
+        if record is not None:
+            # Not in discord.py's cache, but seen recently by this monitor
+            return self.rules.match(
+                int(record['message_id']), int(record['channel_id']), int(record['author_id']),
+                record['content'], bool(record['attachments']), count=False
+            )
+        # Author and content are unknown: only channel rules can apply
+        return self.rules.match_channel(int(change['message_id']), int(change['channel_id']))
+    
+    async def _record_change(self, change: dict, message: discord.Message):
+        """Log an edit or deletion, following the rules that apply to its message"""
+        record = self.recent.get(change['message_id']) if self.recent is not None else None
+        route = self._route_change(change, message, record)
+        if route is None:
+            return
+        if route.log_target:
+            change['log_target'] = route.log_target
+        message_changes.inc(labels=(change['record_type'],))
+        await self.pipeline.ingest_change(change)
+        if record is not None:
+            self.recent.apply_change(change)
+        if route.console:
+            action = '✏️  Edited' if change['record_type'] == 'edit' else '🗑️  Deleted'
+            console.info(f"{Fore.CYAN}{action} message {change['message_id']}")
+    
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        """Called for every message edit, whether or not the message is cached"""
+        if payload.channel_id not in self.monitored_channels:
+            return
+        change = edit_fields(payload)
+        if change is None:
+            return
+        if payload.cached_message is None and self.recent is not None:
+            # Link preview updates of uncached messages: compare with our copy instead
+            record = self.recent.get(payload.message_id)
+            if record is not None and record['content'] == change['content']:
+                return
+        await self._record_change(change, payload.message)
+    
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        """Called for every deleted message, whether or not it is cached"""
+        if payload.channel_id not in self.monitored_channels:
+            return
+        await self._record_change(
+            delete_fields(payload.message_id, payload.channel_id),
+            payload.cached_message
+        )
+    
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        """Called when messages are deleted in bulk (e.g. by a moderator purge)"""
+        if payload.channel_id not in self.monitored_channels:
+            return
+        cached = {message.id: message for message in payload.cached_messages}
+        for message_id in sorted(payload.message_ids):
+            await self._record_change(
+                delete_fields(message_id, payload.channel_id),
+                cached.get(message_id)
+            )
     
     async def on_disconnect(self):
         """Called when the bot disconnects from Discord"""
-        print(f"{Fore.YELLOW}⚠️  Disconnected from Discord")
+        console.warning(f"{Fore.YELLOW}⚠️  Disconnected from Discord")
     
     async def on_error(self, event, *args, **kwargs):
         """Called when an error occurs"""
-        import traceback
-        print(f"{Fore.RED}❌ Error in {event}:")
-        traceback.print_exc()
+        console.exception(f"{Fore.RED}❌ Error in {event}:")
     
     async def close(self):
         """Clean shutdown"""
-        await self.downloader.close()
+        # No reloads while the pipeline shuts down
+        if self._config_task:
+            self._config_task.cancel()
+            await asyncio.gather(self._config_task, return_exceptions=True)
+            self._config_task = None
+        await self.pipeline.drain()
+        
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+        alerts.flush_activity()
+        if self._metrics_runner:
+            await self._metrics_runner.cleanup()
+            self._metrics_runner = None
+        
+        await self.pipeline.close()
         await super().close()
 
 def create_monitor() -> DiscordMonitor:
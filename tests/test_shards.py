@@ -0,0 +1,51 @@
+"""
+Tests for utils.shards
+Shard workers must see .env changes when the gateway asks them to reload
+"""
+
+import os
+import multiprocessing
+
+import config
+from utils.shards import _init_shard_env, _RELOAD
+
+
+def _report_env(env_file: str, env_file_keys, inbox, outbox):
+    """Child process: report the variables after start-up and after each reload"""
+    config.ENV_FILE = env_file
+    _init_shard_env(env_file_keys)
+    while True:
+        outbox.put((os.getenv('DSM_TEST_VALUE'), os.getenv('DSM_TEST_PINNED')))
+        if inbox.get() != _RELOAD:
+            break
+        config.load_env()
+
+
+def test_reload_reaches_spawned_shard(tmp_path, monkeypatch):
+    env_file = tmp_path / '.env'
+    env_file.write_text('DSM_TEST_VALUE=111\n')
+    monkeypatch.setattr(config, 'ENV_FILE', str(env_file))
+    monkeypatch.delenv('DSM_TEST_VALUE', raising=False)
+    config.load_env()
+    assert os.environ['DSM_TEST_VALUE'] == '111'
+
+    # Set outside .env: a real process variable, which .env never overrides
+    monkeypatch.setenv('DSM_TEST_PINNED', 'process')
+
+    context = multiprocessing.get_context('spawn')
+    inbox, outbox = context.Queue(), context.Queue()
+    child = context.Process(
+        target=_report_env, args=(str(env_file), config.env_file_keys(), inbox, outbox)
+    )
+    child.start()
+    try:
+        assert outbox.get(timeout=30) == ('111', 'process')
+
+        env_file.write_text('DSM_TEST_VALUE=222\nDSM_TEST_PINNED=file\n')
+        inbox.put(_RELOAD)
+        assert outbox.get(timeout=30) == ('222', 'process')
+    finally:
+        inbox.put(None)
+        child.join(30)
+        env_file.write_text('')
+        config.load_env()
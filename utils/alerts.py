@@ -3,67 +3,116 @@ Alert system for critical events
 Currently uses console alerts; future: webhook support
 """
 
+import asyncio
+import logging
 from colorama import Fore, Style
 from datetime import datetime
+from typing import Dict, Any
+
+from utils.console import console
 
 class AlertSystem:
     """Handles alerts for critical events"""
     
+    def __init__(self):
+        # Seconds between per-channel activity summaries (0 = print every message)
+        self.summary_interval = 0
+        # channel -> [message count, latest author, latest preview]
+        self._activity: Dict[str, Any] = {}
+    
     @staticmethod
     def alert_token_invalid():
         """Alert when Discord token is invalid or expired"""
-        print(f"\n{Fore.RED}{'='*60}")
-        print(f"{Fore.RED}❌ ALERT: Invalid or Expired Token")
-        print(f"{Fore.RED}{'='*60}")
-        print(f"{Fore.YELLOW}Your Discord token may be invalid or expired.")
-        print(f"{Fore.YELLOW}Please update the DISCORD_TOKEN in your .env file.")
-        print(f"\n{Fore.CYAN}To get a new token:")
-        print(f"{Fore.CYAN}1. Open Discord in browser")
-        print(f"{Fore.CYAN}2. Press F12 → Network tab")
-        print(f"{Fore.CYAN}3. Refresh page and find 'authorization' header")
-        print(f"{Fore.RED}{'='*60}\n")
+        console.error('\n'.join([
+            f"\n{Fore.RED}{'='*60}",
+            f"{Fore.RED}❌ ALERT: Invalid or Expired Token",
+            f"{Fore.RED}{'='*60}",
+            f"{Fore.YELLOW}Your Discord token may be invalid or expired.",
+            f"{Fore.YELLOW}Please update the DISCORD_TOKEN in your .env file.",
+            f"\n{Fore.CYAN}To get a new token:",
+            f"{Fore.CYAN}1. Open Discord in browser",
+            f"{Fore.CYAN}2. Press F12 → Network tab",
+            f"{Fore.CYAN}3. Refresh page and find 'authorization' header",
+            f"{Fore.RED}{'='*60}\n"
+        ]))
     
     @staticmethod
     def alert_connection_lost(retry_count: int, max_retries: int):
         """Alert when connection is lost"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"\n{Fore.YELLOW}⚠️  [{timestamp}] Connection lost!")
-        print(f"{Fore.YELLOW}   Retry {retry_count}/{max_retries}...")
+        console.warning(
+            f"\n{Fore.YELLOW}⚠️  [{timestamp}] Connection lost!\n"
+            f"{Fore.YELLOW}   Retry {retry_count}/{max_retries}..."
+        )
     
     @staticmethod
     def alert_connection_restored():
         """Alert when connection is restored"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"\n{Fore.GREEN}✅ [{timestamp}] Connection restored!")
+        console.info(f"\n{Fore.GREEN}✅ [{timestamp}] Connection restored!")
     
     @staticmethod
     def alert_max_retries_exceeded():
         """Alert when max reconnection attempts exceeded"""
-        print(f"\n{Fore.RED}{'='*60}")
-        print(f"{Fore.RED}❌ ALERT: Connection Failed")
-        print(f"{Fore.RED}{'='*60}")
-        print(f"{Fore.YELLOW}Could not reconnect after multiple attempts.")
-        print(f"{Fore.YELLOW}Please check your internet connection.")
-        print(f"{Fore.RED}{'='*60}\n")
+        console.error('\n'.join([
+            f"\n{Fore.RED}{'='*60}",
+            f"{Fore.RED}❌ ALERT: Connection Failed",
+            f"{Fore.RED}{'='*60}",
+            f"{Fore.YELLOW}Could not reconnect after multiple attempts.",
+            f"{Fore.YELLOW}Please check your internet connection.",
+            f"{Fore.RED}{'='*60}\n"
+        ]))
     
-    @staticmethod
-    def info_message_received(author: str, channel: str, content_preview: str):
-        """Info log for received message"""
+    def info_message_received(self, author: str, channel: str, content_preview: str):
+        """Info log for received message (counted instead when summarizing)"""
+        if self.summary_interval > 0:
+            entry = self._activity.get(channel)
+            if entry is None:
+                self._activity[channel] = [1, author, content_preview]
+            else:
+                entry[0] += 1
+                entry[1] = author
+                entry[2] = content_preview
+            return
+        
+        if not console.isEnabledFor(logging.INFO):
+            return
         timestamp = datetime.now().strftime('%H:%M:%S')
         preview = content_preview[:50] + '...' if len(content_preview) > 50 else content_preview
-        print(f"{Fore.CYAN}💬 [{timestamp}] {Fore.WHITE}{author} {Fore.CYAN}in {Fore.WHITE}#{channel}")
+        line = f"{Fore.CYAN}💬 [{timestamp}] {Fore.WHITE}{author} {Fore.CYAN}in {Fore.WHITE}#{channel}"
         if preview:
-            print(f"{Fore.WHITE}   {preview}")
+            line += f"\n{Fore.WHITE}   {preview}"
+        console.info(line)
+    
+    def flush_activity(self):
+        """Print one summary line per channel for messages counted since the last flush"""
+        activity, self._activity = self._activity, {}
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        for channel, (count, author, content_preview) in activity.items():
+            preview = content_preview[:50] + '...' if len(content_preview) > 50 else content_preview
+            console.info(
+                f"{Fore.CYAN}💬 [{timestamp}] {Fore.WHITE}{count:,} {Fore.CYAN}message(s) in "
+                f"{Fore.WHITE}#{channel} {Fore.CYAN}in last {self.summary_interval:g}s, "
+                f"latest from {Fore.WHITE}{author}" + (f": {preview}" if preview else '')
+            )
+    
+    async def report_activity(self):
+        """Background task: print per-channel summaries every summary_interval until cancelled"""
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            self.flush_activity()
     
     @staticmethod
     def info_startup():
         """Info log for successful startup"""
-        print(f"\n{Fore.GREEN}{'='*60}")
-        print(f"{Fore.GREEN}🚀 Discord Stream Monitor Started")
-        print(f"{Fore.GREEN}{'='*60}")
-        print(f"{Fore.CYAN}Listening for messages...")
-        print(f"{Fore.CYAN}Press Ctrl+C to stop")
-        print(f"{Fore.GREEN}{'='*60}\n")
+        console.info('\n'.join([
+            f"\n{Fore.GREEN}{'='*60}",
+            f"{Fore.GREEN}🚀 Discord Stream Monitor Started",
+            f"{Fore.GREEN}{'='*60}",
+            f"{Fore.CYAN}Listening for messages...",
+            f"{Fore.CYAN}Press Ctrl+C to stop",
+            f"{Fore.GREEN}{'='*60}\n"
+        ]))
 
 # Global alert system instance
 alerts = AlertSystem()
@@ -0,0 +1,417 @@
+"""
+Per-day aggregates of logged messages
+Counts by channel, author and hour kept up to date as records are written, for dashboards that shouldn't scan the logs
+"""
+
+import os
+import json
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, tzinfo
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from colorama import Fore
+
+from utils.console import console
+from utils.reader import LogReader, iter_file
+
+# Aggregates (and columnar tables) are kept in this directory under each logs directory
+ANALYTICS_DIR = 'analytics'
+
+
+class DayAggregates:
+    """Counts for one day of records"""
+
+    def __init__(self, date: str):
+        self.date = date
+        self.messages = 0
+        self.edits = 0
+        self.deletes = 0
+        self.attachments = 0
+        self.attachment_bytes = 0
+        self.downloads = 0
+        self.downloaded_bytes = 0
+        # Messages per hour of the day, in the logger's time zone
+        self.hours = [0] * 24
+        # channel_id -> {'name', 'messages', 'attachments', 'attachment_bytes', 'downloaded_bytes'}
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        # author_id -> {'name', 'messages'}
+        self.authors: Dict[str, Dict[str, Any]] = {}
+
+    def _channel(self, channel_id: str, name: Optional[str] = None) -> Dict[str, Any]:
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = {
+                'name': name, 'messages': 0, 'attachments': 0, 'attachment_bytes': 0, 'downloaded_bytes': 0
+            }
+        elif name:
+            channel['name'] = name
+        return channel
+
+    def add(self, record: Dict[str, Any], tz: tzinfo):
+        """Count one log record (message, attachment, edit or delete)"""
+        record_type = record.get('record_type')
+        channel_id = str(record.get('channel_id'))
+
+        if record_type is None:
+            self.messages += 1
+            channel = self._channel(channel_id, record.get('channel_name'))
+            channel['messages'] += 1
+
+            author_id = str(record.get('author_id'))
+            author = self.authors.get(author_id)
+            if author is None:
+                author = self.authors[author_id] = {'name': record.get('author'), 'messages': 0}
+            author['messages'] += 1
+
+            try:
+                self.hours[datetime.fromisoformat(record['timestamp']).astimezone(tz).hour] += 1
+            except (KeyError, TypeError, ValueError):
+                pass
+
+            for attachment in record.get('attachments') or ():
+                size = attachment.get('size') or 0
+                self.attachments += 1
+                self.attachment_bytes += size
+                channel['attachments'] += 1
+                channel['attachment_bytes'] += size
+                # Legacy records were written after their downloads finished
+                if attachment.get('downloaded'):
+                    self.downloads += 1
+                    self.downloaded_bytes += size
+                    channel['downloaded_bytes'] += size
+        elif record_type == 'attachment':
+            attachment = record.get('attachment') or {}
+            # 'processed' records add thumbnail fields to a download already counted
+            if attachment.get('downloaded') and attachment.get('status') != 'processed':
+                size = attachment.get('size') or 0
+                self.downloads += 1
+                self.downloaded_bytes += size
+                self._channel(channel_id)['downloaded_bytes'] += size
+        elif record_type == 'edit':
+            self.edits += 1
+        elif record_type == 'delete':
+            self.deletes += 1
+
+    def merge(self, other: 'DayAggregates'):
+        """Add another set of counts for the same day (e.g. from another shard)"""
+        for name in ('messages', 'edits', 'deletes', 'attachments', 'attachment_bytes',
+                     'downloads', 'downloaded_bytes'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.hours = [a + b for a, b in zip(self.hours, other.hours)]
+        for channel_id, counts in other.channels.items():
+            channel = self._channel(channel_id, counts['name'])
+            for key in ('messages', 'attachments', 'attachment_bytes', 'downloaded_bytes'):
+                channel[key] += counts[key]
+        for author_id, counts in other.authors.items():
+            author = self.authors.setdefault(author_id, {'name': counts['name'], 'messages': 0})
+            author['messages'] += counts['messages']
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'date': self.date,
+            'messages': self.messages,
+            'edits': self.edits,
+            'deletes': self.deletes,
+            'attachments': self.attachments,
+            'attachment_bytes': self.attachment_bytes,
+            'downloads': self.downloads,
+            'downloaded_bytes': self.downloaded_bytes,
+            'hours': self.hours,
+            'channels': self.channels,
+            'authors': self.authors
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DayAggregates':
+        day = cls(data['date'])
+        for name in ('messages', 'edits', 'deletes', 'attachments', 'attachment_bytes',
+                     'downloads', 'downloaded_bytes'):
+            setattr(day, name, data.get(name, 0))
+        day.hours = list(data.get('hours', day.hours))
+        day.channels = data.get('channels', {})
+        day.authors = data.get('authors', {})
+        return day
+
+
+def stats_path(logs_dir: Path, date: str) -> Path:
+    """Aggregates file of a day in one logs directory"""
+    return logs_dir / ANALYTICS_DIR / f"{date}.json"
+
+
+def load_day(logs_dir: Path, date: str) -> Optional[DayAggregates]:
+    """Read a day's aggregates written in one logs directory, or None"""
+    try:
+        data = json.loads(stats_path(logs_dir, date).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    return DayAggregates.from_dict(data)
+
+
+def save_day(logs_dir: Path, day: DayAggregates):
+    """Write a day's aggregates (atomic replace)"""
+    path = stats_path(logs_dir, day.date)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps(day.to_dict(), ensure_ascii=False), encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def _log_dirs(logs_dir: Path) -> List[Path]:
+    """Every directory with its own aggregates: the logs directory, its shards and their log targets"""
+    from utils.backfill import _day_file_dirs
+    return _day_file_dirs(logs_dir)
+
+
+def load_merged(logs_dir: Path, date: str) -> Optional[DayAggregates]:
+    """A day's aggregates across the logs directory, its shard and its log target directories"""
+    merged = None
+    for directory in _log_dirs(logs_dir):
+        day = load_day(directory, date)
+        if day is None:
+            continue
+        if merged is None:
+            merged = day
+        else:
+            merged.merge(day)
+    return merged
+
+
+def rebuild_day(logs_dir: Path, date: str, tz: tzinfo) -> DayAggregates:
+    """Recount a day from its log files in one directory (shards not included)"""
+    day = DayAggregates(date)
+    for path in LogReader(logs_dir).files(date, date, include_shards=False):
+        for _, record in iter_file(path):
+            day.add(record, tz)
+    return day
+
+
+def export_columnar(logs_dir: Path, date: str, fmt: str = 'auto', include_content: bool = False) -> Path:
+    """
+    Write a day's messages as a column table next to its aggregates
+
+    Args:
+        logs_dir: Logs directory holding the day's files
+        date: Day to export (YYYY-MM-DD)
+        fmt: 'parquet', 'npz' or 'auto' (see utils.columnar)
+        include_content: Keep message text
+
+    Returns:
+        The file written
+    """
+    from utils.columnar import MessageTable
+
+    for attempt in (1, 2):
+        table = MessageTable(include_content)
+        try:
+            for path in LogReader(logs_dir).files(date, date, include_shards=False):
+                for _, record in iter_file(path):
+                    table.add(record)
+        except FileNotFoundError:
+            # Compressed (and removed) while listed; the compressed copy is there now
+            if attempt == 2:
+                raise
+            continue
+        return table.write(logs_dir / ANALYTICS_DIR / date, fmt)
+
+
+class DailyAggregator:
+    """
+    Running aggregates of the day being logged, attached to a DailyLogger
+
+    Counts are updated in memory as batches are written and saved every
+    `flush_interval` seconds, when the day ends and on close. A restart
+    picks up the saved counts, so at most one interval of records can be
+    missing after a crash (rebuild_day() recounts a day exactly).
+    """
+
+    def __init__(
+        self,
+        logs_dir: Path,
+        tz: tzinfo,
+        flush_interval: float = 60.0,
+        columnar_format: Optional[str] = None
+    ):
+        """
+        Args:
+            logs_dir: Logs directory of the logger (aggregates go in its analytics/)
+            tz: Time zone for the hour counts (the logger's)
+            flush_interval: Seconds between saves of the current day
+            columnar_format: Also export each finished day as a column table
+                ('parquet', 'npz' or 'auto'; None = no export)
+        """
+        self.logs_dir = logs_dir
+        self.tz = tz
+        self.flush_interval = flush_interval
+        self.columnar_format = columnar_format
+        self.day: Optional[DayAggregates] = None
+        self._dirty = False
+        self._next_flush = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def add(self, records: List[Dict[str, Any]], date: str):
+        """
+        Count a batch written to the given day's file
+
+        Blocking; called by the logger with its lock held.
+        """
+        if self.day is None or self.day.date != date:
+            self._start_day(date)
+        for record in records:
+            self.day.add(record, self.tz)
+        self._dirty = True
+
+        now = time.monotonic()
+        if now >= self._next_flush:
+            self.flush()
+            self._next_flush = now + self.flush_interval
+
+    def _start_day(self, date: str):
+        """Finish the previous day and continue (or start) the counts for a new one"""
+        if self.day is not None:
+            self.flush()
+            if self.columnar_format:
+                self._export(self.day.date)
+        self.day = load_day(self.logs_dir, date) or DayAggregates(date)
+
+    def _export(self, date: str):
+        """Columnar export of a finished day in a worker process, off the logging process's GIL"""
+        if self._executor is None:
+            # Spawn rather than fork: the logger's threads and locks must not be inherited
+            self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        started = time.monotonic()
+        future = self._executor.submit(export_columnar, self.logs_dir, date, self.columnar_format)
+        future.add_done_callback(lambda done: self._exported(date, started, done))
+
+    @staticmethod
+    def _exported(date: str, started: float, future: Future):
+        """Report a finished export"""
+        try:
+            dest = future.result()
+            console.info(f"{Fore.GREEN}📊 Exported {date} to {dest.name} ({time.monotonic() - started:.1f}s)")
+        except Exception as e:
+            console.error(f"{Fore.RED}❌ Error exporting {date} analytics: {e}")
+
+    def flush(self):
+        """Save the current day's counts if they changed"""
+        if self.day is None or not self._dirty:
+            return
+        try:
+            save_day(self.logs_dir, self.day)
+            self._dirty = False
+        except OSError as e:
+            console.error(f"{Fore.RED}❌ Error saving analytics: {e}")
+
+    def close(self):
+        """Save the counts and wait for exports in progress"""
+        self.flush()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def create_aggregator(logs_dir: Path, tz: tzinfo, flush_interval: float = 60.0,
+                      columnar: str = 'none') -> DailyAggregator:
+    """Create an aggregator; a columnar format whose library is missing is disabled with a warning"""
+    columnar_format = None
+    if columnar != 'none':
+        from utils.columnar import resolve_format
+        try:
+            columnar_format = resolve_format(columnar)
+        except ValueError as e:
+            console.warning(f"{Fore.YELLOW}⚠️  Columnar analytics export disabled: {e}")
+    return DailyAggregator(logs_dir, tz, flush_interval, columnar_format)
+
+
+def _format_summary(day: DayAggregates, top: int) -> List[str]:
+    """Console summary of a day's aggregates"""
+    lines = [
+        f"{day.date}: {day.messages:,} messages, {day.edits:,} edits, {day.deletes:,} deletions",
+        f"  attachments: {day.attachments:,} ({day.attachment_bytes:,} bytes), "
+        f"downloaded: {day.downloads:,} ({day.downloaded_bytes:,} bytes)",
+        '',
+        'Busiest channels:'
+    ]
+    for channel_id, counts in sorted(day.channels.items(), key=lambda item: -item[1]['messages'])[:top]:
+        lines.append(f"  {counts['messages']:8,}  #{counts['name'] or channel_id}")
+    lines.append('')
+    lines.append('Most active authors:')
+    for author_id, counts in sorted(day.authors.items(), key=lambda item: -item[1]['messages'])[:top]:
+        lines.append(f"  {counts['messages']:8,}  {counts['name'] or author_id}")
+    lines.append('')
+    lines.append('Messages by hour:')
+    peak = max(day.hours) or 1
+    for hour, count in enumerate(day.hours):
+        lines.append(f"  {hour:02d}:00 {count:8,} {'#' * round(40 * count / peak)}".rstrip())
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: show (or recount) a day's aggregates"""
+    import argparse
+    from config import load_env
+    from utils.logger import parse_timezone
+
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.analytics',
+        description="Show a day's message counts by channel, author and hour"
+    )
+    parser.add_argument('--logs-dir', type=Path, default=Path(__file__).parent.parent / 'logs',
+                        help='Logs directory (default: logs/)')
+    parser.add_argument('--date', help='Day to show (YYYY-MM-DD, default: the latest)')
+    parser.add_argument('--top', type=int, default=10, help='Channels and authors to list')
+    parser.add_argument('--json', action='store_true', help='Print the aggregates as JSON')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Recount the day from its log files first (and save the result)')
+    parser.add_argument('--timezone', default=None,
+                        help='Time zone of the hour counts when rebuilding (default: TIMEZONE_OFFSET from .env)')
+    parser.add_argument('--columnar', choices=('auto', 'parquet', 'npz'),
+                        help='Also export the day as a column table')
+    args = parser.parse_args(argv)
+
+    if not args.logs_dir.is_dir():
+        print(f"Logs directory not found: {args.logs_dir}")
+        return 1
+    directories = _log_dirs(args.logs_dir)
+    date = args.date
+    if date is None:
+        files = [path for directory in directories for path in LogReader(directory).files(include_shards=False)]
+        if not files:
+            print("No day files found")
+            return 1
+        date = max(path.name[:10] for path in files)
+
+    if args.rebuild:
+        if args.timezone is None:
+            load_env()
+        try:
+            tz = parse_timezone(args.timezone or os.getenv('TIMEZONE_OFFSET', '+07:00'))
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+    try:
+        for directory in directories:
+            if not LogReader(directory).files(date, date, include_shards=False):
+                continue
+            if args.rebuild:
+                save_day(directory, rebuild_day(directory, date, tz))
+            if args.columnar:
+                print(f"Exported {export_columnar(directory, date, args.columnar)}")
+    except (OSError, ValueError) as e:
+        print(f"Error reading the {date} logs: {e}")
+        return 1
+
+    day = load_merged(args.logs_dir, date)
+    if day is None:
+        print(f"No aggregates for {date} (use --rebuild to count them from the logs)")
+        return 1
+    if args.json:
+        print(json.dumps(day.to_dict(), ensure_ascii=False))
+    else:
+        print('\n'.join(_format_summary(day, args.top)))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
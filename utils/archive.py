@@ -0,0 +1,338 @@
+"""
+Searchable SQLite message archive
+Indexed by channel, author and time, with full-text search on content
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    message_id TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    channel_name TEXT,
+    author_id TEXT NOT NULL,
+    author TEXT,
+    content TEXT,
+    attachments TEXT NOT NULL DEFAULT '[]',
+    edited_at TEXT,
+    edit_count INTEGER NOT NULL DEFAULT 0,
+    deleted_at TEXT
+);
+-- Single-column indexes keep rowid order, so newest-first pages stay cheap
+CREATE INDEX IF NOT EXISTS idx_messages_channel ON messages (channel_id);
+CREATE INDEX IF NOT EXISTS idx_messages_author ON messages (author_id);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE OF content ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+"""
+
+# Columns added after the first release, created on older databases when opened
+MIGRATIONS = (
+    ('edited_at', 'TEXT'),
+    ('edit_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('deleted_at', 'TEXT'),
+)
+
+# Latest state of every message that hasn't been deleted
+VIEWS = """
+CREATE VIEW IF NOT EXISTS current_messages AS
+    SELECT * FROM messages WHERE deleted_at IS NULL;
+"""
+
+COLUMNS = ('message_id', 'timestamp', 'channel_id', 'channel_name',
+           'author_id', 'author', 'content', 'attachments')
+
+# Maintained from edit and delete records
+STATE_COLUMNS = ('edited_at', 'edit_count', 'deleted_at')
+
+
+class MessageArchive:
+    """SQLite (WAL mode) archive of logged messages"""
+
+    def __init__(self, db_path: Path, busy_timeout: int = 5000):
+        """
+        Args:
+            db_path: Database file (created if missing)
+            busy_timeout: Milliseconds to wait for another process's write to finish
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        self._conn.executescript(VIEWS)
+    
+    def _migrate(self):
+        """Add columns missing from databases created by older versions"""
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        with self._conn:
+            for name, definition in MIGRATIONS:
+                if name not in existing:
+                    self._conn.execute(f"ALTER TABLE messages ADD COLUMN {name} {definition}")
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch of log records in a single transaction
+
+        Blocking; called from the batch writer's thread.
+
+        Returns:
+            Number of records applied
+        """
+        messages = []
+        updates = []
+        # Edits and deletions, applied in log order after the batch's new messages
+        changes = []
+        for record in records:
+            record_type = record.get('record_type')
+            if record_type is None:
+                messages.append((
+                    record['message_id'],
+                    record['timestamp'],
+                    record['channel_id'],
+                    record.get('channel_name'),
+                    record['author_id'],
+                    record.get('author'),
+                    record.get('content'),
+                    json.dumps(record.get('attachments', []), ensure_ascii=False)
+                ))
+            elif record_type == 'attachment':
+                updates.append((
+                    f"$[{int(record['index'])}]",
+                    json.dumps(record['attachment'], ensure_ascii=False),
+                    record['message_id']
+                ))
+            elif record_type == 'edit':
+                # Only edits newer than the one applied last, so replaying a log is a no-op
+                changes.append((
+                    "UPDATE messages SET content = ?, edited_at = ?, edit_count = edit_count + 1 "
+                    "WHERE message_id = ? AND (edited_at IS NULL OR edited_at < ?)",
+                    (record['content'], record['timestamp'], record['message_id'], record['timestamp'])
+                ))
+            elif record_type == 'delete':
+                changes.append((
+                    "UPDATE messages SET deleted_at = ? WHERE message_id = ? AND deleted_at IS NULL",
+                    (record['timestamp'], record['message_id'])
+                ))
+
+        with self._lock, self._conn:
+            if messages:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO messages ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(COLUMNS))})",
+                    messages
+                )
+            if updates:
+                self._conn.executemany(
+                    "UPDATE messages SET attachments = json_set(attachments, ?, json(?)) "
+                    "WHERE message_id = ?",
+                    updates
+                )
+            for sql, params in changes:
+                self._conn.execute(sql, params)
+        return len(messages) + len(updates) + len(changes)
+
+    def search(
+        self,
+        channel_id: Optional[str] = None,
+        author_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        text: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+        deleted: Optional[bool] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Search archived messages, newest first
+
+        Args:
+            channel_id: Only messages from this channel
+            author_id: Only messages from this author
+            since: ISO timestamp or YYYY-MM-DD lower bound (inclusive)
+            until: ISO timestamp or YYYY-MM-DD upper bound (exclusive)
+            text: FTS5 query matched against message content
+            limit: Maximum results per page
+            cursor: Value returned by the previous page, to continue from it
+            deleted: True = only deleted messages, False = only current ones, None = both
+
+        Returns:
+            (list of message dictionaries, cursor for the next page or None)
+        """
+        where = []
+        params: List[Any] = []
+
+        if text:
+            where.append("m.id IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)")
+            params.append(text)
+        if channel_id:
+            where.append("m.channel_id = ?")
+            params.append(str(channel_id))
+        if author_id:
+            where.append("m.author_id = ?")
+            params.append(str(author_id))
+        if since:
+            where.append("m.timestamp >= ?")
+            params.append(since)
+        if until:
+            where.append("m.timestamp < ?")
+            params.append(until)
+        if cursor is not None:
+            where.append("m.id < ?")
+            params.append(cursor)
+        if deleted is not None:
+            where.append("m.deleted_at IS NOT NULL" if deleted else "m.deleted_at IS NULL")
+
+        sql = f"SELECT m.id, {', '.join('m.' + c for c in COLUMNS + STATE_COLUMNS)} FROM messages m"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY m.id DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        results = [self._row_to_message(row) for row in rows]
+        next_cursor = rows[-1]['id'] if len(rows) == limit else None
+        return results, next_cursor
+
+    @staticmethod
+    def _row_to_message(row: sqlite3.Row) -> Dict[str, Any]:
+        """Message dictionary (latest state) from a messages row"""
+        message = {c: row[c] for c in COLUMNS + STATE_COLUMNS}
+        message['attachments'] = json.loads(row['attachments'])
+        return message
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest state of one message: current content, attachments and edit/delete times
+
+        Returns:
+            Message dictionary, or None if it isn't archived
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS + STATE_COLUMNS)} FROM messages WHERE message_id = ?",
+                (str(message_id),)
+            ).fetchone()
+        return self._row_to_message(row) if row else None
+
+    def count(self) -> int:
+        """Total number of archived messages"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def count_existing(self, message_ids: List[str]) -> int:
+        """Number of the given message IDs that are archived"""
+        return len(self.existing(message_ids))
+
+    def existing(self, message_ids: List[str]) -> List[str]:
+        """The given message IDs that are archived"""
+        found = []
+        with self._lock:
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                found.extend(row[0] for row in self._conn.execute(
+                    f"SELECT message_id FROM messages WHERE message_id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                ))
+        return found
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+# Global archive instance
+_archive_instance = None
+
+def get_archive(db_path: Path) -> MessageArchive:
+    """Get or create the global archive instance"""
+    global _archive_instance
+    if _archive_instance is None:
+        _archive_instance = MessageArchive(db_path)
+    return _archive_instance
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: search the archive"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.archive',
+        description='Search archived Discord messages'
+    )
+    parser.add_argument('--db', type=Path, default=Path(__file__).parent.parent / 'logs' / 'archive.db',
+                        help='Archive database (default: logs/archive.db)')
+    parser.add_argument('--channel', help='Channel ID')
+    parser.add_argument('--author', help='Author ID')
+    parser.add_argument('--since', help='Start date/time, e.g. 2026-01-06 or 2026-01-06T12:00')
+    parser.add_argument('--until', help='End date/time (exclusive)')
+    parser.add_argument('--text', help='Full-text query (FTS5 syntax, e.g. "hello AND world")')
+    parser.add_argument('--limit', type=int, default=50, help='Results per page')
+    parser.add_argument('--cursor', type=int, help='Continue from a previous page')
+    state = parser.add_mutually_exclusive_group()
+    state.add_argument('--deleted', action='store_true', help='Only messages that were deleted')
+    state.add_argument('--current', action='store_true', help='Only messages that were not deleted')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON Lines')
+    args = parser.parse_args(argv)
+
+    if not args.db.exists():
+        print(f"Archive not found: {args.db}")
+        return 1
+
+    archive = MessageArchive(args.db)
+    try:
+        results, next_cursor = archive.search(
+            channel_id=args.channel,
+            author_id=args.author,
+            since=args.since,
+            until=args.until,
+            text=args.text,
+            limit=args.limit,
+            cursor=args.cursor,
+            deleted=True if args.deleted else False if args.current else None
+        )
+    except sqlite3.OperationalError as e:
+        print(f"Query error: {e}")
+        return 1
+    finally:
+        archive.close()
+
+    for message in results:
+        if args.json:
+            print(json.dumps(message, ensure_ascii=False))
+        else:
+            marks = (' (edited)' if message['edit_count'] else '') + (' (deleted)' if message['deleted_at'] else '')
+            print(f"[{message['timestamp']}] #{message['channel_name']} {message['author']}: {message['content']}{marks}")
+
+    if next_cursor is not None:
+        print(f"-- more results: --cursor {next_cursor}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
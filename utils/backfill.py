@@ -0,0 +1,561 @@
+"""
+Offline backfill and export of historical logs
+Converts day files to JSON Lines, a SQLite archive or columnar tables in a process pool, resumably
+"""
+
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.reader import LogReader, SHARD_DIR_PATTERN, iter_file, parse_log_filename
+from utils.rules import TARGET_PATTERN, RESERVED_TARGETS
+from utils.content_store import object_path
+
+FORMATS = ('ndjson', 'sqlite', 'columnar')
+
+# Progress file kept in the output directory
+CHECKPOINT_NAME = 'backfill-checkpoint.json'
+
+# Archive database written by the sqlite format
+ARCHIVE_NAME = 'archive.db'
+
+# Attachment, edit and delete records set aside by the sqlite format, applied after all messages
+CHANGES_DIR = '.changes'
+
+# Records per SQLite transaction
+BATCH_SIZE = 1000
+
+# Missing attachment names kept per day (the count is always exact)
+MISSING_SAMPLE = 20
+
+
+def _stamp(path: Path) -> List[int]:
+    """Size and modification time of a source file, to notice when it changes"""
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _day_file_dirs(logs_dir: Path) -> List[Path]:
+    """A logs directory, its shard directories, and the routing rule log targets of each"""
+    def targets(directory: Path) -> List[Path]:
+        return sorted(
+            path for path in directory.iterdir()
+            if path.is_dir() and TARGET_PATTERN.match(path.name)
+            and path.name not in RESERVED_TARGETS and not SHARD_DIR_PATTERN.match(path.name)
+        )
+
+    shards = sorted(path for path in logs_dir.iterdir() if path.is_dir() and SHARD_DIR_PATTERN.match(path.name))
+    directories = []
+    for directory in [logs_dir] + shards:
+        directories.append(directory)
+        directories.extend(targets(directory))
+    return directories
+
+
+def plan(logs_dir: Path, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, List[Path]]:
+    """
+    Group day files by the output they produce
+
+    A day can have both a legacy array and a JSON Lines file (and shard
+    and log target directories have their own), so each output name lists
+    its sources in the order they were written.
+
+    Returns:
+        Output name (relative to the output directory, without suffix) -> source files
+    """
+    tasks: Dict[str, List[Path]] = {}
+    for directory in _day_file_dirs(logs_dir):
+        for path in LogReader(directory).files(since, until, include_shards=False):
+            info = parse_log_filename(path.name)
+            name = str(path.parent.relative_to(logs_dir) / info['date'])
+            tasks.setdefault(name, []).append(path)
+    return tasks
+
+
+class _AttachmentCheck:
+    """Final state of a day's attachments, checked against the downloads directory"""
+
+    def __init__(self, downloads_dir: Optional[Path]):
+        self.downloads_dir = downloads_dir
+        # message_id -> attachment entries, updated by attachment records
+        self.attachments: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add(self, record: Dict[str, Any]):
+        record_type = record.get('record_type')
+        if record_type is None and record.get('attachments'):
+            self.attachments[str(record['message_id'])] = list(record['attachments'])
+        elif record_type == 'attachment':
+            entries = self.attachments.get(str(record['message_id']))
+            index = int(record['index'])
+            if entries is not None and index < len(entries):
+                entries[index] = record['attachment']
+
+    def _exists(self, message_id: str, attachment: Dict[str, Any]) -> bool:
+        # Files are named MessageID_Filename in both download layouts
+        if (self.downloads_dir / f"{message_id}_{attachment['filename']}").exists():
+            return True
+        local_path = attachment.get('local_path')
+        if local_path and (self.downloads_dir / Path(local_path).name).exists():
+            return True
+        # The cas layout keeps the object itself when it can't hardlink a per-message name
+        sha256 = attachment.get('sha256')
+        if not sha256:
+            return False
+        ext = Path(local_path or attachment['filename']).suffix
+        return object_path(self.downloads_dir / 'objects', sha256, ext).exists()
+
+    def results(self) -> Dict[str, Any]:
+        total = downloaded = 0
+        missing: List[str] = []
+        missing_count = 0
+        for message_id, entries in self.attachments.items():
+            for attachment in entries:
+                total += 1
+                if not attachment.get('downloaded'):
+                    continue
+                downloaded += 1
+                if self.downloads_dir is not None and not self._exists(message_id, attachment):
+                    missing_count += 1
+                    if len(missing) < MISSING_SAMPLE:
+                        missing.append(f"{message_id}_{attachment['filename']}")
+        return {
+            'attachments': total,
+            'attachments_downloaded': downloaded,
+            'attachments_missing': missing_count,
+            'missing_files': missing
+        }
+
+
+def _record_key(record: Dict[str, Any]) -> bytes:
+    """What a record is about, to compare the output with the source in order"""
+    return f"{record.get('record_type', '')}:{record.get('message_id')}:{record.get('index', '')}\n".encode('utf-8')
+
+
+def _write_ndjson(sources: List[Path], dest: Path, check: _AttachmentCheck,
+                  encoder_name: str) -> Tuple[int, int, int]:
+    """
+    Re-encode records as JSON Lines
+
+    The output is parsed back and compared, record by record, with what was
+    read from the sources.
+
+    Returns:
+        (records read, messages read, output records matching the sources; 0 if any differ)
+    """
+    from utils.serialization import create_encoder
+
+    encoder = create_encoder(encoder_name)
+    source_digest = hashlib.sha256()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+    records = messages = 0
+    batch: List[Dict[str, Any]] = []
+    try:
+        with open(tmp_path, 'wb') as f:
+            for source in sources:
+                for _, record in iter_file(source):
+                    records += 1
+                    messages += 'record_type' not in record
+                    source_digest.update(_record_key(record))
+                    check.add(record)
+                    batch.append(record)
+                    if len(batch) >= BATCH_SIZE:
+                        f.write(encoder.encode_lines(batch))
+                        batch = []
+            if batch:
+                f.write(encoder.encode_lines(batch))
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, dest)
+
+    written = 0
+    output_digest = hashlib.sha256()
+    for _, record in iter_file(dest):
+        written += 1
+        output_digest.update(_record_key(record))
+    if output_digest.digest() != source_digest.digest():
+        written = 0
+    return records, messages, written
+
+
+def _write_sqlite(sources: List[Path], db_path: Path, check: _AttachmentCheck,
+                  changes_path: Path) -> Tuple[int, int, int]:
+    """
+    Insert a day's messages into the archive
+
+    Days run in parallel, so a change can be logged on an earlier-finishing
+    day than its message: attachment, edit and delete records are written to
+    changes_path instead, for apply_changes() once every day's messages are in.
+
+    Returns:
+        (records, messages, those messages now archived)
+    """
+    from utils.archive import MessageArchive
+
+    # Other workers write the same database; wait for them rather than fail
+    archive = MessageArchive(db_path, busy_timeout=120000)
+    changes_path.parent.mkdir(parents=True, exist_ok=True)
+    records = 0
+    message_ids: List[str] = []
+    batch: List[Dict[str, Any]] = []
+    try:
+        with open(changes_path, 'w', encoding='utf-8') as changes:
+            for source in sources:
+                for _, record in iter_file(source):
+                    records += 1
+                    check.add(record)
+                    if 'record_type' in record:
+                        changes.write(json.dumps(record, ensure_ascii=False) + '\n')
+                        continue
+                    message_ids.append(str(record['message_id']))
+                    batch.append(record)
+                    if len(batch) >= BATCH_SIZE:
+                        archive.write_batch(batch)
+                        batch = []
+            if batch:
+                archive.write_batch(batch)
+
+        # Messages already archived by an earlier run count as present (inserts are idempotent)
+        unique = sorted(set(message_ids))
+        found = archive.count_existing(unique)
+    finally:
+        archive.close()
+    return records, len(unique), found
+
+
+def apply_changes(db_path: Path, changes_path: Path) -> Tuple[int, int]:
+    """
+    Apply a day's set-aside changes to the archive (days in date order)
+
+    Edits older than a message's last applied edit are skipped, so days can
+    be applied again without counting their edits twice.
+
+    Returns:
+        (changes, changes whose message isn't archived)
+    """
+    from utils.archive import MessageArchive
+
+    archive = MessageArchive(db_path, busy_timeout=120000)
+    changes = 0
+    message_ids = set()
+    batch: List[Dict[str, Any]] = []
+    referenced: List[str] = []
+    try:
+        with open(changes_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                changes += 1
+                message_ids.add(str(record['message_id']))
+                referenced.append(str(record['message_id']))
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    archive.write_batch(batch)
+                    batch = []
+        if batch:
+            archive.write_batch(batch)
+        unmatched_ids = message_ids - set(archive.existing(sorted(message_ids)))
+    finally:
+        archive.close()
+    changes_path.unlink()
+    return changes, sum(message_id in unmatched_ids for message_id in referenced)
+
+
+def _write_columnar(sources: List[Path], dest: Path, check: _AttachmentCheck,
+                    columnar_format: str, include_content: bool) -> Tuple[int, int, int, Path]:
+    """Fold records into a column table; returns (records, messages, rows written, file)"""
+    from utils.columnar import MessageTable, read_table
+
+    table = MessageTable(include_content)
+    records = 0
+    for source in sources:
+        for _, record in iter_file(source):
+            records += 1
+            check.add(record)
+            table.add(record)
+    written = table.write(dest, columnar_format)
+    rows = len(read_table(written)['message_id'])
+    return records, len(table), rows, written
+
+
+def convert_day(task: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert one day's files (runs in a pool process)
+
+    Args:
+        task: 'name', 'sources', 'format', 'out_dir', 'downloads_dir',
+            'encoder', 'columnar_format', 'include_content'
+
+    Returns:
+        Counts for the checkpoint, with 'status' 'done' or 'mismatch'
+        (for sqlite, before its changes are applied)
+    """
+    started = time.perf_counter()
+    sources = [Path(source) for source in task['sources']]
+    out_dir = Path(task['out_dir'])
+    check = _AttachmentCheck(Path(task['downloads_dir']) if task['downloads_dir'] else None)
+
+    if task['format'] == 'ndjson':
+        output = out_dir / f"{task['name']}.jsonl"
+        records, messages, written = _write_ndjson(sources, output, check, task['encoder'])
+        expected = records
+    elif task['format'] == 'sqlite':
+        output = out_dir / ARCHIVE_NAME
+        records, messages, written = _write_sqlite(
+            sources, output, check, out_dir / CHANGES_DIR / f"{task['name']}.jsonl"
+        )
+        expected = messages
+    else:
+        records, messages, written, output = _write_columnar(
+            sources, out_dir / task['name'], check, task['columnar_format'], task['include_content']
+        )
+        expected = messages
+
+    result = {
+        'status': 'done' if written == expected else 'mismatch',
+        'records': records,
+        'messages': messages,
+        'written': written,
+        'expected': expected,
+        'output': str(output),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    result.update(check.results())
+    return result
+
+
+class Checkpoint:
+    """Per-day progress of a backfill, saved after every finished day"""
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.format = fmt
+        self.days: Dict[str, Dict[str, Any]] = {}
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return
+        if data.get('format') == fmt:
+            self.days = data.get('days', {})
+
+    def is_done(self, name: str, sources: List[Path]) -> bool:
+        """Whether a day was converted from exactly these, unchanged, sources"""
+        entry = self.days.get(name)
+        return (
+            entry is not None and entry['status'] == 'done'
+            and entry['sources'] == {str(source): _stamp(source) for source in sources}
+        )
+
+    def record(self, name: str, sources: List[Path], result: Dict[str, Any]):
+        """Store a day's result (atomic replace)"""
+        entry = dict(result)
+        entry['sources'] = {str(source): _stamp(source) for source in sources}
+        self.days[name] = entry
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'format': self.format, 'days': self.days}, indent=1), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+
+def run(
+    logs_dir: Path,
+    out_dir: Path,
+    fmt: str,
+    downloads_dir: Optional[Path] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    workers: int = 0,
+    restart: bool = False,
+    encoder: str = 'auto',
+    columnar_format: str = 'auto',
+    include_content: bool = True
+) -> Dict[str, int]:
+    """
+    Convert every day file in a logs directory
+
+    Days already converted from unchanged sources are skipped unless
+    `restart` is set. Each finished day is checkpointed immediately, so an
+    interrupted run resumes with the days it hadn't finished. For sqlite a
+    day is finished once its changes are applied, which happens in date
+    order after every pending day's messages are in the archive.
+
+    Args:
+        logs_dir: Directory of day files (shard directories included)
+        out_dir: Output directory (also holds the checkpoint)
+        fmt: One of FORMATS
+        downloads_dir: Check that downloaded attachments are present here (None = don't)
+        since: First date to convert (YYYY-MM-DD)
+        until: Last date to convert (YYYY-MM-DD)
+        workers: Pool processes (0 = one per CPU core)
+        restart: Ignore the checkpoint and convert everything again
+        encoder: JSON encoder for the ndjson format
+        columnar_format: 'parquet', 'npz' or 'auto' for the columnar format
+        include_content: Keep message text in columnar tables
+
+    Returns:
+        Number of days done, skipped, mismatched and failed
+    """
+    if fmt == 'columnar':
+        from utils.columnar import resolve_format
+        columnar_format = resolve_format(columnar_format)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint = Checkpoint(out_dir / CHECKPOINT_NAME, fmt)
+    if restart:
+        checkpoint.days = {}
+    if fmt == 'sqlite':
+        # Create the schema once, before the workers race to do it
+        from utils.archive import MessageArchive
+        MessageArchive(out_dir / ARCHIVE_NAME).close()
+
+    totals = {'done': 0, 'skipped': 0, 'mismatch': 0, 'failed': 0}
+    pending = []
+    for name, sources in plan(logs_dir, since, until).items():
+        if checkpoint.is_done(name, sources):
+            totals['skipped'] += 1
+        else:
+            pending.append((name, sources))
+    # Largest days first, so one big day doesn't finish last on its own
+    pending.sort(key=lambda item: sum(source.stat().st_size for source in item[1]), reverse=True)
+
+    print(f"{len(pending)} day(s) to convert to {fmt}, {totals['skipped']} already done")
+    if not pending:
+        return totals
+
+    def finish(name: str, sources: List[Path], result: Dict[str, Any]):
+        checkpoint.record(name, sources, result)
+        totals[result['status']] += 1
+
+        line = f"{name}: {result['records']:,} records, {result['messages']:,} messages"
+        if result['attachments_missing']:
+            line += f", {result['attachments_missing']:,} attachment file(s) missing"
+        if result.get('changes_unmatched'):
+            line += f", {result['changes_unmatched']:,} change(s) to messages not in the archive"
+        if result['written'] != result['expected']:
+            line += f" (output matches {result['written']:,} of {result['expected']:,})"
+        if result['status'] == 'mismatch':
+            print(f"  ✗ {line}")
+        else:
+            print(f"  ✓ {line} ({result['seconds']:.1f}s)")
+
+    started = time.perf_counter()
+    # sqlite days whose messages are in, waiting for their changes to be applied
+    inserted: Dict[str, Tuple[List[Path], Dict[str, Any]]] = {}
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(pending)),
+        mp_context=multiprocessing.get_context('spawn')
+    )
+    try:
+        futures = {
+            executor.submit(convert_day, {
+                'name': name,
+                'sources': [str(source) for source in sources],
+                'format': fmt,
+                'out_dir': str(out_dir),
+                'downloads_dir': str(downloads_dir) if downloads_dir else None,
+                'encoder': encoder,
+                'columnar_format': columnar_format,
+                'include_content': include_content
+            }): (name, sources)
+            for name, sources in pending
+        }
+        for future in as_completed(futures):
+            name, sources = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                totals['failed'] += 1
+                print(f"  ✗ {name}: {type(e).__name__}: {e}")
+                continue
+            if fmt == 'sqlite':
+                inserted[name] = (sources, result)
+            else:
+                finish(name, sources, result)
+
+        # Date order, so each message's edits are applied oldest first
+        for name in sorted(inserted, key=lambda name: (Path(name).name, name)):
+            sources, result = inserted[name]
+            applied_at = time.perf_counter()
+            try:
+                changes, unmatched = apply_changes(out_dir / ARCHIVE_NAME, out_dir / CHANGES_DIR / f"{name}.jsonl")
+            except Exception as e:
+                totals['failed'] += 1
+                print(f"  ✗ {name}: {type(e).__name__}: {e}")
+                continue
+            result['changes'] = changes
+            result['changes_unmatched'] = unmatched
+            result['seconds'] = round(result['seconds'] + time.perf_counter() - applied_at, 3)
+            if unmatched:
+                result['status'] = 'mismatch'
+            finish(name, sources, result)
+    except KeyboardInterrupt:
+        print("Interrupted; finished days are saved, run again to resume")
+        raise
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    print(f"{totals['done']} day(s) converted in {time.perf_counter() - started:.1f}s, "
+          f"{totals['mismatch']} mismatched, {totals['failed']} failed")
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: convert historical day files"""
+    import argparse
+
+    project_dir = Path(__file__).parent.parent
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.backfill',
+        description='Convert historical day logs to JSON Lines, a SQLite archive or columnar tables'
+    )
+    parser.add_argument('--to', dest='format', choices=FORMATS, required=True, help='Output format')
+    parser.add_argument('--logs-dir', type=Path, default=project_dir / 'logs',
+                        help='Day files to convert (default: logs/)')
+    parser.add_argument('--downloads-dir', type=Path, default=project_dir / 'downloads',
+                        help='Where downloaded attachments should be (default: downloads/)')
+    parser.add_argument('--no-attachment-check', action='store_true',
+                        help="Don't check that downloaded attachments exist")
+    parser.add_argument('--out', type=Path, default=None,
+                        help='Output directory (default: export/<format>/)')
+    parser.add_argument('--since', help='First date to convert (YYYY-MM-DD)')
+    parser.add_argument('--until', help='Last date to convert (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=0, help='Worker processes (default: one per CPU core)')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and convert everything')
+    parser.add_argument('--encoder', default='auto', help='JSON encoder for --to ndjson')
+    parser.add_argument('--columnar-format', default='auto', choices=('auto', 'parquet', 'npz'),
+                        help='File format for --to columnar (auto = Parquet if pyarrow is installed, else NumPy)')
+    parser.add_argument('--no-content', action='store_true', help='Leave message text out of columnar tables')
+    args = parser.parse_args(argv)
+
+    if not args.logs_dir.is_dir():
+        print(f"Logs directory not found: {args.logs_dir}")
+        return 1
+
+    try:
+        totals = run(
+            args.logs_dir,
+            args.out or project_dir / 'export' / args.format,
+            args.format,
+            downloads_dir=None if args.no_attachment_check else args.downloads_dir,
+            since=args.since,
+            until=args.until,
+            workers=args.workers,
+            restart=args.restart,
+            encoder=args.encoder,
+            columnar_format=args.columnar_format,
+            include_content=not args.no_content
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 1 if totals['mismatch'] or totals['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,230 @@
+"""
+Columnar tables of logged messages
+One array per field instead of one JSON object per message, written as Parquet (pyarrow) or .npz (NumPy)
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional dependency
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:  # Optional dependency
+    numpy = None
+
+# Column name and type of each message field; IDs are Discord snowflakes, which fit in int64
+MESSAGE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('message_id', 'int64'),
+    ('time_ms', 'int64'),          # Unix time in milliseconds
+    ('channel_id', 'int64'),
+    ('channel_name', 'str'),
+    ('author_id', 'int64'),
+    ('author', 'str'),
+    ('content', 'str'),
+    ('attachments', 'int32'),
+    ('attachment_bytes', 'int64'),  # Sizes as reported by Discord
+    ('downloaded', 'int32'),        # Attachments saved to disk
+    ('edit_count', 'int32'),
+    ('deleted', 'bool'),
+)
+
+# File suffix of each output format
+SUFFIXES = {'parquet': '.parquet', 'npz': '.npz'}
+
+
+def available_formats() -> List[str]:
+    """Output formats whose library is installed, best first"""
+    formats = []
+    if pyarrow is not None:
+        formats.append('parquet')
+    if numpy is not None:
+        formats.append('npz')
+    return formats
+
+
+def resolve_format(name: str = 'auto') -> str:
+    """
+    Pick an output format
+
+    Args:
+        name: 'parquet', 'npz' or 'auto' (the best one installed)
+
+    Raises:
+        ValueError: If the format is unknown or its library isn't installed
+    """
+    available = available_formats()
+    if name == 'auto':
+        if not available:
+            raise ValueError("columnar output needs 'pyarrow' or 'numpy' (pip install pyarrow)")
+        return available[0]
+    if name not in SUFFIXES:
+        raise ValueError(f"unknown columnar format '{name}' (choose parquet, npz or auto)")
+    if name not in available:
+        raise ValueError(f"'{name}' output needs '{'pyarrow' if name == 'parquet' else 'numpy'}' installed")
+    return name
+
+
+def _pack_strings(values: List[str]) -> Tuple[Any, Any]:
+    """
+    Store strings for .npz as one UTF-8 buffer and the offset of each value
+
+    A fixed-width string array pads every row to the longest value; object
+    arrays would need pickle to load.
+
+    Returns:
+        (offsets: int64 array of len(values) + 1, data: uint8 array)
+    """
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, numpy.frombuffer(b''.join(encoded), dtype=numpy.uint8)
+
+
+def _unpack_strings(offsets, data) -> List[str]:
+    """Inverse of _pack_strings"""
+    buffer = data.tobytes()
+    bounds = offsets.tolist()
+    return [buffer[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+
+
+def _time_ms(timestamp: str) -> int:
+    """Unix time in milliseconds of an ISO 8601 timestamp"""
+    return int(datetime.fromisoformat(timestamp).timestamp() * 1000)
+
+
+class MessageTable:
+    """
+    Latest state of a day's messages, one list per column
+
+    Records are applied in log order, so attachment, edit and delete
+    records update the row of the message they refer to.
+    """
+
+    def __init__(self, include_content: bool = True):
+        """
+        Args:
+            include_content: Keep message text (False leaves the column empty)
+        """
+        self.include_content = include_content
+        self.columns: Dict[str, List[Any]] = {name: [] for name, _ in MESSAGE_COLUMNS}
+        self._rows: Dict[str, int] = {}
+        # Row -> downloaded flag of each attachment, for messages with attachments
+        self._downloaded: Dict[int, List[bool]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, record: Dict[str, Any]):
+        """Apply one log record (message, attachment, edit or delete)"""
+        record_type = record.get('record_type')
+        if record_type is None:
+            self._add_message(record)
+            return
+
+        row = self._rows.get(str(record['message_id']))
+        if row is None:
+            # The message was logged on another day
+            return
+        if record_type == 'attachment':
+            flags = self._downloaded.get(row)
+            index = int(record['index'])
+            if flags is not None and index < len(flags):
+                flags[index] = bool(record['attachment'].get('downloaded'))
+                self.columns['downloaded'][row] = sum(flags)
+        elif record_type == 'edit':
+            if self.include_content:
+                self.columns['content'][row] = record['content']
+            self.columns['edit_count'][row] += 1
+        elif record_type == 'delete':
+            self.columns['deleted'][row] = True
+
+    def _add_message(self, record: Dict[str, Any]):
+        """Append a message row (a repeated message ID is ignored)"""
+        message_id = str(record['message_id'])
+        if message_id in self._rows:
+            return
+        row = len(self._rows)
+        self._rows[message_id] = row
+
+        attachments = record.get('attachments') or []
+        flags = [bool(a.get('downloaded')) for a in attachments]
+        if flags:
+            self._downloaded[row] = flags
+
+        columns = self.columns
+        columns['message_id'].append(int(message_id))
+        columns['time_ms'].append(_time_ms(record['timestamp']))
+        columns['channel_id'].append(int(record['channel_id']))
+        columns['channel_name'].append(record.get('channel_name') or '')
+        columns['author_id'].append(int(record['author_id']))
+        columns['author'].append(record.get('author') or '')
+        columns['content'].append((record.get('content') or '') if self.include_content else '')
+        columns['attachments'].append(len(attachments))
+        columns['attachment_bytes'].append(sum(a.get('size') or 0 for a in attachments))
+        columns['downloaded'].append(sum(flags))
+        columns['edit_count'].append(0)
+        columns['deleted'].append(False)
+
+    def write(self, path: Path, fmt: str = 'auto') -> Path:
+        """
+        Write the table (atomic replace)
+
+        Args:
+            path: Output path without suffix (e.g. export/2026-01-06)
+            fmt: 'parquet', 'npz' or 'auto'
+
+        Returns:
+            The file written, with its format's suffix
+        """
+        fmt = resolve_format(fmt)
+        dest = path.with_name(path.name + SUFFIXES[fmt])
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+
+        if fmt == 'parquet':
+            types = {'int64': pyarrow.int64(), 'int32': pyarrow.int32(),
+                     'bool': pyarrow.bool_(), 'str': pyarrow.string()}
+            table = pyarrow.table({
+                name: pyarrow.array(self.columns[name], type=types[kind])
+                for name, kind in MESSAGE_COLUMNS
+            })
+            pyarrow.parquet.write_table(table, tmp_path, compression='zstd')
+        else:
+            arrays = {}
+            for name, kind in MESSAGE_COLUMNS:
+                if kind == 'str':
+                    arrays[f"{name}_offsets"], arrays[f"{name}_utf8"] = _pack_strings(self.columns[name])
+                else:
+                    arrays[name] = numpy.array(self.columns[name], dtype=kind)
+            # numpy.savez_compressed appends .npz to names without it
+            with open(tmp_path, 'wb') as f:
+                numpy.savez_compressed(f, **arrays)
+
+        os.replace(tmp_path, dest)
+        return dest
+
+
+def read_table(path: Path) -> Dict[str, List[Any]]:
+    """Read a table written by MessageTable.write back into column lists"""
+    if path.suffix == '.parquet':
+        if pyarrow is None:
+            raise ValueError("reading Parquet needs 'pyarrow' installed")
+        return pyarrow.parquet.read_table(path).to_pydict()
+    if numpy is None:
+        raise ValueError("reading .npz needs 'numpy' installed")
+    with numpy.load(path) as data:
+        columns = {}
+        for name, kind in MESSAGE_COLUMNS:
+            if kind == 'str' and f"{name}_offsets" in data.files:
+                columns[name] = _unpack_strings(data[f"{name}_offsets"], data[f"{name}_utf8"])
+            elif name in data.files:
+                # Files written before strings were packed hold fixed-width arrays
+                columns[name] = data[name].tolist()
+        return columns
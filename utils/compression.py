@@ -0,0 +1,267 @@
+"""
+Compression and retention for finished day logs
+Closed day files are compressed in independent frames so readers can seek
+"""
+
+import io
+import os
+import gzip
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, IO
+from colorama import Fore
+
+from utils.console import console
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+# Uncompressed bytes per independently decompressible frame
+FRAME_SIZE = 1024 * 1024
+
+# Compressed file suffix per codec
+CODEC_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Sidecar holding the frame index of a compressed day file
+FRAMES_SUFFIX = '.frames'
+
+
+def frames_path(path: Path) -> Path:
+    """Frame index sidecar for a compressed file"""
+    return path.with_name(path.name + FRAMES_SUFFIX)
+
+
+def load_frames(path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Read a compressed file's frame index
+
+    Returns:
+        {'codec', 'size' (uncompressed bytes), 'frames': [[uncompressed, compressed], ...]}
+        or None if there is no index
+    """
+    try:
+        return json.loads(frames_path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+
+
+def compress_file(src: Path, codec: str = 'gzip', level: int = 6) -> Path:
+    """
+    Compress a day file into independent frames and remove the original
+
+    Each FRAME_SIZE block of input becomes its own gzip member or zstd
+    frame; the frame index is written alongside so readers can start
+    decompressing at any frame.
+
+    Returns:
+        Path of the compressed file
+    """
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError("zstd compression requires the 'zstandard' package")
+
+    dest = src.with_name(src.name + CODEC_SUFFIXES[codec])
+    tmp = dest.with_name(dest.name + '.tmp')
+    compressor = zstandard.ZstdCompressor(level=level) if codec == 'zstd' else None
+
+    frames = []
+    uncompressed = 0
+    with open(src, 'rb') as fin, open(tmp, 'wb') as fout:
+        while True:
+            block = fin.read(FRAME_SIZE)
+            if not block:
+                break
+            frames.append([uncompressed, fout.tell()])
+            if compressor is not None:
+                fout.write(compressor.compress(block))
+            else:
+                fout.write(gzip.compress(block, compresslevel=level, mtime=0))
+            uncompressed += len(block)
+        fout.flush()
+        os.fsync(fout.fileno())
+
+    index = {'codec': codec, 'size': uncompressed, 'frames': frames}
+    frames_path(dest).write_text(json.dumps(index), encoding='utf-8')
+    os.replace(tmp, dest)
+
+    # Carry reader positions over to the compressed file
+    offsets = src.with_name(src.name + '.offsets')
+    if offsets.exists():
+        os.replace(offsets, dest.with_name(dest.name + '.offsets'))
+
+    src.unlink()
+    return dest
+
+
+def open_at(path: Path, offset: int = 0) -> IO[bytes]:
+    """
+    Open a (possibly compressed) day file for reading at an uncompressed offset
+
+    Compressed files jump to the nearest frame using the frame index, then
+    skip forward within it.
+    """
+    suffix = path.suffix
+    if suffix not in ('.gz', '.zst'):
+        f = open(path, 'rb')
+        if offset:
+            f.seek(offset)
+        return f
+
+    raw = open(path, 'rb')
+    skip = offset
+    index = load_frames(path)
+    if index and offset:
+        for frame_start, compressed_start in index['frames']:
+            if frame_start > offset:
+                break
+            skip = offset - frame_start
+            raw.seek(compressed_start)
+
+    if suffix == '.zst':
+        if zstandard is None:
+            raw.close()
+            raise RuntimeError("Reading .zst logs requires the 'zstandard' package")
+        # Buffered so line iteration works
+        f = io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        )
+    else:
+        f = gzip.GzipFile(fileobj=raw, mode='rb')
+        # Let GzipFile close the raw file, as gzip.open() does
+        f.myfileobj = raw
+
+    while skip > 0:
+        chunk = f.read(min(skip, FRAME_SIZE))
+        if not chunk:
+            break
+        skip -= len(chunk)
+    return f
+
+
+def uncompressed_size(path: Path) -> int:
+    """Size of a day file's contents, decompressed if needed"""
+    if path.suffix in ('.gz', '.zst'):
+        index = load_frames(path)
+        if index is not None:
+            return index['size']
+        # No index: count by decompressing
+        total = 0
+        with open_at(path) as f:
+            while True:
+                chunk = f.read(FRAME_SIZE)
+                if not chunk:
+                    return total
+                total += len(chunk)
+    return path.stat().st_size
+
+
+class LogArchiver:
+    """
+    Background compression and retention for finished day files
+
+    Work runs on a single background thread, so the log writer only pays
+    for queueing a job when it rotates to a new day.
+    """
+
+    def __init__(
+        self,
+        logs_dir: Path,
+        codec: str = 'gzip',
+        retention_days: int = 0,
+        retention_bytes: int = 0
+    ):
+        """
+        Args:
+            logs_dir: Directory containing day files
+            codec: 'gzip', 'zstd' or 'none' (retention only)
+            retention_days: Delete day files older than this many days (0 = keep)
+            retention_bytes: Delete oldest day files while the total exceeds this (0 = no limit)
+        """
+        if codec == 'zstd' and zstandard is None:
+            console.warning(f"{Fore.YELLOW}⚠️  'zstandard' not installed, compressing logs with gzip")
+            codec = 'gzip'
+
+        self.logs_dir = logs_dir
+        self.codec = codec
+        self.retention_days = retention_days
+        self.retention_bytes = retention_bytes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-archiver')
+
+    def on_rotate(self, finished: Path, current_date: str):
+        """Logger rotation hook: compress the finished file in the background"""
+        self._executor.submit(self._archive, [finished], current_date)
+
+    def catch_up(self, current_date: str):
+        """Compress any uncompressed day files left from earlier runs"""
+        from utils.reader import parse_log_filename
+
+        pending = []
+        for path in self.logs_dir.iterdir():
+            info = parse_log_filename(path.name)
+            if info and not info['codec'] and info['date'] < current_date:
+                pending.append(path)
+        self._executor.submit(self._archive, sorted(pending), current_date)
+
+    def _archive(self, paths: List[Path], current_date: str):
+        """Compress the given files, then apply retention"""
+        if self.codec != 'none':
+            for path in paths:
+                if not path.exists():
+                    continue
+                try:
+                    started = time.monotonic()
+                    before = path.stat().st_size
+                    dest = compress_file(path, self.codec)
+                    after = dest.stat().st_size
+                    console.info(
+                        f"{Fore.GREEN}🗜️  Archived {path.name} -> {dest.name} "
+                        f"({before:,} -> {after:,} bytes, {time.monotonic() - started:.1f}s)"
+                    )
+                except Exception as e:
+                    console.error(f"{Fore.RED}❌ Error compressing {path.name}: {e}")
+
+        try:
+            self.enforce_retention(current_date)
+        except Exception as e:
+            console.error(f"{Fore.RED}❌ Error applying log retention: {e}")
+
+    def enforce_retention(self, current_date: str):
+        """Delete the oldest finished day files beyond the age/size limits"""
+        from utils.reader import parse_log_filename
+
+        if not self.retention_days and not self.retention_bytes:
+            return
+
+        days = []
+        for path in self.logs_dir.iterdir():
+            info = parse_log_filename(path.name)
+            if info and info['date'] < current_date:
+                days.append((info['date'], path))
+        days.sort()
+
+        cutoff = None
+        if self.retention_days:
+            today = datetime.strptime(current_date, '%Y-%m-%d')
+            cutoff = (today - timedelta(days=self.retention_days)).strftime('%Y-%m-%d')
+
+        total = sum(path.stat().st_size for _, path in days)
+        for date_str, path in days:
+            too_old = cutoff is not None and date_str < cutoff
+            too_big = self.retention_bytes and total > self.retention_bytes
+            if not (too_old or too_big):
+                break
+            total -= path.stat().st_size
+            for sidecar in (path, frames_path(path), path.with_name(path.name + '.offsets')):
+                try:
+                    sidecar.unlink()
+                except FileNotFoundError:
+                    pass
+            console.warning(f"{Fore.YELLOW}🗑️  Removed old log file: {path.name}")
+
+    def close(self):
+        """Wait for queued archival work to finish"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,154 @@
+"""
+Live reloading of the .env configuration
+Re-reads the file when it changes (or on SIGHUP) and hands changed settings to listeners
+"""
+
+import os
+import signal
+import asyncio
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from colorama import Fore
+
+from config import config, Config, RELOADABLE, load_env
+from utils.console import LEVELS, console
+
+
+def _file_stamp(path: Optional[Union[str, Path]]) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a file, or None if it doesn't exist"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ConfigWatcher:
+    """Reloads the global config when .env changes and notifies listeners"""
+
+    def __init__(self, path: Optional[str], interval: float = 2.0, quiet: bool = False):
+        """
+        Args:
+            path: The .env file to watch (None or '' = reload on request only)
+            interval: Seconds between checks of the file (0 = reload on request only)
+            quiet: Only report invalid configurations (for shard workers)
+        """
+        self.path = path
+        self.interval = interval
+        self.quiet = quiet
+        self._listeners: List[Callable] = []
+        self._requested = asyncio.Event()
+        self._stamp = _file_stamp(path)
+        # Path setting -> (callback, stamp of the file it named when last loaded)
+        self._files: Dict[str, Tuple[Callable, Optional[Tuple[int, int]]]] = {}
+        # Changed settings that need a restart, already reported
+        self._pending_restart: Set[str] = set()
+
+        # Counters
+        self.reloads = 0
+
+    def add_listener(self, callback: Callable):
+        """
+        Call back after each reload that changed live settings
+
+        Args:
+            callback: Function or coroutine function taking the set of changed
+                setting names (attribute names of Config, all in RELOADABLE)
+        """
+        self._listeners.append(callback)
+
+    def watch_file(self, setting: str, callback: Callable):
+        """
+        Also call back when the file named by a path setting changes
+
+        The callback also runs on every requested reload and when the
+        setting itself is changed to point at another file.
+
+        Args:
+            setting: Config attribute holding the file's path (e.g. 'rules_file')
+            callback: Function or coroutine function taking no arguments
+        """
+        self._files[setting] = (callback, _file_stamp(getattr(config, setting)))
+
+    async def _notify(self, callback: Callable, *args):
+        """Run a callback, reporting rather than raising its errors"""
+        try:
+            result = callback(*args)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            console.exception(f"{Fore.RED}❌ Error applying configuration: {e}")
+
+    def request_reload(self):
+        """Reload as soon as possible (safe to call from a signal handler on the loop)"""
+        self._requested.set()
+
+    def install_signal_handler(self) -> bool:
+        """Reload on SIGHUP; returns False where the platform has no SIGHUP"""
+        if not hasattr(signal, 'SIGHUP'):
+            return False
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self.request_reload)
+        return True
+
+    async def reload(self) -> Set[str]:
+        """
+        Re-read .env and apply the settings that can change while running
+
+        An invalid file is reported and ignored; the running configuration stays.
+
+        Returns:
+            Names of the settings that changed and were applied
+        """
+        load_env()
+        fresh = Config(exit_on_error=False)
+        if fresh.errors:
+            console.warning('\n'.join(
+                [f"{Fore.YELLOW}⚠️  Configuration not reloaded:"] +
+                [f"{Fore.YELLOW}  • {error}" for error in fresh.errors]
+            ))
+            return set()
+
+        changed = config.changes(fresh)
+        live = changed & set(RELOADABLE)
+        restart = changed - live
+        if restart and restart != self._pending_restart and not self.quiet:
+            console.warning(f"{Fore.YELLOW}⚠️  Restart to apply: {', '.join(sorted(restart))}")
+        self._pending_restart = restart
+        if not live:
+            return live
+
+        config.update(fresh, live)
+        self.reloads += 1
+        if not self.quiet:
+            console.info(f"{Fore.GREEN}🔄 Reloaded configuration: {', '.join(sorted(live))}")
+
+        # Console verbosity is process-wide, so it is applied here rather than by a listener
+        if 'console_level' in live:
+            console.setLevel(LEVELS[config.console_level])
+
+        for listener in self._listeners:
+            await self._notify(listener, live)
+        return live
+
+    async def run(self):
+        """Background task: reload when the file changes or a reload is requested, until cancelled"""
+        while True:
+            try:
+                await asyncio.wait_for(self._requested.wait(), timeout=self.interval or None)
+            except asyncio.TimeoutError:
+                pass
+
+            requested = self._requested.is_set()
+            self._requested.clear()
+            stamp = _file_stamp(self.path)
+            if requested or stamp != self._stamp:
+                self._stamp = stamp
+                await self.reload()
+
+            for setting, (callback, last) in list(self._files.items()):
+                stamp = _file_stamp(getattr(config, setting))
+                if requested or stamp != last:
+                    self._files[setting] = (callback, stamp)
+                    await self._notify(callback)
@@ -0,0 +1,101 @@
+"""
+Non-blocking console output
+Log records are queued by the caller and written to stdout by a background thread
+"""
+
+import sys
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from colorama import Fore
+
+# Console verbosity levels ('quiet' prints nothing)
+LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'quiet': logging.CRITICAL + 1
+}
+
+# Logger used for all console output
+console = logging.getLogger('discord_stream_monitor')
+console.propagate = False
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """Stream handler bound to the current sys.stdout (so redirection and colorama apply)"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+        self.setFormatter(logging.Formatter('%(message)s'))
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# Until start_console() is called, output is written synchronously
+_direct_handler = _StdoutHandler()
+console.addHandler(_direct_handler)
+console.setLevel(logging.INFO)
+
+_queue_handler: Optional[_DroppingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def start_console(level: str = 'info', max_queue: int = 10000):
+    """
+    Move console output to a background thread
+
+    Args:
+        level: One of LEVELS
+        max_queue: Records buffered before new ones are dropped
+    """
+    global _queue_handler, _listener
+
+    console.setLevel(LEVELS[level])
+    if _listener is not None:
+        return
+
+    record_queue = queue.Queue(max_queue)
+    _queue_handler = _DroppingQueueHandler(record_queue)
+    _listener = QueueListener(record_queue, _StdoutHandler())
+    console.removeHandler(_direct_handler)
+    console.addHandler(_queue_handler)
+    _listener.start()
+
+
+def stop_console():
+    """Flush queued output and go back to writing synchronously"""
+    global _queue_handler, _listener
+
+    if _listener is None:
+        return
+
+    _listener.stop()
+    console.removeHandler(_queue_handler)
+    console.addHandler(_direct_handler)
+    if _queue_handler.dropped:
+        console.warning(f"{Fore.YELLOW}⚠️  {_queue_handler.dropped:,} console line(s) dropped (output too slow)")
+    _queue_handler = None
+    _listener = None
@@ -0,0 +1,116 @@
+"""
+Content-addressed attachment store
+Saves each unique file once under objects/ab/cd/<sha256><ext>
+"""
+
+import os
+import json
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Dict, Any, Optional, Tuple
+
+
+def object_path(root: Path, sha256: str, ext: str = '') -> Path:
+    """Sharded path of a content hash in a store rooted at `root`"""
+    return root / sha256[:2] / sha256[2:4] / f"{sha256}{ext.lower()}"
+
+
+class ContentStore:
+    """
+    Deduplicating file store keyed by sha256
+
+    An append-only URL index (index.jsonl) remembers which object each
+    attachment URL resolved to, so files already held are never fetched
+    again. Per-message names are hardlinks to the shared object.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / 'index.jsonl'
+        self._lock = threading.Lock()
+        self._by_url: Dict[str, Dict[str, Any]] = {}
+        self._load_index()
+
+    @staticmethod
+    def url_key(url: str) -> str:
+        """Normalise an attachment URL (Discord CDN query strings are signatures that expire)"""
+        parts = urlsplit(url)
+        return f"{parts.netloc}{parts.path}"
+
+    def _load_index(self):
+        """Load the URL index into memory"""
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._by_url[entry['url']] = entry
+
+    def object_path(self, sha256: str, ext: str = '') -> Path:
+        """Get the sharded path for a content hash"""
+        return object_path(self.root, sha256, ext)
+
+    def lookup_url(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a stored object for a URL
+
+        Returns:
+            Index entry ('sha256', 'ext', 'size') if the object is on disk, else None
+        """
+        entry = self._by_url.get(self.url_key(url))
+        if entry is None:
+            return None
+        if not self.object_path(entry['sha256'], entry['ext']).exists():
+            return None
+        return entry
+
+    def ingest(self, tmp_path: Path, sha256: str, ext: str, size: int, url: str) -> Tuple[Path, bool]:
+        """
+        Move a downloaded temp file into the store
+
+        Blocking; call from a worker thread.
+
+        Returns:
+            (object path, whether identical content was already stored)
+        """
+        obj_path = self.object_path(sha256, ext)
+        with self._lock:
+            if obj_path.exists():
+                tmp_path.unlink()
+                duplicate = True
+            else:
+                obj_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, obj_path)
+                duplicate = False
+
+            key = self.url_key(url)
+            if key not in self._by_url:
+                entry = {'url': key, 'sha256': sha256, 'ext': ext.lower(), 'size': size}
+                self._by_url[key] = entry
+                with open(self.index_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+        return obj_path, duplicate
+
+    def link(self, obj_path: Path, dest_path: Path) -> Path:
+        """
+        Expose an object under a per-message name
+
+        Blocking; call from a worker thread.
+
+        Returns:
+            dest_path if a hardlink was made, otherwise obj_path itself
+            (e.g. on filesystems without hardlink support)
+        """
+        try:
+            os.link(obj_path, dest_path)
+        except FileExistsError:
+            pass
+        except OSError:
+            return obj_path
+        return dest_path
@@ -0,0 +1,139 @@
+"""
+Durable queue of pending attachment downloads
+Jobs live in SQLite until they finish, so restarts and crashes don't lose them
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS download_jobs (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_download_jobs_due ON download_jobs (next_attempt_at);
+"""
+
+
+class DownloadJobStore:
+    """SQLite (WAL mode) table of download jobs and their retry schedule"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(SCHEMA)
+
+    def add(self, job: Dict[str, Any], next_attempt_at: float) -> int:
+        """
+        Persist a new job
+
+        Returns:
+            Job ID
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO download_jobs (job, next_attempt_at) VALUES (?, ?)",
+                (json.dumps(job, ensure_ascii=False), next_attempt_at)
+            )
+            return cursor.lastrowid
+
+    def reschedule(self, job_id: int, attempts: int, next_attempt_at: float, error: str):
+        """Record a failed attempt and when to try again"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE download_jobs SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, next_attempt_at, error, job_id)
+            )
+
+    def complete(self, job_ids: Iterable[int]):
+        """Remove finished jobs (one transaction)"""
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM download_jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+
+    def pending(self) -> List[Tuple[int, int, float, Dict[str, Any]]]:
+        """
+        All unfinished jobs, earliest first
+
+        Returns:
+            List of (job ID, attempts so far, next attempt time, job)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, attempts, next_attempt_at, job FROM download_jobs ORDER BY next_attempt_at, id"
+            ).fetchall()
+        return [(job_id, attempts, next_at, json.loads(job)) for job_id, attempts, next_at, job in rows]
+
+    def add_existing(self, rows: Iterable[Tuple[str, int, float, Optional[str]]]) -> int:
+        """
+        Persist jobs taken from another store, keeping their retry schedule (one transaction)
+
+        Args:
+            rows: (job JSON, attempts, next attempt time, last error) tuples
+
+        Returns:
+            Number of jobs added
+        """
+        rows = list(rows)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO download_jobs (job, attempts, next_attempt_at, last_error) VALUES (?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def count(self) -> int:
+        """Number of unfinished jobs"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM download_jobs").fetchone()[0]
+
+    def close(self):
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
+
+
+def move_jobs(source: Path, dest_for: Callable[[Dict[str, Any]], Path]) -> int:
+    """
+    Move every job of a store that is no longer in use into the live stores, then delete it
+
+    Args:
+        source: Database file of the abandoned store
+        dest_for: Database file that should own a job
+
+    Returns:
+        Number of jobs moved
+    """
+    old = DownloadJobStore(source)
+    try:
+        with old._lock:
+            rows = old._conn.execute(
+                "SELECT job, attempts, next_attempt_at, last_error FROM download_jobs ORDER BY id"
+            ).fetchall()
+    finally:
+        old.close()
+
+    by_dest: Dict[Path, List[Tuple[str, int, float, Optional[str]]]] = {}
+    for row in rows:
+        by_dest.setdefault(dest_for(json.loads(row[0])), []).append(row)
+    for dest, dest_rows in by_dest.items():
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        store = DownloadJobStore(dest)
+        try:
+            store.add_existing(dest_rows)
+        finally:
+            store.close()
+
+    # Only once every job is safely in its new store
+    for suffix in ('', '-wal', '-shm'):
+        Path(f"{source}{suffix}").unlink(missing_ok=True)
+    return len(rows)
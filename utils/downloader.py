@@ -3,58 +3,331 @@ Image downloader for Discord attachments
 Downloads images with MessageID_Filename naming convention
 """
 
+import os
 import aiohttp
 import asyncio
+import hashlib
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List, Callable, Awaitable, Tuple, Iterable, Set
 from colorama import Fore, Style
 
+from utils.console import console
+from utils.content_store import ContentStore
+from utils.download_queue import DownloadJobStore
+from utils.thumbnails import ImagePostProcessor
+from utils.metrics import downloads, download_seconds, download_bytes, download_retries
+
+# Suffix for in-progress downloads; renamed into place when complete
+PARTIAL_SUFFIX = '.part'
+
+# HTTP statuses worth retrying later (timeouts, rate limits, server errors)
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+class DownloadTooLargeError(Exception):
+    """Raised when an attachment exceeds the configured size limit"""
+
+class ConnectionPoolProfile:
+    """HTTP connection pool and timeout settings for the download session"""
+    
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0,
+        total_timeout: float = 300.0,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0
+    ):
+        """
+        Args:
+            limit: Maximum open connections overall (0 = unlimited)
+            limit_per_host: Maximum open connections per host (0 = unlimited)
+            connect_timeout: Seconds to establish a TCP/TLS connection
+            read_timeout: Seconds to wait between chunks of a response
+            total_timeout: Seconds for a whole request (0 = no limit)
+            dns_cache_ttl: Seconds to cache DNS lookups
+            keepalive_timeout: Seconds to keep idle connections for reuse
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+    
+    def create_connector(self) -> aiohttp.TCPConnector:
+        """Build a pooled TCP connector from this profile"""
+        return aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+            keepalive_timeout=self.keepalive_timeout
+        )
+    
+    def create_timeout(self) -> aiohttp.ClientTimeout:
+        """Build request timeouts from this profile"""
+        return aiohttp.ClientTimeout(
+            total=self.total_timeout or None,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout
+        )
+
+class PoolMetrics:
+    """Connection pool utilisation counters fed by aiohttp request tracing"""
+    
+    def __init__(self):
+        self.requests_started = 0
+        self.requests_in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.pool_waits = 0
+        self.pool_wait_seconds = 0.0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+    
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """Create a TraceConfig that updates these counters"""
+        trace = aiohttp.TraceConfig()
+        
+        async def on_request_start(session, ctx, params):
+            self.requests_started += 1
+            self.requests_in_flight += 1
+        
+        async def on_request_end(session, ctx, params):
+            self.requests_in_flight -= 1
+        
+        async def on_connection_queued_start(session, ctx, params):
+            ctx.queued_at = time.monotonic()
+        
+        async def on_connection_queued_end(session, ctx, params):
+            self.pool_waits += 1
+            self.pool_wait_seconds += time.monotonic() - ctx.queued_at
+        
+        async def on_connection_create_end(session, ctx, params):
+            self.connections_created += 1
+        
+        async def on_connection_reuseconn(session, ctx, params):
+            self.connections_reused += 1
+        
+        async def on_dns_cache_hit(session, ctx, params):
+            self.dns_cache_hits += 1
+        
+        async def on_dns_cache_miss(session, ctx, params):
+            self.dns_cache_misses += 1
+        
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_end)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        trace.on_connection_queued_end.append(on_connection_queued_end)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
 class ImageDownloader:
     """Handles async downloading of Discord image attachments"""
     
-    # Supported image formats
-    SUPPORTED_FORMATS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg'}
+    # Image formats downloaded unless the caller passes its own extensions
+    SUPPORTED_FORMATS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.svg'})
     
-    def __init__(self, downloads_dir: Path):
+    def __init__(
+        self,
+        downloads_dir: Path,
+        max_bytes: int = 100 * 1024 * 1024,
+        chunk_size: int = 64 * 1024,
+        store: Optional[ContentStore] = None,
+        pool_profile: Optional[ConnectionPoolProfile] = None,
+        extensions: Optional[Iterable[str]] = None,
+        post_processor: Optional[ImagePostProcessor] = None
+    ):
         self.downloads_dir = downloads_dir
+        self.max_bytes = max_bytes
+        self.extensions = frozenset(extensions) if extensions is not None else self.SUPPORTED_FORMATS
+        self.chunk_size = chunk_size
+        self.store = store
+        self.pool_profile = pool_profile or ConnectionPoolProfile()
+        # Optional thumbnail/perceptual-hash stage for completed downloads
+        self.post_processor = post_processor
+        self.pool_metrics = PoolMetrics()
         self.session: Optional[aiohttp.ClientSession] = None
+        self._remove_partial_files()
+    
+    def _remove_partial_files(self):
+        """Delete temp files left behind by downloads interrupted by a crash"""
+        for partial in self.downloads_dir.glob(f".*{PARTIAL_SUFFIX}"):
+            try:
+                partial.unlink()
+            except OSError:
+                pass
     
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create aiohttp session"""
+        """Get or create the pooled aiohttp session"""
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            self.session = aiohttp.ClientSession(
+                connector=self.pool_profile.create_connector(),
+                timeout=self.pool_profile.create_timeout(),
+                trace_configs=[self.pool_metrics.trace_config()]
+            )
         return self.session
     
+    def pool_stats(self) -> Dict[str, Any]:
+        """Snapshot of connection pool utilisation"""
+        metrics = self.pool_metrics
+        connections = metrics.connections_created + metrics.connections_reused
+        return {
+            'limit': self.pool_profile.limit,
+            'limit_per_host': self.pool_profile.limit_per_host,
+            'requests_started': metrics.requests_started,
+            'requests_in_flight': metrics.requests_in_flight,
+            'connections_created': metrics.connections_created,
+            'connections_reused': metrics.connections_reused,
+            'reuse_ratio': metrics.connections_reused / connections if connections else 0.0,
+            'pool_waits': metrics.pool_waits,
+            'pool_wait_seconds': metrics.pool_wait_seconds,
+            'dns_cache_hits': metrics.dns_cache_hits,
+            'dns_cache_misses': metrics.dns_cache_misses
+        }
+    
     def _is_image(self, filename: str) -> bool:
         """Check if file is an image based on extension"""
         ext = Path(filename).suffix.lower()
-        return ext in self.SUPPORTED_FORMATS
+        return ext in self.extensions
+    
+    def configure(self, max_bytes: Optional[int] = None, extensions: Optional[Iterable[str]] = None):
+        """
+        Change the download filters; applies to downloads started afterwards
+        
+        Args:
+            max_bytes: Largest attachment to download
+            extensions: File extensions to download (e.g. '.png')
+        """
+        if max_bytes is not None:
+            self.max_bytes = max_bytes
+        if extensions is not None:
+            # Replaced in one assignment, so workers never see a partial set
+            self.extensions = frozenset(extensions)
     
     def _generate_filename(self, message_id: int, original_filename: str) -> str:
         """Generate filename in format: MessageID_OriginalFilename"""
         return f"{message_id}_{original_filename}"
     
+    async def _stream_to_file(self, response: aiohttp.ClientResponse, tmp_path: Path) -> Tuple[int, str]:
+        """
+        Stream a response body into a temp file
+        
+        Chunks are hashed and written on a worker thread. The temp file is
+        removed if anything fails, so no truncated file is left behind.
+        
+        Returns:
+            (size in bytes, sha256 hex digest)
+        """
+        if response.content_length is not None and response.content_length > self.max_bytes:
+            raise DownloadTooLargeError(
+                f"{response.content_length:,} bytes exceeds limit of {self.max_bytes:,}"
+            )
+        
+        loop = asyncio.get_running_loop()
+        hasher = hashlib.sha256()
+        size = 0
+        
+        def write_chunk(f, chunk: bytes):
+            hasher.update(chunk)
+            f.write(chunk)
+        
+        f = await loop.run_in_executor(None, open, tmp_path, 'wb')
+        try:
+            try:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise DownloadTooLargeError(f"exceeds limit of {self.max_bytes:,} bytes")
+                    await loop.run_in_executor(None, write_chunk, f, chunk)
+            finally:
+                await loop.run_in_executor(None, f.close)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        
+        return size, hasher.hexdigest()
+    
+    @staticmethod
+    def _discard(path: Path):
+        """Delete a temp file, ignoring errors"""
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    
+    def _store_file(self, tmp_path: Path, dest_path: Path, digest: str, size: int, url: str) -> Dict[str, Any]:
+        """
+        Move a completed temp file into place
+        
+        Blocking; runs on a worker thread. With the content-addressed layout
+        the bytes go into the store and dest_path becomes a hardlink.
+        
+        Returns:
+            Location fields for the download result
+        """
+        try:
+            if self.store is None:
+                os.replace(tmp_path, dest_path)
+                return {'local_path': str(dest_path)}
+            
+            obj_path, duplicate = self.store.ingest(tmp_path, digest, dest_path.suffix, size, url)
+            return {
+                'local_path': str(self.store.link(obj_path, dest_path)),
+                'content_path': str(obj_path),
+                'deduplicated': duplicate
+            }
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+    
+    def _link_stored(self, url: str, dest_path: Path) -> Optional[Tuple[Dict[str, Any], Path, Path]]:
+        """
+        Expose an object the store already holds for a URL under dest_path
+        
+        Blocking (it checks the object is on disk); runs on a worker thread.
+        
+        Returns:
+            (index entry, object path, local path), or None if the URL isn't stored
+        """
+        known = self.store.lookup_url(url)
+        if known is None:
+            return None
+        obj_path = self.store.object_path(known['sha256'], known['ext'])
+        return known, obj_path, self.store.link(obj_path, dest_path)
+    
     async def download_image(
         self,
         url: str,
         message_id: int,
-        filename: str,
-        max_retries: int = 3
+        filename: str
     ) -> Dict[str, Any]:
         """
-        Download an image from URL
+        Download an image from URL (a single attempt; retries are scheduled by the caller)
         
         Args:
             url: Direct URL to the image
             message_id: Discord message ID (for filename)
             filename: Original filename
-            max_retries: Number of retry attempts
         
         Returns:
-            Dictionary with download status and metadata
+            Dictionary with download status and metadata; failed attempts that
+            may succeed later have 'retryable' set
         """
         # Check if it's an image
         if not self._is_image(filename):
+            downloads.inc(labels=('skipped',))
             return {
                 'filename': filename,
                 'url': url,
@@ -66,67 +339,450 @@ class ImageDownloader:
         # Generate destination filename
         dest_filename = self._generate_filename(message_id, filename)
         dest_path = self.downloads_dir / dest_filename
+        loop = asyncio.get_running_loop()
         
-        # Try downloading with retries
-        for attempt in range(max_retries):
-            try:
-                session = await self._get_session()
-                
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        # Read content
-                        content = await response.read()
-                        
-                        # Save to file
-                        dest_path.write_bytes(content)
-                        
-                        file_size = len(content)
-                        print(f"{Fore.GREEN}⬇️  Downloaded: {dest_filename} ({file_size:,} bytes)")
-                        
-                        return {
-                            'filename': filename,
-                            'url': url,
-                            'size': file_size,
-                            'downloaded': True,
-                            'local_path': str(dest_path)
-                        }
-                    else:
-                        print(f"{Fore.YELLOW}⚠️  HTTP {response.status} for {filename}")
-                        
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    print(f"{Fore.YELLOW}⚠️  Retry {attempt + 1}/{max_retries} in {wait_time}s: {filename}")
-                    await asyncio.sleep(wait_time)
-                else:
-                    print(f"{Fore.RED}❌ Failed to download {filename}: {e}")
+        # Skip the fetch entirely if the store already holds this URL's bytes
+        if self.store is not None:
+            stored = await loop.run_in_executor(None, self._link_stored, url, dest_path)
+            if stored is not None:
+                known, obj_path, local_path = stored
+                console.info(f"{Fore.GREEN}♻️  Already stored: {dest_filename} ({known['size']:,} bytes)")
+                downloads.inc(labels=('deduplicated',))
+                result = {
+                    'filename': filename,
+                    'url': url,
+                    'size': known['size'],
+                    'downloaded': True,
+                    'local_path': str(local_path),
+                    'sha256': known['sha256'],
+                    'content_path': str(obj_path),
+                    'deduplicated': True
+                }
+                return result
+        
+        started = time.perf_counter()
+        try:
+            session = await self._get_session()
+            
+            async with session.get(url) as response:
+                if response.status != 200:
+                    console.warning(f"{Fore.YELLOW}⚠️  HTTP {response.status} for {filename}")
+                    if response.status not in RETRYABLE_STATUSES:
+                        downloads.inc(labels=('failed',))
                     return {
                         'filename': filename,
                         'url': url,
                         'size': 0,
                         'downloaded': False,
-                        'error': str(e)
+                        'error': f"HTTP {response.status}",
+                        'retryable': response.status in RETRYABLE_STATUSES
                     }
+                
+                # Stream to a temp file, then move it into place atomically
+                tmp_path = dest_path.with_name(f".{dest_filename}{PARTIAL_SUFFIX}")
+                file_size, digest = await self._stream_to_file(response, tmp_path)
+                location = await loop.run_in_executor(
+                    None, self._store_file, tmp_path, dest_path, digest, file_size, url
+                )
+                
+        except DownloadTooLargeError as e:
+            # Retrying won't make the file smaller
+            console.warning(f"{Fore.YELLOW}⚠️  Skipped {filename}: {e}")
+            downloads.inc(labels=('skipped',))
+            return {
+                'filename': filename,
+                'url': url,
+                'size': 0,
+                'downloaded': False,
+                'error': f"Too large: {e}"
+            }
+        except Exception as e:
+            console.warning(f"{Fore.YELLOW}⚠️  Error downloading {filename}: {e or type(e).__name__}")
+            return {
+                'filename': filename,
+                'url': url,
+                'size': 0,
+                'downloaded': False,
+                'error': str(e) or type(e).__name__,
+                'retryable': True
+            }
         
-        return {
+        console.info(f"{Fore.GREEN}⬇️  Downloaded: {dest_filename} ({file_size:,} bytes)")
+        downloads.inc(labels=('ok',))
+        download_seconds.observe(time.perf_counter() - started)
+        download_bytes.observe(file_size)
+        
+        result = {
             'filename': filename,
             'url': url,
-            'size': 0,
-            'downloaded': False,
-            'error': 'Max retries exceeded'
+            'size': file_size,
+            'downloaded': True,
+            'sha256': digest
         }
+        result.update(location)
+        return result
+    
+    async def post_process(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Thumbnail and hash a downloaded image (see utils.thumbnails)
+        
+        Returns:
+            Fields to add to the attachment entry (empty if there is nothing to add)
+        """
+        if self.post_processor is None or not result.get('downloaded'):
+            return {}
+        path = Path(result.get('content_path') or result['local_path'])
+        return await self.post_processor.process(path, result['sha256'])
     
     async def close(self):
-        """Close the aiohttp session"""
+        """Close the aiohttp session and the image post-processing pool"""
+        if self.post_processor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.post_processor.close)
         if self.session and not self.session.closed:
+            stats = self.pool_stats()
+            console.info(
+                f"{Fore.CYAN}🔗 HTTP pool: {stats['requests_started']} request(s), "
+                f"{stats['connections_created']} connection(s) opened, "
+                f"{stats['reuse_ratio']:.0%} reused, "
+                f"{stats['pool_waits']} wait(s) for a free connection "
+                f"({stats['pool_wait_seconds']:.1f}s)"
+            )
             await self.session.close()
 
+class DownloadScheduler:
+    """
+    Concurrent download worker pool
+    
+    Attachments are queued as jobs and fetched by a fixed number of worker
+    tasks, with a cap on simultaneous downloads per host. Each finished job
+    is reported to the `on_complete` callback, so message handlers never
+    wait for a download. Image post-processing runs afterwards, outside the
+    download slots, and reports the job again with the added fields.
+    
+    With a job store, jobs are persisted until their result has been logged:
+    failed attempts are retried later with exponential backoff, and jobs left
+    over from a previous run are resumed on start. Store queries run on their
+    own thread, like the log writer's disk work.
+    """
+    
+    def __init__(
+        self,
+        downloader: ImageDownloader,
+        on_complete: Callable[[Dict[str, Any], Dict[str, Any], Callable[[], None]], Awaitable[None]],
+        workers: int = 4,
+        per_host_limit: int = 4,
+        max_queue: int = 1000,
+        store: Optional[DownloadJobStore] = None,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 3600.0
+    ):
+        """
+        Args:
+            downloader: Downloader used to fetch each attachment
+            on_complete: Coroutine called with (job, result, done) when a job finishes;
+                it calls done() once the result is saved, which removes the stored job.
+                Called a second time with thumbnail fields added (see ImageDownloader.post_process)
+            workers: Number of concurrent worker tasks
+            per_host_limit: Maximum simultaneous downloads from one host
+            max_queue: Maximum number of jobs waiting for a worker
+            store: Durable job store (None = jobs are kept in memory only)
+            max_attempts: Attempts per job before it is reported as failed
+            retry_delay: Seconds before the first retry; doubled for each later one
+            max_retry_delay: Upper bound on the delay between attempts
+        """
+        self.downloader = downloader
+        self.on_complete = on_complete
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.max_queue = max_queue
+        self.store = store
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._closed = False
+        
+        # Jobs waiting for their next attempt: heap of (due time, sequence, job)
+        self._retries: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._retry_seq = 0
+        self._retry_wakeup: Optional[asyncio.Event] = None
+        
+        # Job store queries run here, off the event loop
+        self._store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='download-jobs')
+        # IDs of jobs whose result has been saved, deleted from the store in batches
+        self._finished: List[int] = []
+        self._finish_task: Optional[asyncio.Task] = None
+        # Thumbnail/hash tasks for finished downloads
+        self._post_tasks: Set[asyncio.Task] = set()
+        
+        # Counters
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_retried = 0
+        self.jobs_resumed = 0
+    
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker or a retry"""
+        return (self._queue.qsize() if self._queue is not None else 0) + len(self._retries)
+    
+    def start(self):
+        """Start the worker tasks and resume stored jobs (idempotent)"""
+        if self._queue is not None:
+            return
+        
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._retry_wakeup = asyncio.Event()
+        
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._release_retries()))
+        if self.store is not None:
+            # Submitted now, so the store thread answers it before adding any new job
+            pending = loop.run_in_executor(self._store_executor, self.store.pending)
+            self._tasks.append(loop.create_task(self._resume(pending)))
+    
+    async def _store_call(self, method: Callable, *args: Any) -> Any:
+        """Run a job store method on the store thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._store_executor, method, *args)
+    
+    async def _resume(self, pending: Awaitable[List[Tuple[int, int, float, Dict[str, Any]]]]):
+        """Background task: queue the jobs a previous run left unfinished"""
+        for job_id, attempts, next_attempt_at, job in await pending:
+            job['job_id'] = job_id
+            job['attempts'] = attempts
+            self._push_retry(job, next_attempt_at)
+            self.jobs_resumed += 1
+        if self.jobs_resumed:
+            console.info(f"{Fore.CYAN}🔁 Resuming {self.jobs_resumed} download(s) from the previous run")
+    
+    async def schedule(
+        self,
+        url: str,
+        message_id: int,
+        filename: str,
+        size: int = 0,
+        **context: Any
+    ) -> Dict[str, Any]:
+        """
+        Queue an attachment for download
+        
+        Args:
+            url: Direct URL to the attachment
+            message_id: Discord message ID (for filename)
+            filename: Original filename
+            size: Size reported by Discord, if known
+            **context: Extra fields passed through to on_complete (e.g. channel_id, index)
+        
+        Returns:
+            Attachment entry to log now: 'pending' for queued images,
+            or the final result for files that are never downloaded
+        """
+        if not self.downloader._is_image(filename):
+            return await self.downloader.download_image(url, message_id, filename)
+        
+        entry = {
+            'filename': filename,
+            'url': url,
+            'size': size,
+            'downloaded': False,
+            'status': 'pending'
+        }
+        
+        if self._closed:
+            entry['status'] = 'failed'
+            entry['error'] = 'Downloader shutting down'
+            return entry
+        
+        self.start()
+        job = dict(context, url=url, message_id=message_id, filename=filename)
+        if self.store is not None:
+            job['job_id'] = await self._store_call(self.store.add, job, time.time())
+        job['attempts'] = 0
+        await self._queue.put(job)
+        return entry
+    
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        """Get the concurrency limiter for a URL's host"""
+        host = urlsplit(url).hostname or ''
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return limit
+    
+    def _push_retry(self, job: Dict[str, Any], due: float):
+        """Hold a job until its next attempt is due"""
+        self._retry_seq += 1
+        heapq.heappush(self._retries, (due, self._retry_seq, job))
+        if self._retry_wakeup is not None:
+            self._retry_wakeup.set()
+    
+    async def _release_retries(self):
+        """Background task: move jobs onto the worker queue as their retry time comes"""
+        while True:
+            now = time.time()
+            while self._retries and self._retries[0][0] <= now and not self._closed:
+                _, _, job = heapq.heappop(self._retries)
+                await self._queue.put(job)
+            
+            timeout = self._retries[0][0] - now if self._retries and not self._closed else None
+            self._retry_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._retry_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _run_job(self, job: Dict[str, Any]):
+        """Attempt one job and either report the result or schedule a retry"""
+        async with self._host_limit(job['url']):
+            result = await self.downloader.download_image(
+                url=job['url'],
+                message_id=job['message_id'],
+                filename=job['filename']
+            )
+        
+        job['attempts'] += 1
+        retryable = result.pop('retryable', False)
+        if retryable and job['attempts'] < self.max_attempts:
+            delay = min(self.retry_delay * 2 ** (job['attempts'] - 1), self.max_retry_delay)
+            due = time.time() + delay
+            if self.store is not None:
+                await self._store_call(self.store.reschedule, job['job_id'], job['attempts'], due, result.get('error'))
+            self._push_retry(job, due)
+            self.jobs_retried += 1
+            download_retries.inc()
+            console.warning(
+                f"{Fore.YELLOW}⚠️  Retry {job['attempts']}/{self.max_attempts - 1} "
+                f"in {delay:g}s: {job['filename']}"
+            )
+            return
+        
+        result['status'] = 'downloaded' if result.get('downloaded') else 'failed'
+        if result.get('downloaded'):
+            self.jobs_completed += 1
+        else:
+            self.jobs_failed += 1
+            if retryable:
+                downloads.inc(labels=('failed',))
+                console.error(
+                    f"{Fore.RED}❌ Failed to download {job['filename']} after "
+                    f"{job['attempts']} attempt(s): {result.get('error')}"
+                )
+        
+        await self.on_complete(job, result, lambda: self._job_saved(job))
+        
+        if self.downloader.post_processor is not None and result.get('downloaded'):
+            # A follow-up record, so neither the download slot nor this record waits for the image work
+            task = asyncio.get_running_loop().create_task(self._post_process(job, result))
+            self._post_tasks.add(task)
+            task.add_done_callback(self._post_tasks.discard)
+    
+    async def _post_process(self, job: Dict[str, Any], result: Dict[str, Any]):
+        """Background task: thumbnail and hash a download, then report the job again"""
+        try:
+            fields = await self.downloader.post_process(result)
+            if fields:
+                await self.on_complete(job, dict(result, status='processed', **fields), lambda: None)
+        except Exception as e:
+            console.error(f"{Fore.RED}❌ Image processing failed for {job['filename']}: {e}")
+    
+    def _job_saved(self, job: Dict[str, Any]):
+        """A job's result has been logged: remove it from the store (batched)"""
+        if self.store is None:
+            return
+        self._finished.append(job['job_id'])
+        if self._finish_task is None or self._finish_task.done():
+            self._finish_task = asyncio.get_running_loop().create_task(self._remove_finished())
+    
+    async def _remove_finished(self):
+        """Background task: delete saved jobs from the store, one transaction per batch"""
+        while self._finished:
+            job_ids, self._finished = self._finished, []
+            try:
+                await self._store_call(self.store.complete, job_ids)
+            except Exception as e:
+                # They stay stored and are downloaded again on the next run
+                console.error(f"{Fore.RED}❌ Error removing {len(job_ids)} finished download job(s): {e}")
+    
+    async def _worker(self):
+        """Worker task: process jobs until cancelled"""
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                console.error(f"{Fore.RED}❌ Download job failed for {job.get('filename')}: {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def close(self, timeout: float = 10.0):
+        """
+        Stop accepting jobs and let queued downloads finish
+        
+        Jobs still waiting for a retry stay in the job store for the next run.
+        The store itself stays open for results still being logged; release
+        it with close_store() once the log writers have flushed.
+        
+        Args:
+            timeout: Seconds to wait for in-flight and queued jobs before cancelling
+        """
+        self._closed = True
+        if self._queue is None:
+            return
+        
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            console.warning(f"{Fore.YELLOW}⚠️  {self._queue.qsize()} download(s) still queued at shutdown")
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        # Downloads that finished still get their thumbnail records
+        if self._post_tasks:
+            await asyncio.wait(set(self._post_tasks), timeout=timeout)
+    
+    async def close_store(self):
+        """Remove the jobs logged so far and close the job store (after close())"""
+        if self._finish_task is not None:
+            await self._finish_task
+        if self.store is not None:
+            remaining = await self._store_call(self.store.count)
+            if remaining:
+                console.info(f"{Fore.CYAN}💾 {remaining} download(s) saved for the next run")
+            await self._store_call(self.store.close)
+        self._store_executor.shutdown(wait=True)
+
 # Global downloader instance
 _downloader_instance = None
 
-def get_downloader(downloads_dir: Path) -> ImageDownloader:
-    """Get or create the global downloader instance"""
+def get_downloader(
+    downloads_dir: Path,
+    max_bytes: int = 100 * 1024 * 1024,
+    chunk_size: int = 64 * 1024,
+    layout: str = 'flat',
+    pool_profile: Optional[ConnectionPoolProfile] = None,
+    extensions: Optional[Iterable[str]] = None,
+    post_processor: Optional[ImagePostProcessor] = None
+) -> ImageDownloader:
+    """
+    Get or create the global downloader instance
+    
+    layout is 'flat' (MessageID_Filename files) or 'cas' (content-addressed
+    objects under downloads/objects, hardlinked to MessageID_Filename)
+    """
     global _downloader_instance
     if _downloader_instance is None:
-        _downloader_instance = ImageDownloader(downloads_dir)
+        store = ContentStore(downloads_dir / 'objects') if layout == 'cas' else None
+        _downloader_instance = ImageDownloader(
+            downloads_dir, max_bytes, chunk_size, store, pool_profile, extensions, post_processor
+        )
     return _downloader_instance
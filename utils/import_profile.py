@@ -0,0 +1,132 @@
+"""
+Import-time profiling for startup
+Runs `python -X importtime` in a fresh interpreter and summarises where the time goes
+"""
+
+import os
+import sys
+import time
+import subprocess
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Modules that belong to this project (everything else is a dependency or the standard library)
+PROJECT_PACKAGES = ('main', 'config', 'monitor', 'utils', 'benchmarks')
+
+PROJECT_DIR = Path(__file__).parent.parent
+
+
+class ImportTiming(NamedTuple):
+    """One line of `-X importtime` output"""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    """
+    Parse the report `python -X importtime` writes to stderr
+
+    Args:
+        output: Captured stderr
+
+    Returns:
+        Timings in the order the imports finished (depth 1 = imported directly)
+    """
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            timing = ImportTiming(
+                module=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip(' ')) + 1) // 2
+            )
+        except ValueError:
+            # The header line ("self [us] | cumulative | imported package")
+            continue
+        timings.append(timing)
+    return timings
+
+
+def profile_imports(module: str) -> Tuple[List[ImportTiming], float]:
+    """
+    Import a module in a fresh interpreter with import timing enabled
+
+    Args:
+        module: Module to import (e.g. 'monitor' or 'utils.archive')
+
+    Returns:
+        The timings, and the interpreter's total wall time in seconds
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError('\n'.join(lines[-5:]) or f"python exited with code {result.returncode}")
+    return parse_importtime(result.stderr), elapsed
+
+
+def by_package(timings: List[ImportTiming]) -> Dict[str, int]:
+    """Self time per top-level package, in microseconds"""
+    totals: Dict[str, int] = {}
+    for timing in timings:
+        package = timing.module.split('.', 1)[0]
+        totals[package] = totals.get(package, 0) + timing.self_us
+    return totals
+
+
+def format_report(module: str, timings: List[ImportTiming], elapsed: float, top: int = 15) -> List[str]:
+    """
+    Summarise an import profile for the console
+
+    Args:
+        module: Module that was imported
+        timings: Parsed timings
+        elapsed: Interpreter wall time in seconds
+        top: Rows per table
+
+    Returns:
+        Report lines
+    """
+    target: Optional[ImportTiming] = next((t for t in timings if t.module == module), None)
+    total_us = sum(t.cumulative_us for t in timings if t.depth == 1)
+    lines = [
+        f"Import profile of '{module}'",
+        f"  interpreter wall time  {elapsed * 1000:9.1f} ms",
+        f"  all imports            {total_us / 1000:9.1f} ms ({len(timings)} modules)",
+    ]
+    if target is not None:
+        lines.append(f"  {module:<22} {target.cumulative_us / 1000:9.1f} ms (including its imports)")
+
+    lines.append('')
+    lines.append("Slowest packages (own time of all their modules):")
+    packages = sorted(by_package(timings).items(), key=lambda item: item[1], reverse=True)
+    for package, self_us in packages[:top]:
+        kind = 'project' if package in PROJECT_PACKAGES else ''
+        lines.append(f"  {self_us / 1000:9.1f} ms  {package:<28} {kind}".rstrip())
+
+    lines.append('')
+    lines.append("Slowest modules (own time):")
+    for timing in sorted(timings, key=lambda t: t.self_us, reverse=True)[:top]:
+        lines.append(f"  {timing.self_us / 1000:9.1f} ms  {timing.module}")
+
+    project = [t for t in timings if t.module.split('.', 1)[0] in PROJECT_PACKAGES]
+    if project:
+        lines.append('')
+        lines.append("Project modules (including their imports):")
+        for timing in sorted(project, key=lambda t: t.cumulative_us, reverse=True)[:top]:
+            lines.append(f"  {timing.cumulative_us / 1000:9.1f} ms  {timing.module}")
+    return lines
@@ -0,0 +1,337 @@
+"""
+Persistence pipeline for received messages
+Logging, search archive and attachment downloads, independent of the Discord client
+"""
+
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, Optional, Set
+from colorama import Fore
+
+from config import config, DOWNLOAD_RELOADABLE, LOG_RELOADABLE
+from utils.logger import DailyLogger, get_logger
+from utils.storage import create_storage
+from utils.serialization import create_encoder
+from utils.downloader import get_downloader, DownloadScheduler, ConnectionPoolProfile
+from utils.download_queue import DownloadJobStore
+from utils.writer import BatchWriter, get_writer
+from utils.archive import get_archive
+from utils.compression import LogArchiver
+from utils.thumbnails import create_post_processor
+from utils.analytics import create_aggregator
+from utils.console import console
+from utils.metrics import metrics, downloads
+
+
+def message_fields(message) -> Dict[str, Any]:
+    """
+    Extract the fields the pipeline needs from a discord.Message
+
+    The result is plain data, so it can be handed to another process.
+    """
+    return {
+        'message_id': message.id,
+        'timestamp': message.created_at.isoformat(),
+        'author': str(message.author),
+        'author_id': message.author.id,
+        'channel_id': message.channel.id,
+        'channel_name': message.channel.name if hasattr(message.channel, 'name') else 'DM',
+        'content': message.content,
+        'attachments': [
+            {'url': attachment.url, 'filename': attachment.filename, 'size': attachment.size}
+            for attachment in message.attachments
+        ],
+        'reply_to': message.reference.message_id if message.reference else None
+    }
+
+
+def edit_fields(payload) -> Optional[Dict[str, Any]]:
+    """
+    Extract an edit from a discord.RawMessageUpdateEvent
+    
+    Discord also sends updates when link previews load; those have no edit
+    time or leave the text unchanged, and give None.
+    """
+    message = payload.message
+    if message.edited_at is None or 'content' not in payload.data:
+        return None
+    cached = payload.cached_message
+    if cached is not None and cached.content == message.content:
+        return None
+    return {
+        'record_type': 'edit',
+        'message_id': payload.message_id,
+        'channel_id': payload.channel_id,
+        'timestamp': message.edited_at.isoformat(),
+        'content': message.content
+    }
+
+
+def delete_fields(message_id: int, channel_id: int) -> Dict[str, Any]:
+    """Fields for a deletion seen now"""
+    return {
+        'record_type': 'delete',
+        'message_id': message_id,
+        'channel_id': channel_id,
+        'timestamp': datetime.now(timezone.utc).isoformat()
+    }
+
+
+class IngestPipeline:
+    """Logger, archive, batch writer and download scheduler for one process"""
+
+    def __init__(self, logs_dir: Path, downloads_dir: Path, archive_db: Optional[Path] = None):
+        """
+        Args:
+            logs_dir: Directory for day files and the download queue
+            downloads_dir: Directory for downloaded attachments
+            archive_db: Search archive database (None = no archive)
+        """
+        self.logs_dir = logs_dir
+        self.logger = get_logger(
+            logs_dir,
+            config.timezone_offset,
+            log_format=config.log_format,
+            fsync_policy=config.log_fsync,
+            fsync_interval=config.log_fsync_interval,
+            encoder=config.log_encoder,
+            max_bytes=config.log_max_bytes
+        )
+        self.log_archiver = None
+        if config.log_compression != 'none' or config.log_retention_days or config.log_retention_bytes:
+            self.log_archiver = LogArchiver(
+                logs_dir,
+                codec=config.log_compression,
+                retention_days=config.log_retention_days,
+                retention_bytes=config.log_retention_bytes
+            )
+            self.logger.on_rotate = self.log_archiver.on_rotate
+        if config.analytics_enabled:
+            self.logger.aggregates = create_aggregator(
+                logs_dir, self.logger.tz, config.analytics_flush_interval, config.analytics_columnar
+            )
+        self.archive = get_archive(archive_db) if archive_db else None
+        sinks = [self.logger] + ([self.archive] if self.archive else [])
+        self.writer = get_writer(
+            sinks,
+            max_queue=config.write_queue_size,
+            batch_size=config.write_batch_size,
+            flush_interval=config.write_flush_interval,
+            backpressure=config.write_backpressure
+        )
+        self.downloader = get_downloader(
+            downloads_dir,
+            max_bytes=config.download_max_bytes,
+            chunk_size=config.download_chunk_size,
+            layout=config.download_layout,
+            pool_profile=ConnectionPoolProfile(
+                limit=config.http_pool_limit,
+                limit_per_host=config.http_pool_per_host,
+                connect_timeout=config.http_connect_timeout,
+                read_timeout=config.http_read_timeout,
+                total_timeout=config.http_total_timeout,
+                dns_cache_ttl=config.http_dns_ttl,
+                keepalive_timeout=config.http_keepalive
+            ),
+            extensions=config.download_extensions,
+            post_processor=create_post_processor(
+                downloads_dir,
+                max_size=config.thumbnail_size,
+                workers=config.image_workers
+            ) if config.image_thumbnails else None
+        )
+        self.scheduler = DownloadScheduler(
+            self.downloader,
+            on_complete=self._on_download_complete,
+            workers=config.download_workers,
+            per_host_limit=config.download_per_host,
+            max_queue=config.download_queue_size,
+            store=DownloadJobStore(logs_dir / config.download_queue_db.name),
+            max_attempts=config.download_max_attempts,
+            retry_delay=config.download_retry_delay,
+            max_retry_delay=config.download_retry_max_delay
+        )
+        
+        # Routing rule log targets: name -> (logger, writer, archiver), opened on first use
+        self._targets: Dict[str, tuple] = {}
+
+        metrics.gauge('dsm_write_queue_depth', 'Records waiting for the log writer',
+                      callback=lambda: self.writer.depth)
+        metrics.gauge('dsm_download_queue_depth', 'Attachments waiting for a download worker',
+                      callback=lambda: self.scheduler.depth)
+        metrics.gauge('dsm_http_requests_in_flight', 'Attachment HTTP requests in progress',
+                      callback=lambda: self.downloader.pool_metrics.requests_in_flight)
+
+    async def start(self):
+        """Start the background writer and download workers"""
+        self.writer.start()
+        self.scheduler.start()
+        if self.log_archiver:
+            self.log_archiver.catch_up(self.logger.today())
+
+    async def ingest(self, fields: Dict[str, Any]):
+        """
+        Queue a message for logging and its attachments for download
+
+        Args:
+            fields: Message fields as returned by message_fields()
+        """
+        log_target = fields.get('log_target')
+        
+        # The message is logged with 'pending' attachment entries and each
+        # download result follows as a separate attachment record
+        attachment_data = []
+        for index, attachment in enumerate(fields['attachments']):
+            if attachment.get('download', True) is False:
+                # Skipped by a routing rule
+                downloads.inc(labels=('skipped',))
+                attachment_data.append({
+                    'filename': attachment['filename'],
+                    'url': attachment['url'],
+                    'size': attachment['size'],
+                    'downloaded': False,
+                    'error': 'Filtered by rule'
+                })
+                continue
+            context = {'log_target': log_target} if log_target else {}
+            entry = await self.scheduler.schedule(
+                url=attachment['url'],
+                message_id=fields['message_id'],
+                filename=attachment['filename'],
+                size=attachment['size'],
+                channel_id=fields['channel_id'],
+                index=index,
+                **context
+            )
+            attachment_data.append(entry)
+
+        message_data = self.logger.format_message(
+            message_id=fields['message_id'],
+            timestamp=fields['timestamp'],
+            author_name=fields['author'],
+            author_id=fields['author_id'],
+            channel_id=fields['channel_id'],
+            channel_name=fields['channel_name'],
+            content=fields['content'],
+            attachments=attachment_data
+        )
+        await self._writer_for(log_target).submit(message_data)
+    
+    async def ingest_change(self, change: Dict[str, Any]):
+        """
+        Queue an edit or deletion for logging
+        
+        Args:
+            change: Fields as returned by edit_fields() or delete_fields()
+        """
+        if change['record_type'] == 'edit':
+            record = self.logger.format_edit(
+                message_id=change['message_id'],
+                channel_id=change['channel_id'],
+                timestamp=change['timestamp'],
+                content=change['content']
+            )
+        else:
+            record = self.logger.format_delete(
+                message_id=change['message_id'],
+                channel_id=change['channel_id'],
+                timestamp=change['timestamp']
+            )
+        await self._writer_for(change.get('log_target')).submit(record)
+    
+    def _writer_for(self, log_target: Optional[str]) -> BatchWriter:
+        """The writer for a routing rule's log target (None = the main day files)"""
+        if not log_target:
+            return self.writer
+        target = self._targets.get(log_target)
+        if target is None:
+            target_dir = self.logs_dir / log_target
+            target_dir.mkdir(parents=True, exist_ok=True)
+            logger = DailyLogger(
+                target_dir,
+                config.timezone_offset,
+                create_storage(
+                    config.log_format,
+                    config.log_fsync,
+                    config.log_fsync_interval,
+                    create_encoder(config.log_encoder)
+                ),
+                config.log_max_bytes
+            )
+            archiver = None
+            if self.log_archiver:
+                archiver = LogArchiver(
+                    target_dir,
+                    codec=config.log_compression,
+                    retention_days=config.log_retention_days,
+                    retention_bytes=config.log_retention_bytes
+                )
+                logger.on_rotate = archiver.on_rotate
+            if config.analytics_enabled:
+                logger.aggregates = create_aggregator(
+                    target_dir, logger.tz, config.analytics_flush_interval, config.analytics_columnar
+                )
+            # Targeted messages are still indexed in the search archive
+            writer = BatchWriter(
+                [logger] + ([self.archive] if self.archive else []),
+                max_queue=config.write_queue_size,
+                batch_size=config.write_batch_size,
+                flush_interval=config.write_flush_interval,
+                backpressure=config.write_backpressure
+            )
+            writer.start()
+            target = self._targets[log_target] = (logger, writer, archiver)
+            console.info(f"{Fore.GREEN}📂 Logging to target '{log_target}' ({target_dir})")
+        return target[1]
+
+    async def _on_download_complete(self, job: dict, result: dict, done: Callable[[], None]):
+        """Log the outcome of a queued attachment download (done() runs once it is on disk)"""
+        record = self.logger.format_attachment_update(
+            message_id=job['message_id'],
+            channel_id=job['channel_id'],
+            index=job['index'],
+            attachment=result
+        )
+        await self._writer_for(job.get('log_target')).submit(record, on_written=done)
+
+    async def apply_config(self, changed: Set[str]):
+        """
+        Apply reloaded download filters and log settings
+        
+        Args:
+            changed: Names of the config settings that changed
+        """
+        if changed & set(DOWNLOAD_RELOADABLE):
+            self.downloader.configure(
+                max_bytes=config.download_max_bytes,
+                extensions=config.download_extensions
+            )
+        if changed & set(LOG_RELOADABLE):
+            for logger in [self.logger] + [target[0] for target in self._targets.values()]:
+                logger.configure(
+                    fsync_policy=config.log_fsync,
+                    fsync_interval=config.log_fsync_interval,
+                    encoder=config.log_encoder,
+                    max_bytes=config.log_max_bytes
+                )
+    
+    async def drain(self):
+        """Let queued downloads and log writes finish"""
+        await self.scheduler.close(timeout=config.download_drain_timeout)
+        await self.writer.close()
+        for _, writer, _ in self._targets.values():
+            await writer.close()
+
+    async def close(self):
+        """Release files, connections and background threads (after drain())"""
+        await self.scheduler.close_store()
+        await self.downloader.close()
+        self.logger.close()
+        for logger, _, archiver in self._targets.values():
+            logger.close()
+            if archiver:
+                archiver.close()
+        if self.archive:
+            self.archive.close()
+        if self.log_archiver:
+            self.log_archiver.close()
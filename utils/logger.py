@@ -1,77 +1,242 @@
 """
 Daily JSON logger for Discord messages
-Creates a new JSON file each day with format: YYYY-MM-DD.json
+Creates a new log file each day: YYYY-MM-DD.jsonl (or legacy YYYY-MM-DD.json), split into
+numbered parts (YYYY-MM-DD.001.jsonl, ...) when a size limit is set
 """
 
-import json
+import re
+import time
 import asyncio
-from datetime import datetime
+import threading
+from datetime import datetime, timezone, timedelta, time as dt_time, tzinfo
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Callable
 from colorama import Fore, Style
 
+from utils.console import console
+from utils.storage import StorageBackend, FSYNC_POLICIES, create_storage
+from utils.serialization import create_encoder
+from utils.reader import parse_log_filename
+from utils.metrics import records_logged, log_write_seconds, log_write_bytes
+
+# Fixed UTC offsets: +07:00, -0530, +7
+OFFSET_PATTERN = re.compile(r'^([+-])(\d{1,2}):?(\d{2})?$')
+
+
+def parse_timezone(value: str) -> tzinfo:
+    """
+    Parse a time zone setting
+
+    Args:
+        value: A UTC offset ('+07:00', '-05:30'), 'UTC' / 'Z', or an IANA name
+            ('Asia/Jakarta', which follows daylight saving time)
+
+    Raises:
+        ValueError: If the value is not a known offset or zone
+    """
+    value = value.strip()
+    if value.upper() in ('Z', 'UTC'):
+        return timezone.utc
+    match = OFFSET_PATTERN.match(value)
+    if match:
+        sign, hours, minutes = match.groups()
+        delta = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        if delta >= timedelta(hours=24):
+            raise ValueError(f"UTC offset out of range: {value}")
+        return timezone(-delta if sign == '-' else delta)
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(value)
+    except Exception:
+        raise ValueError(f"unknown time zone: {value}") from None
+
+
 class DailyLogger:
     """Handles daily JSON logging of Discord messages"""
     
-    def __init__(self, logs_dir: Path, timezone_offset: str = '+07:00'):
+    def __init__(
+        self,
+        logs_dir: Path,
+        timezone_offset: str = '+07:00',
+        storage: Optional[StorageBackend] = None,
+        max_bytes: int = 0
+    ):
+        """
+        Args:
+            logs_dir: Directory for the day files
+            timezone_offset: Time zone whose midnight starts a new day (see parse_timezone)
+            storage: Storage backend (default: JSON Lines)
+            max_bytes: Start a new part of the day's file beyond this size (0 = no limit)
+        """
         self.logs_dir = logs_dir
         self.timezone_offset = timezone_offset
+        self.tz = parse_timezone(timezone_offset)
+        self.storage = storage or create_storage()
+        self.max_bytes = max_bytes
         self.current_file = None
         self.current_date = None
-        self._lock = asyncio.Lock()
+        self.current_part = 0
+        self._lock = threading.Lock()
+        
+        # Unix time at which the current day ends, so writes only compare one number
+        self._rollover_at = 0.0
+        self._file_bytes = 0
+        
+        # Called with (finished_file, new_date) after rotating to a new day
+        self.on_rotate: Optional[Callable[[Path, str], None]] = None
+        
+        # Per-day counts updated with every batch (utils.analytics.DailyAggregator)
+        self.aggregates = None
+        
+        # Counters
+        self.records_written = 0
+        self.bytes_written = 0
+    
+    def today(self) -> str:
+        """Date of the day file currently being written (YYYY-MM-DD)"""
+        return self.current_date or self._get_current_date()
     
     def _get_current_date(self) -> str:
-        """Get current date in YYYY-MM-DD format"""
-        # For simplicity, using local time
-        # In production, you'd want to use pytz for proper timezone handling
-        return datetime.now().strftime('%Y-%m-%d')
+        """Get current date in YYYY-MM-DD format, in the configured time zone"""
+        return datetime.now(self.tz).strftime('%Y-%m-%d')
     
-    def _get_log_file_path(self, date_str: str) -> Path:
-        """Get the log file path for a specific date"""
-        return self.logs_dir / f"{date_str}.json"
+    def _get_log_file_path(self, date_str: str, part: int = 0) -> Path:
+        """Get the log file path for a specific date (and part, beyond the first)"""
+        suffix = f".{part:03d}" if part else ''
+        return self.logs_dir / f"{date_str}{suffix}{self.storage.extension}"
     
-    async def _ensure_file(self) -> Path:
-        """Ensure the current day's log file exists"""
-        current_date = self._get_current_date()
-        
-        # Check if we need to rotate to a new file
-        if current_date != self.current_date:
-            self.current_date = current_date
-            self.current_file = self._get_log_file_path(current_date)
-            
-            # Create file if it doesn't exist
-            if not self.current_file.exists():
-                self.current_file.write_text('[]', encoding='utf-8')
-                print(f"{Fore.GREEN}📄 Created new log file: {self.current_file.name}")
+    def _last_part(self, date_str: str) -> int:
+        """Part of a day's file to continue appending to (after a restart)"""
+        part = 0
+        for path in self.logs_dir.glob(f"{date_str}.*"):
+            info = parse_log_filename(path.name)
+            if info is None or info['ext'] != self.storage.extension:
+                continue
+            number = int(info['part'] or 0)
+            # A compressed part is finished; continue with the next one
+            part = max(part, number + 1 if info['codec'] else number)
+        return part
+    
+    def _ensure_file(self) -> Path:
+        """Ensure the current day's log file is open in the storage backend"""
+        now = time.time()
+        if now >= self._rollover_at:
+            # First write, or past midnight: work out the day and when it ends
+            local = datetime.fromtimestamp(now, self.tz)
+            current_date = local.strftime('%Y-%m-%d')
+            next_midnight = datetime.combine(local.date() + timedelta(days=1), dt_time(0), tzinfo=self.tz)
+            self._rollover_at = next_midnight.timestamp()
+            if current_date != self.current_date:
+                self._open(current_date, self._last_part(current_date))
+        elif self.max_bytes and self._file_bytes >= self.max_bytes:
+            self._open(self.current_date, self.current_part + 1)
         
         return self.current_file
     
+    def _open(self, date_str: str, part: int):
+        """Switch to a day file, handing off the one just finished"""
+        finished = self.current_file if self.current_date is not None else None
+        self.current_date = date_str
+        self.current_part = part
+        self.current_file = self._get_log_file_path(date_str, part)
+        
+        # Open (and create if needed) the new file
+        if self.storage.open(self.current_file):
+            console.info(f"{Fore.GREEN}📄 Created new log file: {self.current_file.name}")
+        self._file_bytes = self.current_file.stat().st_size
+        
+        # The previous file is closed now; hand it off (e.g. for compression)
+        if finished is not None and finished != self.current_file and self.on_rotate:
+            self.on_rotate(finished, date_str)
+    
+    def write_batch(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Append a batch of records to the current day's log file
+        
+        Blocking; called from the batch writer's thread or via log_message.
+        
+        Args:
+            records: Message dictionaries to append, in order
+        
+        Returns:
+            Number of bytes written
+        """
+        with self._lock:
+            started = time.perf_counter()
+            
+            # Ensure we have the right file
+            self._ensure_file()
+            
+            # Append only the new records; never rewrite the day's file
+            written = self.storage.append(records)
+            self._file_bytes += written
+            self.records_written += len(records)
+            self.bytes_written += written
+            
+            if self.aggregates is not None:
+                try:
+                    self.aggregates.add(records, self.current_date)
+                except Exception as e:
+                    console.error(f"{Fore.RED}❌ Error updating analytics: {e}")
+        
+        log_write_seconds.observe(time.perf_counter() - started)
+        log_write_bytes.inc(written)
+        for record in records:
+            records_logged.inc(labels=(record.get('channel_id'),))
+        return written
+    
     async def log_message(self, message_data: Dict[str, Any]):
         """
-        Log a message to the current day's JSON file
+        Append a single message to the current day's log file
+        
+        The file I/O runs in a worker thread, off the event loop.
         
         Args:
             message_data: Dictionary containing message information
         """
-        async with self._lock:
-            try:
-                # Ensure we have the right file
-                log_file = await self._ensure_file()
-                
-                # Read existing data
-                existing_data = json.loads(log_file.read_text(encoding='utf-8'))
-                
-                # Append new message
-                existing_data.append(message_data)
-                
-                # Write back to file (pretty-printed for readability)
-                log_file.write_text(
-                    json.dumps(existing_data, indent=2, ensure_ascii=False),
-                    encoding='utf-8'
-                )
-                
-            except Exception as e:
-                print(f"{Fore.RED}❌ Error logging message: {e}")
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.write_batch, [message_data])
+        except Exception as e:
+            console.error(f"{Fore.RED}❌ Error logging message: {e}")
+    
+    def configure(
+        self,
+        fsync_policy: Optional[str] = None,
+        fsync_interval: Optional[float] = None,
+        encoder: Optional[str] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Change storage settings between batches, without reopening the day's file
+        
+        Args:
+            fsync_policy: 'never', 'always' or 'interval'
+            fsync_interval: Seconds between fsyncs for the 'interval' policy
+            encoder: JSON encoder name (JSON Lines only)
+            max_bytes: Size at which to start a new part (0 = no limit)
+        """
+        if fsync_policy is not None and fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        new_encoder = create_encoder(encoder) if encoder is not None else None
+        with self._lock:
+            if fsync_policy is not None:
+                self.storage.fsync_policy = fsync_policy
+            if fsync_interval is not None:
+                self.storage.fsync_interval = fsync_interval
+            if new_encoder is not None and hasattr(self.storage, 'encoder'):
+                self.storage.encoder = new_encoder
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+    
+    def close(self):
+        """Flush and close the current log file"""
+        with self._lock:
+            self.storage.close()
+            self.current_date = None
+            self._rollover_at = 0.0
+            if self.aggregates is not None:
+                self.aggregates.close()
     
     def format_message(
         self,
@@ -101,12 +266,88 @@ class DailyLogger:
             "attachments": attachments
         }
 
+    def format_attachment_update(
+        self,
+        message_id: int,
+        channel_id: int,
+        index: int,
+        attachment: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Format a follow-up record for an attachment that finished downloading
+        
+        The record replaces entry `index` of the message's 'pending'
+        attachments list. Records without 'record_type' are messages.
+        
+        Returns:
+            Dictionary with structured attachment update data
+        """
+        return {
+            "record_type": "attachment",
+            "message_id": str(message_id),
+            "channel_id": str(channel_id),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "index": index,
+            "attachment": attachment
+        }
+
+    def format_edit(
+        self,
+        message_id: int,
+        channel_id: int,
+        timestamp: str,
+        content: str
+    ) -> Dict[str, Any]:
+        """
+        Format a delta record for an edited message
+        
+        Only the new content is stored; the original stays in the message record.
+        
+        Returns:
+            Dictionary with structured edit data
+        """
+        return {
+            "record_type": "edit",
+            "message_id": str(message_id),
+            "channel_id": str(channel_id),
+            "timestamp": timestamp,
+            "content": content
+        }
+
+    def format_delete(
+        self,
+        message_id: int,
+        channel_id: int,
+        timestamp: str
+    ) -> Dict[str, Any]:
+        """
+        Format a delta record for a deleted message
+        
+        Returns:
+            Dictionary with structured deletion data
+        """
+        return {
+            "record_type": "delete",
+            "message_id": str(message_id),
+            "channel_id": str(channel_id),
+            "timestamp": timestamp
+        }
+
 # Global logger instance
 _logger_instance = None
 
-def get_logger(logs_dir: Path, timezone_offset: str = '+07:00') -> DailyLogger:
+def get_logger(
+    logs_dir: Path,
+    timezone_offset: str = '+07:00',
+    log_format: str = 'ndjson',
+    fsync_policy: str = 'never',
+    fsync_interval: float = 1.0,
+    encoder: str = 'stdlib',
+    max_bytes: int = 0
+) -> DailyLogger:
     """Get or create the global logger instance"""
     global _logger_instance
     if _logger_instance is None:
-        _logger_instance = DailyLogger(logs_dir, timezone_offset)
+        storage = create_storage(log_format, fsync_policy, fsync_interval, create_encoder(encoder))
+        _logger_instance = DailyLogger(logs_dir, timezone_offset, storage, max_bytes)
     return _logger_instance
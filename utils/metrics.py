@@ -0,0 +1,303 @@
+"""
+Lightweight in-process metrics
+Counters, gauges and histograms exposed in Prometheus text format
+"""
+
+import time
+import asyncio
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from colorama import Fore
+
+from utils.console import console
+
+# Default histogram buckets (seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Default histogram buckets (bytes)
+SIZE_BUCKETS = (1024, 10240, 102400, 524288, 1048576, 5242880, 10485760, 26214400, 104857600)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = '') -> str:
+    """Render a Prometheus label set"""
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """Monotonically increasing value, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[Any, ...], float] = {}
+        # Updated from the log writer and download threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, labels: Tuple[Any, ...] = ()):
+        """Add to the counter"""
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self) -> Dict[Tuple[Any, ...], float]:
+        """Copy of the values by label set"""
+        with self._lock:
+            return dict(self.values)
+
+    def total(self) -> float:
+        """Sum across all label sets"""
+        return sum(self.snapshot().values())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in self.snapshot().items()]
+
+
+class Gauge:
+    """Value that can go up and down, or is read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.callback = callback
+        self.values: Dict[Tuple[Any, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, labels: Tuple[Any, ...] = ()):
+        """Set the gauge"""
+        with self._lock:
+            self.values[labels] = value
+
+    def current(self) -> Dict[Tuple[Any, ...], float]:
+        """Current values by label set"""
+        if self.callback is not None:
+            try:
+                return {(): self.callback()}
+            except Exception:
+                return {}
+        with self._lock:
+            return dict(self.values)
+
+    def total(self) -> float:
+        return sum(self.current().values())
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                for labels, value in self.current().items()]
+
+
+class Histogram:
+    """Distribution of observations in fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+inf last), sum, count]
+        self.values: Dict[Tuple[Any, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Tuple[Any, ...] = ()):
+        """Record one observation"""
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bucket] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self) -> Dict[Tuple[Any, ...], Tuple[List[int], float, int]]:
+        """Copy of (bucket counts, sum, count) by label set"""
+        with self._lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self.values.items()}
+
+    def count(self) -> int:
+        return sum(state[2] for state in self.snapshot().values())
+
+    def mean(self) -> float:
+        states = self.snapshot().values()
+        count = sum(state[2] for state in states)
+        return sum(state[1] for state in states) / count if count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile across all label sets (upper bucket bound)"""
+        merged = [0] * (len(self.buckets) + 1)
+        for counts, _, _ in self.snapshot().values():
+            for i, n in enumerate(counts):
+                merged[i] += n
+        total = sum(merged)
+        if not total:
+            return 0.0
+        target = q * total
+        seen = 0
+        for i, n in enumerate(merged):
+            seen += n
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in self.snapshot().items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of named metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        gauge = self._register(Gauge(name, help_text, labelnames))
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def collect(self) -> List[Any]:
+        """All registered metrics"""
+        return list(self._metrics.values())
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry and the metrics recorded on the hot paths
+metrics = MetricsRegistry()
+
+messages_received = metrics.counter(
+    'dsm_messages_received_total', 'Messages received in monitored channels', ('channel',))
+message_changes = metrics.counter(
+    'dsm_message_changes_total', 'Edits and deletions in monitored channels', ('type',))
+message_handler_seconds = metrics.histogram(
+    'dsm_message_handler_seconds', 'Time spent in on_message')
+records_logged = metrics.counter(
+    'dsm_records_logged_total', 'Records written to the day log', ('channel',))
+log_write_seconds = metrics.histogram(
+    'dsm_log_write_seconds', 'Time to write one batch to the day log')
+log_write_bytes = metrics.counter(
+    'dsm_log_write_bytes_total', 'Bytes written to the day log')
+downloads = metrics.counter(
+    'dsm_downloads_total', 'Attachment downloads by outcome', ('status',))
+download_seconds = metrics.histogram(
+    'dsm_download_seconds', 'Attachment download latency')
+download_bytes = metrics.histogram(
+    'dsm_download_bytes', 'Attachment download size', buckets=SIZE_BUCKETS)
+download_retries = metrics.counter(
+    'dsm_download_retries_total', 'Attachment download retries')
+event_loop_lag = metrics.histogram(
+    'dsm_event_loop_lag_seconds', 'Delay of the event loop waking a sleeping task')
+
+
+async def monitor_loop_lag(interval: float = 0.5):
+    """Background task: sample event-loop lag until cancelled"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, loop.time() - started - interval))
+
+
+async def report_snapshots(interval: float):
+    """Background task: print a periodic stats line until cancelled"""
+    last_received = messages_received.total()
+    last_time = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        received = messages_received.total()
+        rate = (received - last_received) / (now - last_time)
+        last_received, last_time = received, now
+
+        queues = ', '.join(
+            f"{metric.name[len('dsm_'):-len('_depth')]} {int(metric.total())}"
+            for metric in metrics.collect() if metric.name.endswith('_depth')
+        )
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        console.info(
+            f"{Fore.CYAN}📊 [{timestamp}] {int(received):,} msgs ({rate:.1f}/s), "
+            f"{int(records_logged.total()):,} logged, "
+            f"downloads {int(downloads.values.get(('ok',), 0)):,} ok / "
+            f"{int(downloads.values.get(('failed',), 0)):,} failed, "
+            f"write p99 {log_write_seconds.quantile(0.99) * 1000:.0f}ms, "
+            f"loop lag p99 {event_loop_lag.quantile(0.99) * 1000:.0f}ms"
+            + (f", queues: {queues}" if queues else '')
+        )
+
+
+async def start_metrics_server(host: str, port: int, routes: Optional[List[Any]] = None):
+    """
+    Serve /metrics over HTTP
+
+    Args:
+        host: Interface to listen on
+        port: TCP port
+        routes: Extra aiohttp route definitions to serve alongside (e.g. utils.recent)
+
+    Returns:
+        aiohttp AppRunner (call cleanup() to stop)
+    """
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    if routes:
+        app.router.add_routes(routes)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    console.info(f"{Fore.GREEN}✓ Metrics at http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,303 @@
+"""
+Streaming reader for historical log files
+Lazily yields records from JSON Lines and legacy JSON array day files
+"""
+
+import os
+import re
+import json
+import codecs
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple, IO
+
+from utils.compression import open_at, uncompressed_size
+
+# Day files written by DailyLogger: YYYY-MM-DD.jsonl or YYYY-MM-DD.json, with a
+# part number from the second file of a day on (YYYY-MM-DD.001.jsonl), optionally
+# compressed once finished (.gz / .zst)
+LOG_FILE_PATTERN = re.compile(
+    r'^(?P<date>\d{4}-\d{2}-\d{2})(?:\.(?P<part>\d{3,}))?(?P<ext>\.jsonl|\.json)(?P<codec>\.gz|\.zst)?$'
+)
+
+# Per-shard log directories written in multi-process mode (logs/shard-NN/)
+SHARD_DIR_PATTERN = re.compile(r'^shard-\d+$')
+
+# Sidecar file holding consumer positions for a day file
+OFFSETS_SUFFIX = '.offsets'
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def parse_log_filename(name: str) -> Optional[Dict[str, str]]:
+    """
+    Parse a day file name
+
+    Returns:
+        {'date': 'YYYY-MM-DD', 'part': '001' | None, 'ext': '.jsonl' | '.json',
+        'codec': '.gz' | '.zst' | None} or None if not a log file
+    """
+    match = LOG_FILE_PATTERN.match(name)
+    return match.groupdict() if match else None
+
+
+def _iter_lines(f: IO[bytes], offset: int, needles: Optional[List[bytes]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (end offset, record) from a JSON Lines stream"""
+    for line in f:
+        if not line.endswith(b'\n'):
+            # Partial line still being written (or torn by a crash)
+            return
+        offset += len(line)
+
+        if needles is not None and not any(needle in line for needle in needles):
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield offset, json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def _iter_array(f: IO[bytes], offset: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yield (end offset, record) from a JSON array stream without loading it whole
+
+    A non-zero offset must point just past a previously yielded element.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    expect = '[' if offset == 0 else ','
+
+    while True:
+        # Skip whitespace (always one byte each), reading more as needed
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+                offset += 1
+            if pos < len(buf) or eof:
+                break
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+        if pos >= len(buf):
+            return
+
+        char = buf[pos]
+        if expect == '[':
+            if char != '[':
+                raise ValueError("Log file is not a JSON array")
+            pos += 1
+            offset += 1
+            expect = 'first'
+            continue
+        if char == ']':
+            return
+        if expect == ',':
+            if char != ',':
+                raise ValueError(f"Unexpected {char!r} in JSON array at byte {offset}")
+            pos += 1
+            offset += 1
+            expect = 'value'
+            continue
+
+        try:
+            record, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                # Truncated final element
+                return
+            chunk = f.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+            continue
+
+        offset += len(buf[pos:end].encode('utf-8'))
+        pos = end
+        expect = ','
+        yield offset, record
+
+
+def iter_file(
+    path: Path,
+    offset: int = 0,
+    channel_ids: Optional[Iterable[str]] = None
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Stream records from one day file
+
+    Args:
+        path: JSON Lines or JSON array day file, optionally compressed
+        offset: Byte offset to resume from (an offset previously yielded),
+            counted in uncompressed bytes
+        channel_ids: If set, JSON Lines records from other channels are
+            skipped before being parsed
+
+    Yields:
+        (byte offset just past the record, record dictionary)
+    """
+    info = parse_log_filename(path.name)
+    is_array = info['ext'] == '.json' if info else path.suffix == '.json'
+
+    needles = None
+    if channel_ids is not None and not is_array:
+        needles = []
+        for channel_id in channel_ids:
+            needles.append(f'"channel_id":"{channel_id}"'.encode())
+            needles.append(f'"channel_id": "{channel_id}"'.encode())
+
+    with open_at(path, offset) as f:
+        if is_array:
+            yield from _iter_array(f, offset)
+        else:
+            yield from _iter_lines(f, offset, needles)
+
+
+class LogReader:
+    """
+    Lazy iterator over a logs directory
+
+    Consumers that pass a name get at-least-once delivery: the position of
+    each record they have moved past is saved in a small sidecar file next
+    to the day file (YYYY-MM-DD.jsonl.offsets), and the next run resumes
+    from there instead of rescanning.
+    """
+
+    def __init__(self, logs_dir: Path, commit_every: int = 1000):
+        self.logs_dir = logs_dir
+        self.commit_every = commit_every
+
+    def files(self, since: Optional[str] = None, until: Optional[str] = None,
+              include_shards: bool = True) -> List[Path]:
+        """
+        List day files in date order
+
+        Files in shard directories (logs/shard-NN/) are included, after the
+        top-level file for the same date.
+
+        Args:
+            since: First date to include (YYYY-MM-DD)
+            until: Last date to include (YYYY-MM-DD)
+            include_shards: Also list files in shard directories
+        """
+        directories = [self.logs_dir]
+        if include_shards:
+            directories += sorted(
+                path for path in self.logs_dir.iterdir()
+                if path.is_dir() and SHARD_DIR_PATTERN.match(path.name)
+            )
+
+        found = {}
+        for order, directory in enumerate(directories):
+            for path in directory.iterdir():
+                info = parse_log_filename(path.name)
+                if info is None:
+                    continue
+                if since and info['date'] < since:
+                    continue
+                if until and info['date'] > until:
+                    continue
+                # While a file is being compressed both copies exist; prefer the original
+                key = (info['date'], order, int(info['part'] or 0), info['ext'])
+                if key not in found or not info['codec']:
+                    found[key] = path
+        return [found[key] for key in sorted(found)]
+
+    @staticmethod
+    def _offsets_path(path: Path) -> Path:
+        """Sidecar path for a day file"""
+        return path.with_name(path.name + OFFSETS_SUFFIX)
+
+    def _load_offsets(self, path: Path) -> Dict[str, Any]:
+        """Read a day file's sidecar"""
+        try:
+            return json.loads(self._offsets_path(path).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {'consumers': {}}
+
+    def position(self, consumer: str, path: Path) -> int:
+        """Byte offset a consumer has processed up to in a day file"""
+        entry = self._load_offsets(path)['consumers'].get(consumer)
+        return entry['offset'] if entry else 0
+
+    def commit(self, consumer: str, path: Path, offset: int, message_id: Optional[str] = None):
+        """Save a consumer's position in a day file (atomic replace)"""
+        data = self._load_offsets(path)
+        data['consumers'][consumer] = {'offset': offset, 'message_id': message_id}
+        sidecar = self._offsets_path(path)
+        tmp = sidecar.with_name(sidecar.name + '.tmp')
+        tmp.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(tmp, sidecar)
+
+    def iter_records(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        channel_ids: Optional[Iterable[Any]] = None,
+        consumer: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream records across day files
+
+        Args:
+            since: First date to include (YYYY-MM-DD)
+            until: Last date to include (YYYY-MM-DD)
+            channel_ids: Only records from these channels
+            consumer: Name under which to save and resume positions
+
+        Yields:
+            Record dictionaries in file order
+        """
+        channels = {str(c) for c in channel_ids} if channel_ids is not None else None
+
+        for path in self.files(since, until):
+            start = self.position(consumer, path) if consumer else 0
+            if start and start >= uncompressed_size(path):
+                continue
+            yield from self._iter_path(path, start, channels, consumer)
+
+    def _iter_path(
+        self,
+        path: Path,
+        start: int,
+        channels: Optional[set],
+        consumer: Optional[str]
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream one day file, committing the consumer's position as it goes"""
+        committed = start
+        done_offset, done_id = start, None
+        current = None
+        since_commit = 0
+
+        try:
+            for offset, record in iter_file(path, start, channels):
+                # Being asked for the next record means the current one was processed
+                if current is not None:
+                    done_offset, done_id = current
+                    current = None
+
+                if channels is not None and str(record.get('channel_id')) not in channels:
+                    done_offset = offset
+                    continue
+
+                if consumer and since_commit >= self.commit_every:
+                    self.commit(consumer, path, done_offset, done_id)
+                    committed = done_offset
+                    since_commit = 0
+
+                current = (offset, record.get('message_id'))
+                since_commit += 1
+                yield record
+
+            # Reached the end of the file, so the last record was processed too
+            if current is not None:
+                done_offset, done_id = current
+        finally:
+            if consumer and done_offset != committed:
+                self.commit(consumer, path, done_offset, done_id)
@@ -0,0 +1,237 @@
+"""
+In-memory cache of recent messages per channel
+Bounded by message count per channel and estimated bytes overall, with a small HTTP API
+"""
+
+import sys
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from utils.metrics import metrics
+
+# Rough per-record cost of the dict, its keys and the ID/timestamp strings
+RECORD_OVERHEAD = 1200
+ATTACHMENT_OVERHEAD = 600
+
+recent_evictions = metrics.counter(
+    'dsm_recent_cache_evictions_total', 'Messages evicted from the recent-message cache', ('reason',))
+
+
+def _record_size(record: Dict[str, Any]) -> int:
+    """Estimated memory held by a cached record"""
+    return (RECORD_OVERHEAD + sys.getsizeof(record['content'] or '')
+            + ATTACHMENT_OVERHEAD * len(record['attachments']))
+
+
+class RecentCache:
+    """
+    Recent messages in each channel, newest last
+
+    A channel keeps at most `per_channel` messages. When the estimated
+    total exceeds `max_bytes`, the oldest message of the least recently
+    used channel (written to or read from) is evicted first.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, per_channel: int = 1000):
+        """
+        Args:
+            max_bytes: Estimated memory budget for all cached messages
+            per_channel: Maximum messages kept per channel
+        """
+        self.max_bytes = max_bytes
+        self.per_channel = per_channel
+        # channel_id -> message_id -> (created epoch, size, record); channels in LRU order
+        self._channels: 'OrderedDict[int, OrderedDict[int, Tuple[float, int, Dict[str, Any]]]]' = OrderedDict()
+        self._channel_of: Dict[int, int] = {}
+
+        # Counters
+        self.bytes = 0
+        self.messages_added = 0
+
+    def __len__(self) -> int:
+        return len(self._channel_of)
+
+    def add(self, fields: Dict[str, Any]):
+        """
+        Cache a received message
+
+        Args:
+            fields: Message fields as returned by utils.ingest.message_fields()
+        """
+        message_id = int(fields['message_id'])
+        channel_id = int(fields['channel_id'])
+        if message_id in self._channel_of:
+            return
+        record = {
+            'message_id': str(message_id),
+            'timestamp': fields['timestamp'],
+            'author': fields['author'],
+            'author_id': str(fields['author_id']),
+            'channel_id': str(channel_id),
+            'channel_name': fields['channel_name'],
+            'content': fields['content'],
+            'attachments': [
+                {'filename': a['filename'], 'url': a['url'], 'size': a['size']}
+                for a in fields['attachments']
+            ]
+        }
+        if fields.get('reply_to'):
+            record['reply_to'] = str(fields['reply_to'])
+        size = _record_size(record)
+
+        channel = self._channels.get(channel_id)
+        if channel is None:
+            channel = self._channels[channel_id] = OrderedDict()
+        else:
+            self._channels.move_to_end(channel_id)
+        channel[message_id] = (datetime.fromisoformat(fields['timestamp']).timestamp(), size, record)
+        self._channel_of[message_id] = channel_id
+        self.bytes += size
+        self.messages_added += 1
+
+        if len(channel) > self.per_channel:
+            self._evict_oldest(channel_id, 'channel_limit')
+        while self.bytes > self.max_bytes and self._channel_of:
+            self._evict_oldest(next(iter(self._channels)), 'memory_limit')
+
+    def _evict_oldest(self, channel_id: int, reason: str):
+        """Drop the oldest cached message of a channel"""
+        channel = self._channels[channel_id]
+        message_id, (_, size, _) = channel.popitem(last=False)
+        del self._channel_of[message_id]
+        self.bytes -= size
+        if not channel:
+            del self._channels[channel_id]
+        recent_evictions.inc(labels=(reason,))
+
+    def _entry(self, message_id: int) -> Optional[Tuple[float, int, Dict[str, Any]]]:
+        channel_id = self._channel_of.get(int(message_id))
+        if channel_id is None:
+            return None
+        return self._channels[channel_id][int(message_id)]
+
+    def get(self, message_id: int) -> Optional[Dict[str, Any]]:
+        """A cached message by ID (its latest state), or None"""
+        entry = self._entry(message_id)
+        return entry[2] if entry else None
+
+    def apply_change(self, change: Dict[str, Any]):
+        """
+        Update a cached message from an edit or deletion
+
+        Args:
+            change: Fields as returned by utils.ingest.edit_fields() or delete_fields()
+        """
+        entry = self._entry(change['message_id'])
+        if entry is None:
+            return
+        created, size, record = entry
+        if change['record_type'] == 'edit':
+            record['content'] = change['content']
+            record['edited_at'] = change['timestamp']
+            new_size = _record_size(record)
+            self.bytes += new_size - size
+            self._channels[int(record['channel_id'])][int(record['message_id'])] = (created, new_size, record)
+        else:
+            record['deleted_at'] = change['timestamp']
+
+    def recent(
+        self,
+        channel_id: int,
+        limit: int = 50,
+        since: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recent messages in a channel, newest first
+
+        Args:
+            channel_id: Channel to read
+            limit: Maximum messages to return
+            since: Only messages created at or after this Unix time
+
+        Returns:
+            List of message records
+        """
+        channel = self._channels.get(int(channel_id))
+        if not channel:
+            return []
+        self._channels.move_to_end(int(channel_id))
+        results = []
+        for created, _, record in reversed(channel.values()):
+            if len(results) >= limit or (since is not None and created < since):
+                break
+            results.append(record)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache size overall and per channel"""
+        return {
+            'messages': len(self._channel_of),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'channels': {str(cid): len(channel) for cid, channel in self._channels.items()}
+        }
+
+
+def recent_routes(cache: RecentCache):
+    """
+    HTTP routes for querying the cache (served next to /metrics)
+
+    GET /recent?channel=ID[&limit=N][&seconds=S]   newest first
+    GET /message/ID                                  one message, with the message it replies to
+    GET /recent/stats                                cache size
+    """
+    import time
+    from aiohttp import web
+
+    def _int_param(request, name: str, default: Optional[int]) -> Optional[int]:
+        value = request.query.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise web.HTTPBadRequest(text=f"{name} must be a whole number")
+
+    async def handle_recent(request):
+        channel_id = _int_param(request, 'channel', None)
+        if channel_id is None:
+            raise web.HTTPBadRequest(text="channel is required")
+        limit = _int_param(request, 'limit', 50)
+        seconds = _int_param(request, 'seconds', None)
+        since = time.time() - seconds if seconds is not None else None
+        return web.json_response({'messages': cache.recent(channel_id, limit, since)})
+
+    async def handle_message(request):
+        try:
+            message_id = int(request.match_info['message_id'])
+        except ValueError:
+            raise web.HTTPBadRequest(text="message ID must be a number")
+        record = cache.get(message_id)
+        if record is None:
+            raise web.HTTPNotFound(text="message not in the recent cache")
+        body = {'message': record}
+        if 'reply_to' in record:
+            body['reply_to'] = cache.get(int(record['reply_to']))
+        return web.json_response(body)
+
+    async def handle_stats(request):
+        return web.json_response(cache.stats())
+
+    return [
+        web.get('/recent', handle_recent),
+        web.get('/recent/stats', handle_stats),
+        web.get('/message/{message_id}', handle_message),
+    ]
+
+
+# Global cache instance
+_recent_instance = None
+
+def get_recent_cache(max_bytes: int = 16 * 1024 * 1024, per_channel: int = 1000) -> RecentCache:
+    """Get or create the global recent-message cache"""
+    global _recent_instance
+    if _recent_instance is None:
+        _recent_instance = RecentCache(max_bytes, per_channel)
+    return _recent_instance
@@ -0,0 +1,296 @@
+"""
+Per-channel routing rules for received messages
+Rules are compiled once into predicates that decide, before any I/O, whether a message is kept and where it goes
+"""
+
+import re
+import json
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable, Tuple, Iterable
+
+from utils.metrics import metrics
+
+# Messages discarded by a rule, by rule name and reason ('drop' or 'sample')
+messages_filtered = metrics.counter(
+    'dsm_messages_filtered_total', 'Messages discarded by routing rules', ('rule', 'reason'))
+
+# Log target names become directories under logs/
+TARGET_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]*$')
+# Directories under logs/ that hold something else (shard-NN/ directories are reserved too)
+RESERVED_TARGETS = ('analytics',)
+
+# Keys a rule may contain
+CONDITION_KEYS = ('channels', 'authors', 'exclude_authors', 'content', 'has_attachments')
+ACTION_KEYS = ('drop', 'sample', 'log_target', 'download', 'attachment_types',
+               'max_attachment_bytes', 'console')
+
+
+class Route:
+    """What happens to a message that passed the rules"""
+
+    __slots__ = ('rule', 'log_target', 'download', 'attachment_types', 'max_attachment_bytes', 'console')
+
+    def __init__(
+        self,
+        rule: str = '',
+        log_target: Optional[str] = None,
+        download: bool = True,
+        attachment_types: Optional[Iterable[str]] = None,
+        max_attachment_bytes: Optional[int] = None,
+        console: bool = True
+    ):
+        """
+        Args:
+            rule: Name of the rule that produced this route ('' = no rule matched)
+            log_target: Write to logs/<log_target>/ instead of the main day files
+            download: Download attachments at all
+            attachment_types: Only download these extensions (None = downloader's own filter)
+            max_attachment_bytes: Skip attachments Discord reports as larger than this
+            console: Print the message to the console
+        """
+        self.rule = rule
+        self.log_target = log_target
+        self.download = download
+        self.attachment_types = (
+            frozenset('.' + ext.lower().lstrip('.') for ext in attachment_types)
+            if attachment_types is not None else None
+        )
+        self.max_attachment_bytes = max_attachment_bytes
+        self.console = console
+
+    def wants(self, filename: str, size: int) -> bool:
+        """Whether an attachment should be downloaded"""
+        if not self.download:
+            return False
+        if self.max_attachment_bytes is not None and size > self.max_attachment_bytes:
+            return False
+        if self.attachment_types is not None:
+            return Path(filename).suffix.lower() in self.attachment_types
+        return True
+
+    def apply(self, fields: Dict[str, Any]):
+        """
+        Record the route on message fields (see utils.ingest.message_fields)
+
+        Sets 'log_target', and 'download': False on attachments to skip.
+        """
+        if self.log_target:
+            fields['log_target'] = self.log_target
+        for attachment in fields['attachments']:
+            if not self.wants(attachment['filename'], attachment['size']):
+                attachment['download'] = False
+
+
+# Route for messages no rule matched: log, download and print as usual
+DEFAULT_ROUTE = Route()
+
+
+def _ids(spec: Dict[str, Any], key: str, name: str) -> frozenset:
+    """A rule's list of channel or user IDs"""
+    values = spec[key]
+    if not isinstance(values, list):
+        raise ValueError(f"{name}: {key} must be a list of IDs")
+    try:
+        return frozenset(int(value) for value in values)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: {key} must be a list of IDs") from None
+
+
+def _sampled(message_id: int, rate: float) -> bool:
+    """Deterministic sampling by message ID, so every process makes the same choice"""
+    return (int(message_id) * 2654435761) % 4294967296 < rate * 4294967296
+
+
+class Rule:
+    """One compiled rule: conditions, plus a route or a drop/sample decision"""
+
+    def __init__(self, spec: Dict[str, Any], position: int):
+        """
+        Args:
+            spec: Rule object from the rules file
+            position: Index of the rule in the file (for default names and errors)
+        """
+        unknown = set(spec) - set(CONDITION_KEYS) - set(ACTION_KEYS) - {'name'}
+        if unknown:
+            raise ValueError(f"rule {position}: unknown key(s) {', '.join(sorted(unknown))}")
+
+        self.name = str(spec.get('name') or f"rule-{position}")
+        self.channels = _ids(spec, 'channels', self.name) if 'channels' in spec else None
+        self.drop = bool(spec.get('drop', False))
+        try:
+            self.sample = float(spec.get('sample', 1.0))
+        except (TypeError, ValueError):
+            self.sample = -1.0
+        if not 0.0 <= self.sample <= 1.0:
+            raise ValueError(f"{self.name}: sample must be between 0 and 1")
+
+        attachment_types = spec.get('attachment_types')
+        if attachment_types is not None and (
+            not isinstance(attachment_types, list) or not all(isinstance(ext, str) for ext in attachment_types)
+        ):
+            raise ValueError(f"{self.name}: attachment_types must be a list of extensions")
+        max_attachment_bytes = spec.get('max_attachment_bytes')
+        if max_attachment_bytes is not None and (
+            isinstance(max_attachment_bytes, bool) or not isinstance(max_attachment_bytes, int)
+        ):
+            raise ValueError(f"{self.name}: max_attachment_bytes must be a whole number")
+
+        log_target = spec.get('log_target')
+        if log_target is not None and not (isinstance(log_target, str) and TARGET_PATTERN.match(log_target)):
+            raise ValueError(f"{self.name}: log_target must be letters, digits, '-' or '_'")
+        if log_target is not None and (log_target.startswith('shard-') or log_target in RESERVED_TARGETS):
+            raise ValueError(f"{self.name}: log_target may not be 'analytics' or start with 'shard-'")
+
+        self.route = Route(
+            rule=self.name,
+            log_target=log_target,
+            download=bool(spec.get('download', True)),
+            attachment_types=attachment_types,
+            max_attachment_bytes=max_attachment_bytes,
+            console=bool(spec.get('console', True))
+        )
+        self.checks = self._compile(spec)
+
+    def _compile(self, spec: Dict[str, Any]) -> Tuple[Callable[..., bool], ...]:
+        """Turn the conditions (other than channels) into predicates"""
+        checks = []
+        if 'authors' in spec:
+            authors = _ids(spec, 'authors', self.name)
+            checks.append(lambda author_id, content, has_attachments: author_id in authors)
+        if 'exclude_authors' in spec:
+            excluded = _ids(spec, 'exclude_authors', self.name)
+            checks.append(lambda author_id, content, has_attachments: author_id not in excluded)
+        if 'content' in spec:
+            if not isinstance(spec['content'], str):
+                raise ValueError(f"{self.name}: content must be a regular expression string")
+            try:
+                search = re.compile(spec['content']).search
+            except re.error as e:
+                raise ValueError(f"{self.name}: invalid content pattern: {e}") from None
+            checks.append(lambda author_id, content, has_attachments: search(content) is not None)
+        if 'has_attachments' in spec:
+            wanted = bool(spec['has_attachments'])
+            checks.append(lambda author_id, content, has_attachments: has_attachments == wanted)
+        return tuple(checks)
+
+    def matches(self, author_id: int, content: str, has_attachments: bool) -> bool:
+        """Whether a message in one of the rule's channels meets every condition"""
+        for check in self.checks:
+            if not check(author_id, content, has_attachments):
+                return False
+        return True
+
+
+class RuleSet:
+    """
+    Ordered routing rules; the first rule that matches a message decides
+
+    Rules are indexed by channel when compiled, so a message is only
+    checked against the rules that can apply to its channel.
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = list(rules or [])
+        # Rules without a channel list apply everywhere
+        self._any_channel = [rule for rule in self.rules if rule.channels is None]
+        self._by_channel: Dict[int, List[Rule]] = {}
+        for channel_id in {cid for rule in self.rules if rule.channels for cid in rule.channels}:
+            self._by_channel[channel_id] = [
+                rule for rule in self.rules if rule.channels is None or channel_id in rule.channels
+            ]
+
+    @classmethod
+    def load(cls, path: Optional[Path]) -> 'RuleSet':
+        """
+        Compile the rules in a JSON file
+
+        Args:
+            path: Rules file (None or missing = no rules)
+
+        Returns:
+            The compiled rules
+
+        Raises:
+            ValueError: If the file is not valid JSON or a rule is invalid
+        """
+        if path is None or not path.exists():
+            return cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            # JSONDecodeError and UnicodeDecodeError are ValueErrors
+            raise ValueError(f"{path.name}: {e}") from None
+        specs = data.get('rules', []) if isinstance(data, dict) else data
+        if not isinstance(specs, list):
+            raise ValueError(f"{path.name}: expected a list of rule objects under 'rules'")
+
+        rules = []
+        for position, spec in enumerate(specs):
+            if not isinstance(spec, dict):
+                raise ValueError(f"{path.name}: rule {position} is not an object")
+            try:
+                rules.append(Rule(spec, position))
+            except ValueError:
+                raise
+            except Exception as e:
+                # A value of the wrong type that the checks above didn't anticipate
+                raise ValueError(f"{path.name}: rule {position}: {type(e).__name__}: {e}") from None
+        return cls(rules)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, message_id: int, channel_id: int, author_id: int,
+              content: str, has_attachments: bool, count: bool = True) -> Optional[Route]:
+        """
+        Decide what to do with a message
+
+        Args:
+            message_id: Discord message ID (for sampling)
+            channel_id: Channel the message was sent in
+            author_id: Author's user ID
+            content: Message text
+            has_attachments: Whether the message has attachments
+            count: Count discarded messages in dsm_messages_filtered_total
+                (False for edits and deletions of messages already counted)
+
+        Returns:
+            The route to follow, or None if the message is discarded
+        """
+        for rule in self._by_channel.get(channel_id, self._any_channel):
+            if rule.matches(author_id, content, has_attachments):
+                return self._decide(rule, message_id, count)
+        return DEFAULT_ROUTE
+
+    def match_channel(self, message_id: int, channel_id: int) -> Optional[Route]:
+        """
+        Decide what to do with a change to a message whose author and content are unknown
+
+        Only rules without author, content or attachment conditions apply;
+        nothing is counted in dsm_messages_filtered_total.
+
+        Args:
+            message_id: Discord message ID (for sampling)
+            channel_id: Channel the message was sent in
+
+        Returns:
+            The route to follow, or None if the change is discarded
+        """
+        for rule in self._by_channel.get(channel_id, self._any_channel):
+            if not rule.checks:
+                return self._decide(rule, message_id, count=False)
+        return DEFAULT_ROUTE
+
+    @staticmethod
+    def _decide(rule: Rule, message_id: int, count: bool) -> Optional[Route]:
+        """A matching rule's route, or None if it drops or samples out the message"""
+        if rule.drop:
+            if count:
+                messages_filtered.inc(labels=(rule.name, 'drop'))
+            return None
+        if rule.sample < 1.0 and not _sampled(message_id, rule.sample):
+            if count:
+                messages_filtered.inc(labels=(rule.name, 'sample'))
+            return None
+        return rule.route
@@ -0,0 +1,146 @@
+"""
+JSON encoders for log records
+Stdlib json by default, orjson or msgspec when installed
+"""
+
+import json
+from typing import Dict, Any, List
+from colorama import Fore
+
+from utils.console import console
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # Optional dependency
+    msgspec = None
+
+
+def _encode_escaped(record: Dict[str, Any]) -> bytes:
+    """Last resort: json.dumps with \\u escapes, which accepts anything the others reject"""
+    return json.dumps(record, separators=(',', ':')).encode('ascii')
+
+
+class Encoder:
+    """
+    Encodes records as compact UTF-8 JSON
+
+    All encoders produce equivalent JSON (non-ASCII text is not escaped),
+    so day files don't depend on which one wrote them.
+    """
+
+    name = ''
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        """One record, without a trailing newline"""
+        raise NotImplementedError
+
+    def encode_lines(self, records: List[Dict[str, Any]]) -> bytes:
+        """Records as JSON Lines (each followed by a newline)"""
+        return b''.join(self.encode(record) + b'\n' for record in records)
+
+
+class StdlibEncoder(Encoder):
+    """json.dumps"""
+
+    name = 'stdlib'
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        try:
+            return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        except UnicodeEncodeError:
+            # Lone surrogates in message text
+            return _encode_escaped(record)
+
+    def encode_lines(self, records: List[Dict[str, Any]]) -> bytes:
+        try:
+            return ''.join(
+                json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+                for record in records
+            ).encode('utf-8')
+        except UnicodeEncodeError:
+            return super().encode_lines(records)
+
+
+class OrjsonEncoder(Encoder):
+    """orjson, falling back to json.dumps for records it rejects"""
+
+    name = 'orjson'
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        try:
+            return orjson.dumps(record)
+        except TypeError:
+            # e.g. lone surrogates in message text or integers beyond 64 bits
+            return _encode_escaped(record)
+
+    def encode_lines(self, records: List[Dict[str, Any]]) -> bytes:
+        dumps = orjson.dumps
+        option = orjson.OPT_APPEND_NEWLINE
+        parts = []
+        for record in records:
+            try:
+                parts.append(dumps(record, option=option))
+            except TypeError:
+                parts.append(_encode_escaped(record) + b'\n')
+        return b''.join(parts)
+
+
+class MsgspecEncoder(Encoder):
+    """msgspec.json, falling back to json.dumps for records it rejects"""
+
+    name = 'msgspec'
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+
+    def encode(self, record: Dict[str, Any]) -> bytes:
+        try:
+            return self._encoder.encode(record)
+        except (TypeError, msgspec.EncodeError, UnicodeEncodeError):
+            return _encode_escaped(record)
+
+    def encode_lines(self, records: List[Dict[str, Any]]) -> bytes:
+        try:
+            return self._encoder.encode_lines(records)
+        except (TypeError, msgspec.EncodeError, UnicodeEncodeError):
+            # Encode one at a time so only the offending record falls back
+            return super().encode_lines(records)
+
+
+# Encoder registry, keyed by LOG_ENCODER value, in 'auto' preference order
+ENCODERS = {
+    'msgspec': MsgspecEncoder,
+    'orjson': OrjsonEncoder,
+    'stdlib': StdlibEncoder,
+}
+
+# Module each optional encoder needs
+_REQUIRES = {'msgspec': msgspec, 'orjson': orjson}
+
+
+def available_encoders() -> List[str]:
+    """Names of the encoders that can be used in this environment"""
+    return [name for name in ENCODERS if _REQUIRES.get(name, True) is not None]
+
+
+def create_encoder(name: str = 'auto') -> Encoder:
+    """
+    Create an encoder by name
+
+    'auto' picks the fastest installed one. A named encoder whose package
+    is missing falls back to stdlib with a warning.
+    """
+    available = available_encoders()
+    if name == 'auto':
+        name = available[0]
+    elif name not in ENCODERS:
+        raise ValueError(f"Unknown encoder: {name}")
+    elif name not in available:
+        console.warning(f"{Fore.YELLOW}⚠️  '{name}' not installed, encoding logs with stdlib json")
+        name = 'stdlib'
+    return ENCODERS[name]()
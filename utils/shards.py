@@ -0,0 +1,287 @@
+"""
+Multi-process sharding of message persistence
+The gateway process forwards messages to worker processes partitioned by channel
+"""
+
+import queue
+import signal
+import asyncio
+import multiprocessing
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set
+from colorama import Fore
+
+from utils.console import console
+
+# Sentinel telling a shard worker to drain and exit
+_STOP = None
+# Message telling a shard worker to re-read .env
+_RELOAD = 'reload'
+
+
+def shard_for(channel_id: int, shards: int) -> int:
+    """Shard index that owns a channel"""
+    return int(channel_id) % shards
+
+
+def shard_dir(logs_dir: Path, shard: int) -> Path:
+    """Logs directory of one shard"""
+    return logs_dir / f"shard-{shard:02d}"
+
+
+def adopt_job_stores(logs_dir: Path, shards: int) -> int:
+    """
+    Move pending download jobs left by a different SHARD_WORKERS setting into the live stores
+
+    Args:
+        logs_dir: Top-level logs directory
+        shards: Current number of shard workers (0 = single process)
+
+    Returns:
+        Number of jobs moved
+    """
+    from config import config
+    from utils.reader import SHARD_DIR_PATTERN
+    from utils.download_queue import move_jobs
+
+    name = config.download_queue_db.name
+    orphans = []
+    if shards > 0 and (logs_dir / name).exists():
+        orphans.append(logs_dir / name)
+    if logs_dir.is_dir():
+        for path in sorted(logs_dir.iterdir()):
+            if (
+                path.is_dir() and SHARD_DIR_PATTERN.match(path.name)
+                and int(path.name.split('-')[1]) >= shards
+                and (path / name).exists()
+            ):
+                orphans.append(path / name)
+
+    def dest_for(job: Dict[str, Any]) -> Path:
+        if shards > 0:
+            return shard_dir(logs_dir, shard_for(job['channel_id'], shards)) / name
+        return logs_dir / name
+
+    moved = 0
+    for orphan in orphans:
+        try:
+            count = move_jobs(orphan, dest_for)
+        except Exception as e:
+            console.warning(f"{Fore.YELLOW}⚠️ Could not adopt the download jobs in {orphan}: {e}")
+            continue
+        moved += count
+        if count:
+            console.info(f"{Fore.CYAN}📥 Adopted {count} pending download job(s) from {orphan}")
+    return moved
+
+
+async def _run_shard(shard: int, inbox) -> int:
+    """Shard worker event loop: ingest batches until told to stop"""
+    from config import config, ENV_FILE
+    from utils.ingest import IngestPipeline
+    from utils.config_watcher import ConfigWatcher
+
+    logs_dir = shard_dir(config.logs_dir, shard)
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    pipeline = IngestPipeline(
+        logs_dir,
+        config.downloads_dir,
+        config.archive_db if config.archive_enabled else None
+    )
+    await pipeline.start()
+
+    # Reloads are triggered by the gateway, which reports the changes
+    watcher = ConfigWatcher(ENV_FILE, interval=0, quiet=True)
+    watcher.add_listener(pipeline.apply_config)
+
+    loop = asyncio.get_running_loop()
+    handled = 0
+    try:
+        while True:
+            # Blocking pipe read off the event loop, so downloads keep running
+            batch = await loop.run_in_executor(None, inbox.get)
+            if batch is _STOP:
+                break
+            if batch == _RELOAD:
+                await watcher.reload()
+                continue
+            for fields in batch:
+                if 'record_type' in fields:
+                    await pipeline.ingest_change(fields)
+                else:
+                    await pipeline.ingest(fields)
+            handled += len(batch)
+    finally:
+        await pipeline.drain()
+        await pipeline.close()
+    return handled
+
+
+def _init_shard_env(env_file_keys: Set[str]):
+    """Read .env in a worker, treating the values inherited from it as reloadable"""
+    from config import load_env, release_env_keys
+
+    release_env_keys(env_file_keys)
+    load_env()
+
+
+def _shard_main(shard: int, inbox, env_file_keys: Set[str]):
+    """Worker process entry point"""
+    from config import load_config
+    from utils.console import start_console, stop_console
+
+    # A spawned process starts from scratch, so it reads .env itself
+    _init_shard_env(env_file_keys)
+    config = load_config()
+
+    # Ctrl+C goes to the gateway, which stops the shards in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    start_console(config.console_level)
+    try:
+        handled = asyncio.run(_run_shard(shard, inbox))
+        console.info(f"{Fore.GREEN}✓ Shard {shard} stopped after {handled:,} message(s)")
+    finally:
+        stop_console()
+
+
+class ShardPool:
+    """
+    Worker processes that log messages and download attachments
+
+    Each channel always maps to the same shard, which writes its own day
+    files under logs/shard-NN/. The gateway only batches plain message
+    fields onto each shard's pipe, so serialization, hashing and disk I/O
+    run on the workers' cores.
+    """
+
+    def __init__(
+        self,
+        shards: int,
+        batch_size: int = 100,
+        flush_interval: float = 0.05,
+        max_queue: int = 1000,
+        drain_timeout: float = 40.0
+    ):
+        """
+        Args:
+            shards: Number of worker processes
+            batch_size: Messages per batch sent to a shard
+            flush_interval: Maximum seconds a message waits for its batch to fill
+            max_queue: Batches buffered per shard before the gateway waits
+            drain_timeout: Seconds to wait for each worker to finish on shutdown
+        """
+        self.shards = shards
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.drain_timeout = drain_timeout
+
+        # Spawn rather than fork: the gateway's event loop and sockets must not be inherited
+        self._context = multiprocessing.get_context('spawn')
+        self._inboxes = []
+        self._processes = []
+        self._buffers: List[List[Dict[str, Any]]] = [[] for _ in range(shards)]
+        self._send_locks: List[asyncio.Lock] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.messages_forwarded = 0
+        self.batches_sent = 0
+
+    async def start(self):
+        """Start the worker processes and the periodic flush"""
+        if self._processes:
+            return
+        from config import config, env_file_keys
+        # Before any worker opens its store, so none of them misses its jobs
+        await asyncio.get_running_loop().run_in_executor(
+            None, adopt_job_stores, config.logs_dir, self.shards
+        )
+        inherited = env_file_keys()
+        for shard in range(self.shards):
+            inbox = self._context.Queue(self.max_queue)
+            process = self._context.Process(
+                target=_shard_main,
+                args=(shard, inbox, inherited),
+                name=f"dsm-shard-{shard:02d}",
+                daemon=False
+            )
+            process.start()
+            self._inboxes.append(inbox)
+            self._processes.append(process)
+            self._send_locks.append(asyncio.Lock())
+        self._flush_task = asyncio.get_running_loop().create_task(self._flush_periodically())
+        console.info(f"{Fore.GREEN}✓ Started {self.shards} shard worker process(es)")
+
+    async def ingest(self, fields: Dict[str, Any]):
+        """Queue a message for the shard that owns its channel"""
+        shard = shard_for(fields['channel_id'], self.shards)
+        buffer = self._buffers[shard]
+        buffer.append(fields)
+        self.messages_forwarded += 1
+        if len(buffer) >= self.batch_size:
+            await self._send(shard)
+
+    async def ingest_change(self, change: Dict[str, Any]):
+        """Queue an edit or deletion behind the messages already sent for its channel"""
+        await self.ingest(change)
+
+    async def _send(self, shard: int):
+        """Hand a shard's buffered messages to its process, in order"""
+        batch, self._buffers[shard] = self._buffers[shard], []
+        if not batch:
+            return
+        inbox = self._inboxes[shard]
+        async with self._send_locks[shard]:
+            try:
+                # Pickling and the pipe write happen on the queue's feeder thread
+                inbox.put_nowait(batch)
+            except queue.Full:
+                # Shard is behind: wait for room without blocking the event loop
+                await asyncio.get_running_loop().run_in_executor(None, inbox.put, batch)
+        self.batches_sent += 1
+
+    async def _flush_periodically(self):
+        """Background task: send partial batches so messages never wait long"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            for shard in range(self.shards):
+                await self._send(shard)
+
+    async def apply_config(self, changed: Set[str]):
+        """Have every worker reload .env (after messages already sent to it)"""
+        from config import SHARD_RELOADABLE
+        if not changed & set(SHARD_RELOADABLE):
+            return
+        loop = asyncio.get_running_loop()
+        for shard, inbox in enumerate(self._inboxes):
+            await self._send(shard)
+            async with self._send_locks[shard]:
+                await loop.run_in_executor(None, inbox.put, _RELOAD)
+
+    async def drain(self):
+        """Send everything buffered, then stop the workers once they have finished"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        for shard in range(len(self._inboxes)):
+            await self._send(shard)
+            await asyncio.get_running_loop().run_in_executor(None, self._inboxes[shard].put, _STOP)
+
+        # Workers drain their own downloads and writes before exiting
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, self.drain_timeout)
+            if process.is_alive():
+                console.warning(f"{Fore.YELLOW}⚠️  {process.name} did not stop in time, terminating")
+                process.terminate()
+                await loop.run_in_executor(None, process.join)
+
+    async def close(self):
+        """Release the queues (after drain())"""
+        for inbox in self._inboxes:
+            inbox.close()
+            inbox.join_thread()
+        self._inboxes = []
+        self._processes = []
@@ -0,0 +1,244 @@
+"""
+Storage backends for daily message logs
+Append-only JSON Lines (default) and the legacy pretty-printed JSON array
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, IO, Tuple
+
+from utils.reader import iter_file
+from utils.serialization import Encoder, StdlibEncoder
+
+# fsync policies
+FSYNC_NEVER = 'never'
+FSYNC_ALWAYS = 'always'
+FSYNC_INTERVAL = 'interval'
+FSYNC_POLICIES = {FSYNC_NEVER, FSYNC_ALWAYS, FSYNC_INTERVAL}
+
+
+class StorageBackend:
+    """Base class for per-day log storage"""
+
+    # File extension used for day files written by this backend
+    extension = ''
+
+    def __init__(self, fsync_policy: str = FSYNC_NEVER, fsync_interval: float = 1.0):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self._handle: Optional[IO[bytes]] = None
+        self._path: Optional[Path] = None
+        self._last_fsync = 0.0
+
+    def open(self, path: Path) -> bool:
+        """
+        Switch to the given day file, creating it if needed
+
+        Returns:
+            True if a new file was created
+        """
+        raise NotImplementedError
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Append records to the open day file
+
+        Returns:
+            Number of bytes written
+        """
+        raise NotImplementedError
+
+    def _sync(self, force: bool = False):
+        """Flush and fsync the open file according to the fsync policy"""
+        if self._handle is None:
+            return
+        self._handle.flush()
+
+        if self.fsync_policy == FSYNC_ALWAYS or (force and self.fsync_policy != FSYNC_NEVER):
+            os.fsync(self._handle.fileno())
+            self._last_fsync = time.monotonic()
+        elif self.fsync_policy == FSYNC_INTERVAL:
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._handle.fileno())
+                self._last_fsync = now
+
+    def close(self):
+        """Flush and close the open day file"""
+        if self._handle is not None:
+            self._sync(force=True)
+            self._handle.close()
+            self._handle = None
+            self._path = None
+
+
+class NdjsonStorage(StorageBackend):
+    """Append-only JSON Lines storage: one compact JSON object per line"""
+
+    extension = '.jsonl'
+
+    def __init__(self, fsync_policy: str = FSYNC_NEVER, fsync_interval: float = 1.0,
+                 encoder: Optional[Encoder] = None):
+        super().__init__(fsync_policy, fsync_interval)
+        self.encoder = encoder or StdlibEncoder()
+
+    def open(self, path: Path) -> bool:
+        if self._path == path and self._handle is not None:
+            return False
+
+        self.close()
+        created = not path.exists()
+        self._handle = open(path, 'ab')
+        self._path = path
+
+        # Terminate a line torn by a crash so the next record stays parseable
+        if not created and self._handle.tell() > 0:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self._handle.write(b'\n')
+        return created
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        if not records:
+            return 0
+
+        data = self.encoder.encode_lines(records)
+        self._handle.write(data)
+        self._sync()
+        return len(data)
+
+
+class JsonArrayStorage(StorageBackend):
+    """
+    Legacy storage: a pretty-printed JSON array per day
+
+    Appends seek back over the closing bracket instead of rewriting the
+    whole file, while keeping the exact `json.dumps(..., indent=2)` layout.
+    """
+
+    extension = '.json'
+
+    def open(self, path: Path) -> bool:
+        if self._path == path and self._handle is not None:
+            return False
+
+        self.close()
+        created = not path.exists()
+        if created:
+            path.write_text('[]', encoding='utf-8')
+        self._handle = open(path, 'r+b')
+        self._path = path
+        return created
+
+    def _find_tail(self) -> Tuple[int, bool]:
+        """
+        Locate where the next record should be written
+
+        Returns:
+            (offset just past the last element, whether the array is empty)
+        """
+        handle = self._handle
+        handle.seek(0, os.SEEK_END)
+        end = handle.tell()
+        start = max(0, end - 4096)
+        handle.seek(start)
+        tail = handle.read().rstrip()
+
+        if not tail.endswith(b']'):
+            raise ValueError(f"{self._path.name} is not a JSON array")
+
+        before = tail[:-1].rstrip()
+        return start + len(before), before.endswith(b'[')
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        if not records:
+            return 0
+
+        offset, empty = self._find_tail()
+
+        body = ',\n'.join(
+            '  ' + json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+            for record in records
+        )
+        prefix = '\n' if empty else ',\n'
+        data = f"{prefix}{body}\n]".encode('utf-8')
+
+        self._handle.seek(offset)
+        self._handle.write(data)
+        self._handle.truncate()
+        self._sync()
+        return len(data)
+
+
+# Backend registry, keyed by LOG_FORMAT value
+BACKENDS = {
+    'ndjson': NdjsonStorage,
+    'json': JsonArrayStorage,
+}
+
+
+def create_storage(log_format: str = 'ndjson', fsync_policy: str = FSYNC_NEVER,
+                   fsync_interval: float = 1.0, encoder: Optional[Encoder] = None) -> StorageBackend:
+    """
+    Create a storage backend by format name
+
+    encoder applies to JSON Lines; the legacy array format always uses
+    json.dumps(indent=2) to keep its exact layout.
+    """
+    try:
+        backend_cls = BACKENDS[log_format]
+    except KeyError:
+        raise ValueError(f"Unknown log format: {log_format}") from None
+    if backend_cls is NdjsonStorage:
+        return backend_cls(fsync_policy=fsync_policy, fsync_interval=fsync_interval, encoder=encoder)
+    return backend_cls(fsync_policy=fsync_policy, fsync_interval=fsync_interval)
+
+
+def export_legacy_json(src: Path, dest: Path) -> int:
+    """
+    Convert a JSON Lines day file into the legacy pretty-printed array format
+
+    Returns:
+        Number of records exported
+    """
+    count = 0
+    tmp_path = dest.with_name(dest.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        out.write('[')
+        for _, record in iter_file(src):
+            out.write(',\n' if count else '\n')
+            out.write('  ' + json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n  '))
+            count += 1
+        out.write('\n]' if count else ']')
+    os.replace(tmp_path, dest)
+    return count
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: export JSON Lines day files to legacy arrays"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m utils.storage',
+        description='Export JSON Lines day logs to the legacy pretty-printed JSON array format'
+    )
+    parser.add_argument('files', nargs='+', type=Path, help='YYYY-MM-DD.jsonl files to convert')
+    parser.add_argument('--out-dir', type=Path, default=None,
+                        help='Output directory (default: next to each input file)')
+    args = parser.parse_args(argv)
+
+    for src in args.files:
+        stem = src.name[:-len('.jsonl')] if src.name.endswith('.jsonl') else src.stem
+        dest = (args.out_dir or src.parent) / f"{stem}.json"
+        count = export_legacy_json(src, dest)
+        print(f"{src.name} -> {dest} ({count} records)")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,186 @@
+"""
+Thumbnails and perceptual hashes for downloaded images
+Image work runs in a process pool, so it uses other cores and never blocks the event loop
+"""
+
+import os
+import time
+import asyncio
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Any, Optional
+from colorama import Fore
+
+from utils.console import console
+from utils.metrics import metrics
+
+# Optional dependency, only imported by the pool processes that use it
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+# Formats Pillow can thumbnail (SVG is vector and is left alone)
+SUPPORTED_FORMATS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
+
+# Side of the grid compared by the difference hash (64 bits)
+HASH_SIZE = 8
+
+# Results remembered by content hash, so duplicate files are not processed twice
+KNOWN_LIMIT = 10000
+
+images_processed = metrics.counter(
+    'dsm_images_processed_total', 'Downloaded images thumbnailed and hashed', ('status',))
+image_processing_seconds = metrics.histogram(
+    'dsm_image_processing_seconds', 'Time to thumbnail and hash one image')
+
+
+def difference_hash(image) -> str:
+    """
+    64-bit difference hash (dHash) of an image, as 16 hex digits
+
+    Resizing and re-encoding barely change it, so near-duplicates are
+    images whose hashes differ in only a few bits (see hamming_distance).
+    """
+    from PIL import Image
+
+    pixels = list(image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{bits:016x}"
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Number of differing bits between two hashes (0-5 usually means the same picture)"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def process_image(src: str, thumbnail: str, max_size: int) -> Dict[str, Any]:
+    """
+    Hash an image and write its thumbnail (runs in a pool process)
+
+    Args:
+        src: Downloaded image
+        thumbnail: Where to write the WebP thumbnail (skipped if it exists)
+        max_size: Longest side of the thumbnail in pixels
+
+    Returns:
+        Fields to add to the attachment's metadata
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(src) as image:
+        width, height = image.size
+        # Animated images use their first frame
+        image = ImageOps.exif_transpose(image)
+        phash = difference_hash(image)
+
+        thumb_path = Path(thumbnail)
+        if not thumb_path.exists():
+            thumb = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            thumb.thumbnail((max_size, max_size))
+            thumb_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = thumb_path.with_name(f".{thumb_path.name}.{os.getpid()}.part")
+            thumb.save(tmp_path, 'WEBP', quality=80)
+            os.replace(tmp_path, thumb_path)
+
+    return {
+        'width': width,
+        'height': height,
+        'phash': phash,
+        'thumbnail': thumbnail
+    }
+
+
+class ImagePostProcessor:
+    """Adds a thumbnail and perceptual hash to downloaded images using a process pool"""
+
+    def __init__(self, thumbnails_dir: Path, max_size: int = 256, workers: int = 0):
+        """
+        Args:
+            thumbnails_dir: Where thumbnails are written (as <sha256>.webp)
+            max_size: Longest side of a thumbnail in pixels
+            workers: Pool processes (0 = one per CPU core)
+        """
+        self.thumbnails_dir = thumbnails_dir
+        self.max_size = max_size
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._known: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the pool on first use (spawned, so workers don't inherit the event loop)"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def thumbnail_path(self, sha256: str) -> Path:
+        """Thumbnail location for a file's content hash"""
+        return self.thumbnails_dir / sha256[:2] / f"{sha256}.webp"
+
+    async def process(self, path: Path, sha256: str) -> Dict[str, Any]:
+        """
+        Thumbnail and hash a downloaded image
+
+        Failures are reported in the result rather than raised; the download
+        itself still counts as successful.
+
+        Args:
+            path: Downloaded file
+            sha256: Content hash of the file
+
+        Returns:
+            Fields to add to the attachment's metadata (empty for unsupported formats)
+        """
+        if path.suffix.lower() not in SUPPORTED_FORMATS:
+            return {}
+        known = self._known.get(sha256)
+        if known is not None:
+            self._known.move_to_end(sha256)
+            images_processed.inc(labels=('cached',))
+            return dict(known)
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            fields = await loop.run_in_executor(
+                self._get_executor(), process_image,
+                str(path), str(self.thumbnail_path(sha256)), self.max_size
+            )
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            self._executor = None
+            images_processed.inc(labels=('failed',))
+            return {'thumbnail_error': 'Image worker crashed'}
+        except Exception as e:
+            images_processed.inc(labels=('failed',))
+            return {'thumbnail_error': str(e) or type(e).__name__}
+
+        image_processing_seconds.observe(time.perf_counter() - started)
+        images_processed.inc(labels=('ok',))
+        self._known[sha256] = fields
+        if len(self._known) > KNOWN_LIMIT:
+            self._known.popitem(last=False)
+        return dict(fields)
+
+    def close(self):
+        """Stop the pool (blocking; waits for images in progress)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+def create_post_processor(downloads_dir: Path, max_size: int = 256,
+                          workers: int = 0) -> Optional[ImagePostProcessor]:
+    """Create the post-download stage, or None (with a warning) if Pillow is missing"""
+    if not PILLOW_AVAILABLE:
+        console.warning(f"{Fore.YELLOW}⚠️  'Pillow' not installed, thumbnails disabled")
+        return None
+    return ImagePostProcessor(downloads_dir / 'thumbnails', max_size, workers)
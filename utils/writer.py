@@ -0,0 +1,217 @@
+"""
+Batched write pipeline between the Discord client and the logger
+Queues records and flushes them in groups on a background task
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from colorama import Fore
+
+from utils.console import console
+
+# Backpressure policies when the queue is full
+BACKPRESSURE_BLOCK = 'block'
+BACKPRESSURE_DROP = 'drop'
+
+# Queue sentinel telling the writer task to stop after draining
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Group-commit writer: a bounded queue drained by one background task
+
+    Records are flushed when `batch_size` have accumulated or
+    `flush_interval` seconds have passed since the first queued record,
+    whichever comes first. Disk work runs on a dedicated thread so the
+    event loop never waits on file I/O.
+    """
+
+    def __init__(
+        self,
+        sinks,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.25,
+        backpressure: str = BACKPRESSURE_BLOCK
+    ):
+        """
+        Args:
+            sinks: Object, or list of objects, with a synchronous `write_batch(records)` method
+            max_queue: Maximum number of queued records
+            batch_size: Maximum records per flush
+            flush_interval: Maximum seconds a record waits before flushing
+            backpressure: 'block' (wait for space) or 'drop' (discard new records)
+        """
+        if backpressure not in (BACKPRESSURE_BLOCK, BACKPRESSURE_DROP):
+            raise ValueError(f"Unknown backpressure policy: {backpressure}")
+
+        self.sinks = list(sinks) if isinstance(sinks, (list, tuple)) else [sinks]
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.backpressure = backpressure
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-writer')
+        self._closed = False
+        self._warned_full = False
+
+        # Counters
+        self.records_written = 0
+        self.records_dropped = 0
+        self.batches_written = 0
+        self.blocked_submits = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of records waiting to be written"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Start the background writer task (idempotent)"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, record: Dict[str, Any], on_written: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Queue a record for writing
+
+        Args:
+            record: Record to write
+            on_written: Called on the event loop once every sink has written the record
+                (not called if it is dropped or a sink fails)
+
+        Returns:
+            True if the record was queued, False if it was dropped
+        """
+        if self._closed:
+            return False
+        self.start()
+
+        item = (record, on_written)
+        if not self._queue.full():
+            self._queue.put_nowait(item)
+            if self._warned_full and self._queue.qsize() < self.max_queue // 2:
+                self._warned_full = False
+            return True
+
+        if not self._warned_full:
+            action = 'waiting for space' if self.backpressure == BACKPRESSURE_BLOCK else 'dropping records'
+            console.warning(f"{Fore.YELLOW}⚠️  Log write queue full ({self.max_queue} records), {action}")
+            self._warned_full = True
+
+        if self.backpressure == BACKPRESSURE_DROP:
+            self.records_dropped += 1
+            return False
+
+        self.blocked_submits += 1
+        await self._queue.put(item)
+        return True
+
+    async def _collect_batch(self) -> Tuple[List[Tuple[Dict[str, Any], Optional[Callable[[], None]]]], bool]:
+        """
+        Wait for the first record, then gather more until size or time limit
+
+        Returns:
+            (batch of (record, on_written) pairs, whether the stop sentinel was reached)
+        """
+        first = await self._queue.get()
+        if first is _STOP:
+            return [], True
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            # Take whatever is already queued without yielding to the loop
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _write_all(self, batch: List[Dict[str, Any]]) -> bool:
+        """
+        Write a batch to every sink; one failing sink doesn't block the others
+
+        Returns:
+            True if every sink wrote the batch
+        """
+        ok = True
+        for sink in self.sinks:
+            try:
+                sink.write_batch(batch)
+            except Exception as e:
+                ok = False
+                console.error(f"{Fore.RED}❌ Error writing {len(batch)} record(s) to {type(sink).__name__}: {e}")
+        return ok
+    
+    async def _run(self):
+        """Background task: flush batches to the sink until the stop sentinel"""
+        loop = asyncio.get_running_loop()
+        stop = False
+
+        while not stop:
+            items, stop = await self._collect_batch()
+            if not items:
+                continue
+
+            batch = [record for record, _ in items]
+            ok = await loop.run_in_executor(self._executor, self._write_all, batch)
+            self.records_written += len(batch)
+            self.batches_written += 1
+
+            if ok:
+                for _, on_written in items:
+                    if on_written is None:
+                        continue
+                    try:
+                        on_written()
+                    except Exception as e:
+                        console.error(f"{Fore.RED}❌ Error in write callback: {e}")
+
+    async def close(self):
+        """Stop accepting records, flush everything queued, and stop the task"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._task is not None:
+            # The sentinel queues behind pending records, so they drain first
+            await self._queue.put(_STOP)
+            await self._task
+
+        self._executor.shutdown(wait=True)
+
+
+# Global writer instance
+_writer_instance = None
+
+def get_writer(
+    sinks,
+    max_queue: int = 10000,
+    batch_size: int = 500,
+    flush_interval: float = 0.25,
+    backpressure: str = BACKPRESSURE_BLOCK
+) -> BatchWriter:
+    """Get or create the global batch writer instance"""
+    global _writer_instance
+    if _writer_instance is None:
+        _writer_instance = BatchWriter(sinks, max_queue, batch_size, flush_interval, backpressure)
+    return _writer_instance